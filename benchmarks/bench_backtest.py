@@ -0,0 +1,123 @@
+"""Correctness and throughput of the walk-forward backtester (python/backtest.py).
+
+Checks the vectorized positions, P&L and R² against per-bar loops and
+StockHMM.calculate_out_of_sample_r_squared, and that a fold's forecasts are
+the online filter's predictions (no lookahead). Then runs a walk-forward
+over --symbols synthetic 5-minute series of --years each, with every
+worker count in --workers, and reports fits and bars per second.
+
+    python benchmarks/bench_backtest.py
+    python benchmarks/bench_backtest.py --symbols 8 --years 2 --workers 1 4 8 --output backtest.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+from synthetic import synthetic_returns  # noqa: E402
+
+
+def reference_positions(signals, hold, allow_short):
+    positions, position = [], 0
+    for signal in signals:
+        if signal == 1:
+            position = 1
+        elif signal == -1:
+            position = -1 if allow_short else 0
+        elif hold == 'flat':
+            position = 0
+        positions.append(position)
+    return np.array(positions)
+
+
+def check_rules(backtest):
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.0, 0.002, 5_000)
+    forecast = rng.normal(0.0, 0.0005, 5_000)
+    for hold in ('keep', 'flat'):
+        for allow_short in (True, False):
+            signals = backtest.signals_from_forecasts(forecast, 0.0004)
+            positions = backtest.positions_from_signals(signals, hold, allow_short)
+            assert np.array_equal(positions, reference_positions(signals, hold, allow_short)), (hold, allow_short)
+
+            metrics = backtest.evaluate(returns, forecast, 0.0004, hold, allow_short, cost=0.0005)
+            equity, previous = 1.0, 0
+            for position, r in zip(positions, returns):
+                equity *= 1 + position * r - 0.0005 * abs(position - previous)
+                previous = position
+            assert math.isclose(metrics['total_return'], equity - 1, rel_tol=1e-9, abs_tol=1e-12), (hold, metrics)
+    print("positions and P&L match the per-bar loop", flush=True)
+
+
+def check_forecasts(backtest, stock_hmm):
+    returns = synthetic_returns(3_000, 1)
+    fold = backtest.fit_fold(returns, 2_000, 3, 'gaussian', seed=0)
+    model = stock_hmm.StockHMM(3, seed=0, emission='gaussian')
+    model.baum_welch(returns[:2_000])
+    expected = [model.filter(returns[:2_000])[1]] + [model.update(r)[1] for r in returns[2_000:-1]]
+    assert np.allclose(fold['forecast'], expected, rtol=1e-9, atol=1e-15)
+    r2 = backtest.r_squared(returns[2_000:], fold['forecast'])
+    assert math.isclose(r2, model.calculate_out_of_sample_r_squared(returns[2_000:], fold['forecast']), rel_tol=1e-9)
+    print("fold forecasts equal the online filter's predictions; R² matches StockHMM", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--build-dir', default=os.path.join(ROOT, 'Release'),
+                        help='directory containing the compiled stock_hmm module')
+    parser.add_argument('--symbols', type=int, default=4)
+    parser.add_argument('--years', type=float, default=1.0, help='years of 5-minute bars per symbol')
+    parser.add_argument('--train', type=int, default=4_000)
+    parser.add_argument('--test', type=int, default=1_000)
+    parser.add_argument('--states', type=int, nargs='+', default=[2, 3])
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument('--output', help='write timings to this JSON file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.build_dir))
+    import stock_hmm  # type: ignore
+    from python import backtest
+
+    check_rules(backtest)
+    check_forecasts(backtest, stock_hmm)
+
+    length = int(args.years * backtest.BARS_PER_YEAR)
+    series = {f"SYN{i:02d}": synthetic_returns(length, i) for i in range(args.symbols)}
+    models = [{'num_states': states, 'emission': 'gaussian', 'seed': 0} for states in args.states]
+    rules = [{'threshold': threshold, 'hold': hold, 'allow_short': True, 'cost': 0.0001}
+             for threshold in (0.0, 0.0001, 0.0005) for hold in ('keep', 'flat')]
+
+    results = {'symbols': args.symbols, 'bars_per_symbol': length, 'train': args.train, 'test': args.test,
+               'models': len(models), 'rules': len(rules), 'cpu_count': os.cpu_count(), 'runs': []}
+    baseline = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        summary = backtest.walk_forward(series, models, rules, args.train, args.test, workers=workers)
+        seconds = time.perf_counter() - start
+        assert not summary['errors'], summary['errors']
+        rows = {(row['symbol'], row['model']['num_states'], row['rule']['threshold'], row['rule']['hold']):
+                row['total_return'] for row in summary['results']}
+        if baseline is None:
+            baseline = rows
+        assert rows == baseline, "results depend on the worker count"
+        run = {'workers': workers, 'seconds': seconds, 'fits': len(summary['folds']),
+               'fits_per_second': len(summary['folds']) / seconds,
+               'bars_per_second': args.symbols * length * len(models) / seconds,
+               'results': len(summary['results'])}
+        results['runs'].append(run)
+        print(json.dumps(run), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
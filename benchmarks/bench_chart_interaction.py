@@ -0,0 +1,197 @@
+"""Level of detail and blitting in python/plotter.py's interactive chart.
+
+Checks that downsample_ohlc matches a pandas groupby aggregation, that
+hover tooltips show the bar (or aggregated bars) under the mouse, and that a
+blitted pan frame shows the same pixels as fully redrawing the chart at the
+panned limits. Then times, with the Agg backend and a year of 5-minute bars
+by default: drawing plot_stock_data, redrawing after zooming in, one
+crosshair frame and one pan frame (both blitted), one hover frame including
+the tooltip lookup, against drawing every candle at full detail.
+
+    python benchmarks/bench_chart_interaction.py
+    python benchmarks/bench_chart_interaction.py --length 100000 --output interaction.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from matplotlib.backend_bases import MouseButton, MouseEvent  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from synthetic import synthetic_frame  # noqa: E402
+from python.plotter import (bar_arrays, downsample_ohlc, plot_candlestick, plot_stock_data,  # noqa: E402
+                            plot_volume)
+
+YEAR_OF_5_MINUTE_BARS = 252 * 78
+
+
+def check_downsample(length, seed):
+    df = synthetic_frame(length, seed)
+    bars = bar_arrays(df)
+    rng = np.random.default_rng(seed)
+    for _ in range(20):
+        lo, hi = sorted(rng.integers(0, length, 2))
+        k = int(rng.integers(1, 50))
+        x, aggregated = downsample_ohlc(bars, lo, hi, k)
+        start, stop = lo // k * k, min(length, -(-hi // k) * k)
+        window = df.iloc[start:stop].reset_index(drop=True)
+        groups = window.groupby(np.arange(len(window)) // k)
+        expected = groups.agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'mean'})
+        for column in expected:
+            np.testing.assert_allclose(aggregated[column], expected[column].to_numpy(), rtol=1e-12)
+        centres = pd.Series(np.arange(start, stop, dtype=np.float64)).groupby(np.arange(stop - start) // k).mean()
+        np.testing.assert_allclose(x, centres.to_numpy())
+    print(f"downsample_ohlc matches a groupby aggregation (seed {seed})", flush=True)
+
+
+def new_chart(df):
+    fig = plt.figure(figsize=(10, 6), dpi=100)
+    chart = plot_stock_data(fig, df, 'SYN', relative_strength='Relative Strength: 0.1000',
+                            overlays=(df.assign(bullish=0, bearish=0), df.assign(support=np.nan, resistance=np.nan)))
+    return fig, chart
+
+
+def mouse(fig, name, x, y, button=None):
+    event = MouseEvent(name, fig.canvas, x, y, button=button)
+    fig.canvas.callbacks.process(name, event)
+
+
+def hover_candle(fig, chart, position):
+    """Move the mouse to the middle of the wick of the drawn candle holding bar `position`."""
+    start, x, bars = chart.drawn
+    j = (position - start) // chart.detail[2]
+    x_pixel, y_pixel = chart.axes[0].transData.transform((x[j], (bars['low'][j] + bars['high'][j]) / 2))
+    mouse(fig, 'motion_notify_event', x_pixel, y_pixel)
+    return start + j * chart.detail[2]
+
+
+def check_tooltips(df, seed):
+    fig, chart = new_chart(df)
+    fig.canvas.draw()
+    rng = np.random.default_rng(seed)
+    for zoom in [None, 300]:
+        if zoom is not None:
+            chart.axes[0].set_xlim(len(df) // 2, len(df) // 2 + zoom)
+            fig.canvas.draw()
+        k = chart.detail[2]
+        lo, hi = (int(limit) for limit in chart.axes[0].get_xlim())
+        for position in rng.integers(max(lo, 0) + k, min(hi, len(df)) - k, 20):
+            first = hover_candle(fig, chart, int(position))
+            assert chart.tooltip.get_visible()
+            bucket = df.iloc[first:first + k]
+            period = bucket.index[0].strftime('%Y-%m-%d %H:%M')
+            if k > 1:
+                period += f" - {bucket.index[-1].strftime('%Y-%m-%d %H:%M')}"
+            expected = (f"Time: {period}\nOpen: ${bucket.open.iloc[0]:.2f}\nHigh: ${bucket.high.max():.2f}\n"
+                        f"Low: ${bucket.low.min():.2f}\nClose: ${bucket.close.iloc[-1]:.2f}\n"
+                        f"Volume: {bucket.volume.sum():,.0f}")
+            assert chart.tooltip.get_text() == expected, (chart.tooltip.get_text(), expected)
+        # Above the highest candle there is nothing to show
+        ax1 = chart.axes[0]
+        mouse(fig, 'motion_notify_event', ax1.bbox.x0 + ax1.bbox.width / 2, ax1.bbox.y1 - 2)
+        assert not chart.tooltip.get_visible()
+        print(f"tooltips match the bars under the mouse ({k} bar(s) per candle)", flush=True)
+    plt.close(fig)
+
+
+def check_pan(df, dx, dy):
+    fig, chart = new_chart(df)
+    ax1 = chart.axes[0]
+    # Grid lines, the legend and text boxes stay put on a redraw but move with a blitted pan; compare the bars only
+    for ax in chart.axes:
+        ax.grid(False)
+    ax1.get_legend().remove()
+    for text in list(ax1.texts):
+        text.remove()
+    fig.canvas.draw()
+    x0, y0 = ax1.bbox.x0 + ax1.bbox.width / 2, ax1.bbox.y0 + ax1.bbox.height / 2
+    mouse(fig, 'button_press_event', x0, y0, MouseButton.LEFT)
+    mouse(fig, 'motion_notify_event', x0 + dx, y0 + dy, MouseButton.LEFT)
+    blitted = np.asarray(fig.canvas.buffer_rgba()).astype(np.int16)
+    mouse(fig, 'button_release_event', x0 + dx, y0 + dy, MouseButton.LEFT)
+    fig.canvas.draw()
+    drawn = np.asarray(fig.canvas.buffer_rgba()).astype(np.int16)
+    # Compare inside the price axes, away from the strips uncovered by the shift
+    height = fig.canvas.get_width_height()[1]
+    x1, y1, x2, y2 = ax1.bbox.extents.astype(int)
+    rows = slice(height - y2 + abs(dy) + 5, height - y1 - abs(dy) - 5)
+    columns = slice(x1 + abs(dx) + 5, x2 - abs(dx) - 5)
+    fraction = (np.abs(blitted - drawn).max(axis=-1) > 16)[rows, columns].mean()
+    plt.close(fig)
+    print(f"pan by ({dx}, {dy}) px: {fraction:.2%} of pixels differ from a full redraw", flush=True)
+    assert fraction < 0.01
+
+
+def timed(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--length', type=int, default=YEAR_OF_5_MINUTE_BARS)
+    parser.add_argument('--output', help='write timings to this JSON file')
+    args = parser.parse_args()
+
+    for seed in range(3):
+        check_downsample(5_000, seed)
+    small = synthetic_frame(3_000)
+    check_tooltips(small, 0)
+    for dx, dy in [(40, 15), (-25, -30), (0, 20)]:
+        check_pan(small, dx, dy)
+
+    df = synthetic_frame(args.length)
+    results = {'length': args.length}
+
+    start = time.perf_counter()
+    fig, chart = new_chart(df)
+    fig.canvas.draw()
+    results['plot_and_first_draw_seconds'] = time.perf_counter() - start
+    results['full_redraw_seconds'] = timed(fig.canvas.draw)
+    results['candles_drawn'] = len(chart.bodies.get_paths())
+
+    ax1 = chart.axes[0]
+    ax1.set_xlim(args.length - 500, args.length)  # the last ~6 trading days
+    results['zoomed_redraw_seconds'] = timed(fig.canvas.draw)
+    results['zoomed_candles_drawn'] = len(chart.bodies.get_paths())
+
+    results['hover_frame_seconds'] = timed(lambda: hover_candle(fig, chart, args.length - 250))
+    assert chart.tooltip.get_visible()
+    x0, y0 = ax1.bbox.x0 + ax1.bbox.width / 2, ax1.bbox.y1 - 2
+    results['crosshair_frame_seconds'] = timed(lambda: mouse(fig, 'motion_notify_event', x0, y0))
+    mouse(fig, 'button_press_event', x0, y0, MouseButton.LEFT)
+    results['pan_frame_seconds'] = timed(lambda: mouse(fig, 'motion_notify_event', x0 + 30, y0, MouseButton.LEFT))
+    mouse(fig, 'button_release_event', x0 + 30, y0, MouseButton.LEFT)
+    plt.close(fig)
+
+    # Reference: every candle and volume bar drawn, as before level of detail
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 6), dpi=100, sharex=True)
+    start = time.perf_counter()
+    plot_candlestick(ax1, df)
+    plot_volume(ax2, df)
+    fig.canvas.draw()
+    results['full_detail_plot_and_first_draw_seconds'] = time.perf_counter() - start
+    results['full_detail_redraw_seconds'] = timed(fig.canvas.draw, repeat=3)
+    plt.close(fig)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
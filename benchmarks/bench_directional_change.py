@@ -0,0 +1,127 @@
+"""Equivalence check and timing for python/directional_change.py.
+
+Runs the current ``directional_change`` against the original per-bar pandas
+implementation (kept below as ``reference_directional_change``) on synthetic
+5-minute bars, fails if any signal differs, and reports the speedup. The
+reference takes about a minute at 10^6 bars.
+
+    python benchmarks/bench_directional_change.py
+    python benchmarks/bench_directional_change.py --lengths 1000000 --output dc.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from python.directional_change import directional_change  # noqa: E402
+from synthetic import synthetic_bars  # noqa: E402
+
+DEFAULT_LENGTHS = [10_000, 100_000, 1_000_000]
+# (sigma, min_change, window, min_duration); the first row is the default
+PARAMETER_GRID = [(0.01, 0.005, 5, 3), (0.002, 0.001, 3, 1), (0.0, 0.0, 10, 0), (0.05, 0.02, 20, 10)]
+
+
+def reference_directional_change(high, low, close, sigma=0.01, min_change=0.005, window=5, min_duration=3):
+    df = pd.DataFrame({'high': high, 'low': low, 'close': close})
+    df['rolling_high'] = df['high'].rolling(window=window).max()
+    df['rolling_low'] = df['low'].rolling(window=window).min()
+
+    df['price_change'] = df['close'].pct_change(window)
+
+    bullish = [0] * window
+    bearish = [0] * window
+    tmp_max = df['rolling_high'].iloc[window - 1]
+    tmp_min = df['rolling_low'].iloc[window - 1]
+    trend_duration = 0
+
+    for i in range(window, len(high)):
+        price_change = df['price_change'].iloc[i]
+
+        if df['rolling_high'].iloc[i] > tmp_max and price_change > min_change:
+            tmp_max = df['rolling_high'].iloc[i]
+            if trend_duration >= min_duration:
+                bullish.append(1)
+                bearish.append(0)
+                trend_duration = 0
+            else:
+                bullish.append(0)
+                bearish.append(0)
+        elif close.iloc[i] < tmp_max - tmp_max * sigma and price_change < -min_change:
+            tmp_max = df['rolling_high'].iloc[i]
+            if trend_duration >= min_duration:
+                bullish.append(0)
+                bearish.append(1)
+                trend_duration = 0
+            else:
+                bullish.append(0)
+                bearish.append(0)
+        else:
+            bullish.append(0)
+            bearish.append(0)
+
+        if df['rolling_low'].iloc[i] < tmp_min:
+            tmp_min = df['rolling_low'].iloc[i]
+        elif close.iloc[i] > tmp_min + tmp_min * sigma:
+            tmp_min = df['rolling_low'].iloc[i]
+
+        trend_duration += 1
+
+    return pd.DataFrame({
+        'close': close,
+        'bullish': bullish,
+        'bearish': bearish
+    })
+
+
+def check_equivalence(length, seed):
+    high, low, close = synthetic_bars(length, seed)
+    for sigma, min_change, window, min_duration in PARAMETER_GRID:
+        expected = reference_directional_change(high, low, close, sigma, min_change, window, min_duration)
+        actual = directional_change(high, low, close, sigma, min_change, window, min_duration)
+        pd.testing.assert_frame_equal(actual, expected)
+    print(f"equivalent on {length} bars (seed {seed}) for {len(PARAMETER_GRID)} parameter sets", flush=True)
+
+
+def time_once(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', type=int, nargs='+', default=DEFAULT_LENGTHS)
+    parser.add_argument('--check-length', type=int, default=20_000,
+                        help='bars per seed for the parameter-grid equivalence check')
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--output', help='write timings to this JSON file')
+    args = parser.parse_args()
+
+    for seed in range(args.seeds):
+        check_equivalence(args.check_length, seed)
+
+    results = []
+    for length in args.lengths:
+        high, low, close = synthetic_bars(length)
+        pd.testing.assert_frame_equal(directional_change(high, low, close),
+                                      reference_directional_change(high, low, close))
+        row = {'length': length,
+               'reference': time_once(reference_directional_change, high, low, close),
+               'current': min(time_once(directional_change, high, low, close) for _ in range(3))}
+        row['speedup'] = row['reference'] / row['current']
+        results.append(row)
+        print(json.dumps(row), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
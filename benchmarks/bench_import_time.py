@@ -0,0 +1,79 @@
+"""Import time of python/gui.py, parsed from `python -X importtime`.
+
+Imports the module in a fresh interpreter, then checks that the
+dependencies gui.py defers (see the note at the top of gui.py) were not
+loaded and that the total stays within the budget. Prints the slowest
+imports, with their cumulative time, so a regression is easy to trace.
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --budget-ms 400 --output import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Imported on first use by the GUI, never while the window is being built
+DEFERRED = ['numpy', 'pandas', 'matplotlib', 'scipy', 'sklearn', 'aiohttp', 'stock_hmm', 'yfinance',
+            'alpha_vantage', 'mplcursors']
+
+
+def import_times(module):
+    """Self and cumulative microseconds of every module imported by `import module`, in a new interpreter."""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=ROOT,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nesting is shown by indenting the name two spaces per level
+        rows.append({'module': name.strip(), 'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+                     'self_us': int(self_us), 'cumulative_us': int(cumulative_us)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='python.gui')
+    parser.add_argument('--budget-ms', type=float, default=500.0,
+                        help='fail if the imports take longer than this in total')
+    parser.add_argument('--repeat', type=int, default=3, help='runs; the fastest one is checked')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to print')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    rows = min(runs, key=lambda rows: sum(row['self_us'] for row in rows))
+    total_ms = sum(row['self_us'] for row in rows) / 1000
+
+    loaded = {row['module'].split('.')[0] for row in rows}
+    deferred = sorted(loaded & set(DEFERRED))
+    slowest = sorted(rows, key=lambda row: row['cumulative_us'], reverse=True)[:args.top]
+    for row in slowest:
+        print(f"{row['cumulative_us'] / 1000:9.1f} ms  {'  ' * row['depth']}{row['module']}")
+
+    results = {'module': args.module, 'total_ms': total_ms, 'budget_ms': args.budget_ms, 'modules': len(rows),
+               'deferred_loaded': deferred, 'slowest': slowest}
+    print(json.dumps({key: value for key, value in results.items() if key != 'slowest'}, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if deferred:
+        failures.append(f"import {args.module} loads deferred dependencies: {', '.join(deferred)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"import {args.module} took {total_ms:.0f} ms, over {args.budget_ms:.0f} ms")
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
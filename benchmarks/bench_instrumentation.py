@@ -0,0 +1,93 @@
+"""Overhead of python/instrumentation.py.
+
+Times an empty stage with recording off, on, and on with memory peaks, then
+renders the stock chart with each setting to show what the instrumentation
+adds to a real pipeline. Checks that stages nest and that the Chrome trace
+export holds every recorded stage.
+
+    python benchmarks/bench_instrumentation.py
+    python benchmarks/bench_instrumentation.py --length 100000 --output instrumentation.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from python import instrumentation  # noqa: E402
+from python.plotter import compute_overlays, plot_stock_data  # noqa: E402
+from synthetic import synthetic_frame  # noqa: E402
+
+MODES = {'off': None, 'on': False, 'memory': True}
+
+
+def empty_stage():
+    with instrumentation.stage('empty', bars=0):
+        pass
+
+
+def render(df):
+    fig = plt.figure(figsize=(10, 6), dpi=100)
+    with instrumentation.stage('render'):
+        plot_stock_data(fig, df, 'SYN', relative_strength='Relative Strength: 0.1000', overlays=compute_overlays(df),
+                        interactive=False)
+        with instrumentation.stage('draw'):
+            fig.canvas.draw()
+    plt.close(fig)
+
+
+def check_trace(df):
+    recorder = instrumentation.enable(memory=True)
+    render(df)
+    instrumentation.disable()
+    stages = {event['name']: event for event in recorder.events if 'duration_ns' in event}
+    outer, inner = stages['render'], stages['draw']
+    assert outer['start_ns'] <= inner['start_ns']
+    assert inner['start_ns'] + inner['duration_ns'] <= outer['start_ns'] + outer['duration_ns']
+    assert outer['peak_bytes'] >= inner['peak_bytes'] >= 0
+    trace = recorder.chrome_trace()['traceEvents']
+    assert sum(event['ph'] == 'X' for event in trace) == sum('duration_ns' in event for event in recorder.events)
+    print(f"stages nest and export: {', '.join(sorted(stages))}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--length', type=int, default=20_000, help='bars in the rendered chart')
+    parser.add_argument('--number', type=int, default=100_000, help='empty stages per timing')
+    parser.add_argument('--output', help='write timings to this JSON file')
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.length)
+    check_trace(df)
+    render(df)  # warm up fonts and caches
+
+    results = {'length': args.length}
+    for mode, memory in MODES.items():
+        if memory is not None:
+            instrumentation.enable(memory)
+        best = min(timeit.repeat(empty_stage, number=args.number, repeat=3))
+        results[f"stage_{mode}_ns"] = best / args.number * 1e9
+        times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            render(df)
+            times.append(time.perf_counter() - start)
+        results[f"render_{mode}_seconds"] = min(times)
+        instrumentation.disable()
+        print(json.dumps({key: value for key, value in results.items() if f"_{mode}_" in key}), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Exercise python/market_data.py against a local stub HTTP server.
+
+Starts an aiohttp server on localhost that answers in the Alpha Vantage and
+Yahoo chart formats with a fixed latency, an injected 503 and an Alpha
+Vantage throttle note. Then checks that:
+
+  * fetching many symbols concurrently takes about one round trip rather than one per symbol,
+  * concurrent duplicate requests (SPY from several callers) reach the server once,
+  * throttled and failed requests are retried,
+  * the token bucket holds the request rate to its quota.
+
+    python benchmarks/bench_market_data.py
+    python benchmarks/bench_market_data.py --symbols 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from python.market_data import ALPHA_VANTAGE, YAHOO, MarketDataClient  # noqa: E402
+
+
+class StubServer:
+    def __init__(self, latency, bars=100):
+        self.latency = latency
+        self.bars = bars
+        self.hits = collections.Counter()
+        self.arrivals = []
+        self.fail_next = set()
+
+    def _series(self, symbol):
+        rng = np.random.default_rng(abs(hash(symbol)) % 2 ** 32)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, self.bars)))
+        start = int(time.time()) // 300 * 300 - 300 * self.bars
+        return [start + 300 * i for i in range(self.bars)], close
+
+    async def alpha_vantage(self, request):
+        symbol = request.query['symbol']
+        self.hits[(ALPHA_VANTAGE, symbol)] += 1
+        self.arrivals.append(time.monotonic())
+        await asyncio.sleep(self.latency)
+        if (ALPHA_VANTAGE, symbol) in self.fail_next:
+            self.fail_next.discard((ALPHA_VANTAGE, symbol))
+            return web.json_response({'Note': 'Thank you for using Alpha Vantage! Our standard API call frequency '
+                                               'is 5 calls per minute.'})
+        stamps, close = self._series(symbol)
+        series = {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(stamp)): {
+            '1. open': f"{price:.4f}", '2. high': f"{price * 1.001:.4f}", '3. low': f"{price * 0.999:.4f}",
+            '4. close': f"{price:.4f}", '5. volume': '1000'} for stamp, price in zip(stamps, close)}
+        return web.json_response({'Meta Data': {'2. Symbol': symbol}, 'Time Series (5min)': series})
+
+    async def yahoo(self, request):
+        symbol = request.match_info['symbol']
+        self.hits[(YAHOO, symbol)] += 1
+        self.arrivals.append(time.monotonic())
+        await asyncio.sleep(self.latency)
+        if (YAHOO, symbol) in self.fail_next:
+            self.fail_next.discard((YAHOO, symbol))
+            return web.Response(status=503)
+        stamps, close = self._series(symbol)
+        quote = {'open': close.tolist(), 'high': (close * 1.001).tolist(), 'low': (close * 0.999).tolist(),
+                 'close': close.tolist(), 'volume': [1000] * len(close)}
+        return web.json_response({'chart': {'error': None, 'result': [{
+            'meta': {'exchangeTimezoneName': 'America/New_York'}, 'timestamp': stamps,
+            'indicators': {'quote': [quote]}}]}})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/query', self.alpha_vantage)
+        app.router.add_get('/chart/{symbol}', self.yahoo)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+async def run(num_symbols, latency, rate_limit):
+    server = StubServer(latency)
+    base = await server.start()
+    results = {}
+    symbols = [f"SYM{i:03d}" for i in range(num_symbols)]
+    try:
+        # Concurrency: the Yahoo bucket is set high enough not to be the bottleneck
+        async with MarketDataClient(alpha_vantage_url=f"{base}/query", yahoo_url=f"{base}/chart/",
+                                    yahoo_per_minute=60_000, backoff=0.05) as client:
+            start = time.perf_counter()
+            frames = await client.fetch_many(YAHOO, {symbol: None for symbol in symbols})
+            results['concurrent_seconds'] = time.perf_counter() - start
+            assert all(len(frame) == server.bars for frame in frames.values())
+            results['sequential_estimate_seconds'] = num_symbols * latency
+
+            # Coalescing: ten callers asking for SPY at once share one request
+            before = server.hits[(YAHOO, 'SPY')]
+            frames = await asyncio.gather(*(client.fetch(YAHOO, 'SPY') for _ in range(10)))
+            results['spy_server_hits_for_10_callers'] = server.hits[(YAHOO, 'SPY')] - before
+            assert results['spy_server_hits_for_10_callers'] == 1 and all(f is frames[0] for f in frames)
+
+            # Retries: a 503 from Yahoo and a throttle note from Alpha Vantage
+            server.fail_next |= {(YAHOO, 'RETRY'), (ALPHA_VANTAGE, 'RETRY')}
+            assert len(await client.fetch(YAHOO, 'RETRY')) == server.bars
+            assert len(await client.fetch(ALPHA_VANTAGE, 'RETRY', api_key='demo')) == server.bars
+            results['retries'] = client.stats['retries']
+            assert client.stats['retries'] == 2
+
+        # Rate limit: requests beyond the burst are spaced at the quota
+        async with MarketDataClient(alpha_vantage_url=f"{base}/query", alpha_vantage_per_minute=rate_limit) as client:
+            server.arrivals.clear()
+            count = 15
+            await client.fetch_many(ALPHA_VANTAGE, {f"RATE{i}": None for i in range(count)}, api_key='demo')
+            span = server.arrivals[-1] - server.arrivals[0]
+            burst = client.limiters[ALPHA_VANTAGE].capacity
+            results['rate_limit_per_minute'] = rate_limit
+            results['observed_per_minute_after_burst'] = (count - burst) / span * 60
+            assert results['observed_per_minute_after_burst'] <= rate_limit * 1.05
+    finally:
+        await server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.1, help='stub server response time in seconds')
+    parser.add_argument('--rate-limit', type=float, default=600, help='Alpha Vantage requests per minute to test')
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.symbols, args.latency, args.rate_limit))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Equivalence check and timing for scan_relative_strength.
+
+Builds a synthetic universe of aligned 5-minute bars, scores every symbol with
+calculate_relative_strength one pair at a time and with the vectorized
+scan_relative_strength, checks the scores agree, and times both.
+
+    python benchmarks/bench_relative_strength.py
+    python benchmarks/bench_relative_strength.py --symbols 5000 --bars 2000 --output rs.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from python.relativestrength import calculate_relative_strength, scan_relative_strength  # noqa: E402
+
+
+def synthetic_universe(num_symbols, num_bars, seed=0):
+    """Random-walk bars for num_symbols columns plus SPY; a few gaps and a zero-range symbol included."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0, 0.002, (num_bars, num_symbols + 1)), axis=0))
+    spread = np.abs(rng.normal(0.0, 0.001, close.shape)) * close
+    high, low = close + spread, close - spread
+    volume = rng.integers(1_000, 100_000, close.shape).astype(np.float64)
+    close[rng.random(close.shape) < 0.001] = np.nan
+    volume[rng.random(close.shape) < 0.001] = np.nan
+    high[:, 1] = low[:, 1] = close[:, 1] = 50.0
+
+    index = pd.date_range('2024-01-02 09:30', periods=num_bars, freq='5min')
+    spy = pd.DataFrame({'high': high[:, -1], 'low': low[:, -1], 'close': close[:, -1], 'volume': volume[:, -1]},
+                       index=index)
+    symbols = [f"SYM{i:04d}" for i in range(num_symbols)]
+    return symbols, high[:, :-1], low[:, :-1], close[:, :-1], volume[:, :-1], spy
+
+
+def pairwise(symbols, high, low, close, volume, spy):
+    scores = {}
+    for i, symbol in enumerate(symbols):
+        stock = pd.DataFrame({'high': high[:, i], 'low': low[:, i], 'close': close[:, i], 'volume': volume[:, i]},
+                             index=spy.index)
+        scores[symbol] = calculate_relative_strength(stock, spy)
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=500)
+    parser.add_argument('--bars', type=int, default=2000)
+    parser.add_argument('--output', help='write timings to this JSON file')
+    args = parser.parse_args()
+
+    universe = synthetic_universe(args.symbols, args.bars)
+
+    start = time.perf_counter()
+    expected = pairwise(*universe)
+    pairwise_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = scan_relative_strength(*universe)
+    scan_seconds = time.perf_counter() - start
+
+    expected = pd.Series({symbol: np.nan if score is None else score for symbol, score in expected.items()})
+    np.testing.assert_allclose(table['relative_strength'].reindex(expected.index), expected, rtol=1e-9, atol=1e-12)
+    print(f"scores agree for {args.symbols} symbols; top 3:\n{table.head(3)}")
+
+    row = {'symbols': args.symbols, 'bars': args.bars, 'pairwise': pairwise_seconds, 'scan': scan_seconds,
+           'speedup': pairwise_seconds / scan_seconds}
+    print(json.dumps(row))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(row, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Draw times of the chart layers in python/plotter.py and the HMM signal line.
+
+Times building each layer and drawing it with the Agg backend (first draw,
+then a redraw as on a pan), for the collection-based functions and for the
+previous implementations, which created one patch or Line2D per bar or
+segment. At small sizes it also renders both versions to pixels and reports
+how many differ, as a check that the output looks the same.
+
+    python benchmarks/bench_rendering.py
+    python benchmarks/bench_rendering.py --lengths 10000 100000 --reference-max 10000 --output rendering.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from synthetic import synthetic_frame  # noqa: E402
+from python.directional_change import directional_change  # noqa: E402
+from python.plotter import colored_segments, plot_candlestick, plot_directional_change, plot_volume  # noqa: E402
+
+
+def reference_candlestick(ax, df):
+    df = df.copy()
+    df['date_num'] = np.arange(len(df))
+    up = df[df.close >= df.open]
+    down = df[df.close < df.open]
+    ax.bar(up.date_num, up.close - up.open, 0.8, bottom=up.open, color='#00ff00', edgecolor='#00ff00', linewidth=1,
+           zorder=3)
+    ax.vlines(up.date_num, up.low, up.high, color='#00ff00', linewidth=1, zorder=2)
+    ax.bar(down.date_num, down.close - down.open, 0.8, bottom=down.open, color='#ff0000', edgecolor='#ff0000',
+           linewidth=1, zorder=3)
+    ax.vlines(down.date_num, down.low, down.high, color='#ff0000', linewidth=1, zorder=2)
+    ax.set_xlim(-1, len(df))
+    ax.set_ylim(df.low.min() * 0.999, df.high.max() * 1.001)
+
+
+def reference_volume(ax, df):
+    df = df.copy()
+    df['date_num'] = np.arange(len(df))
+    up = df[df.close >= df.open]
+    down = df[df.close < df.open]
+    ax.bar(up.date_num, up.volume, 0.8, color='#00ff00', alpha=0.5)
+    ax.bar(down.date_num, down.volume, 0.8, color='#ff0000', alpha=0.5)
+    ax.set_xlim(-1, len(df))
+    ax.set_ylim(0, df.volume.max() * 1.5)
+
+
+def reference_directional_change(ax, dc_df, marker_size=50):
+    dc_df = dc_df.copy()
+    dc_df['date_num'] = dc_df.index.map(dict(zip(dc_df.index, range(len(dc_df)))))
+    mask = (dc_df['bullish'] == 1) | (dc_df['bearish'] == 1)
+    indices = dc_df.loc[mask, 'date_num']
+    prices = dc_df.loc[mask, 'close']
+    colors = ['#00ff00' if bull else '#ff0000' for bull in dc_df.loc[mask, 'bullish']]
+    for i in range(len(indices) - 1):
+        ax.plot(indices.iloc[i:i + 2], prices.iloc[i:i + 2], color=colors[i], linewidth=2, alpha=0.7)
+    ax.scatter(indices, prices, c=colors, s=marker_size, zorder=5, alpha=0.7)
+
+
+SIGNAL_COLORS = {'BUY': 'green', 'SELL': 'red', 'HOLD': 'gray'}
+
+
+def reference_signal_line(ax, x, prices, signals):
+    for i in range(1, len(x)):
+        ax.plot(x[i - 1:i + 1], prices[i - 1:i + 1], color=SIGNAL_COLORS[signals[i]], linewidth=2)
+    ax.set_xlim(x[0], x[-1])
+    ax.set_ylim(prices.min(), prices.max())
+
+
+def signal_line(ax, x, prices, signals):
+    ax.add_collection(colored_segments(x, prices, [SIGNAL_COLORS[s] for s in signals[1:]], linewidths=2))
+    ax.set_xlim(x[0], x[-1])
+    ax.set_ylim(prices.min(), prices.max())
+
+
+def layers(df):
+    dc = directional_change(df['high'], df['low'], df['close'], sigma=0.005, min_change=0.002, window=3,
+                            min_duration=2)
+    x = np.arange(len(df), dtype=np.float64)
+    prices = df['close'].to_numpy()
+    signals = np.random.default_rng(0).choice(list(SIGNAL_COLORS), size=len(df))
+    return {
+        'candlestick': (lambda ax: plot_candlestick(ax, df), lambda ax: reference_candlestick(ax, df)),
+        'volume': (lambda ax: plot_volume(ax, df), lambda ax: reference_volume(ax, df)),
+        'directional_change': (lambda ax: plot_directional_change(ax, dc),
+                               lambda ax: reference_directional_change(ax, dc)),
+        'signal_line': (lambda ax: signal_line(ax, x, prices, signals),
+                        lambda ax: reference_signal_line(ax, x, prices, signals)),
+    }
+
+
+def render(draw, dpi=100):
+    fig, ax = plt.subplots(figsize=(10, 6), dpi=dpi)
+    start = time.perf_counter()
+    draw(ax)
+    built = time.perf_counter()
+    fig.canvas.draw()
+    first = time.perf_counter()
+    fig.canvas.draw()
+    redraw = time.perf_counter()
+    pixels = np.asarray(fig.canvas.buffer_rgba())[..., :3].astype(np.int16)
+    plt.close(fig)
+    return {'build': built - start, 'first_draw': first - built, 'redraw': redraw - first}, pixels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--reference-max', type=int, default=10_000,
+                        help='skip the per-artist reference above this many bars (it takes minutes)')
+    parser.add_argument('--check-length', type=int, default=300, help='bars for the pixel comparison')
+    parser.add_argument('--output', help='write timings to this JSON file')
+    args = parser.parse_args()
+
+    # Visual check: the two versions should render (nearly) the same pixels
+    for name, (new, reference) in layers(synthetic_frame(args.check_length)).items():
+        _, new_pixels = render(new)
+        _, reference_pixels = render(reference)
+        differing = np.any(np.abs(new_pixels - reference_pixels) > 16, axis=-1).mean()
+        print(f"{name}: {differing:.2%} of pixels differ from the reference at {args.check_length} bars", flush=True)
+        assert differing < 0.01
+
+    rows = []
+    for length in args.lengths:
+        for name, (new, reference) in layers(synthetic_frame(length)).items():
+            row = {'layer': name, 'length': length}
+            row.update({f"{key}_seconds": value for key, value in render(new)[0].items()})
+            if length <= args.reference_max:
+                row.update({f"reference_{key}_seconds": value for key, value in render(reference)[0].items()})
+            rows.append(row)
+            print(json.dumps(row), flush=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Throughput of the headless report renderer in python/report.py.
+
+Fills a temporary BarStore with synthetic 5-minute bars for SPY and a
+watchlist of synthetic symbols, then renders the report (stock chart and HMM
+chart per symbol, PNG) with one worker and with a process pool, and reports
+charts per second for each. Needs the stock_hmm extension on the path.
+
+    python benchmarks/bench_report.py
+    python benchmarks/bench_report.py --symbols 200 --bars 780 --workers 8 --output report.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from synthetic import synthetic_frame  # noqa: E402
+from python.bar_store import BAR_COLUMNS, BarStore  # noqa: E402
+from python.report import BENCHMARK, build_report  # noqa: E402
+
+
+def fill_store(root, symbols, bars):
+    store = BarStore(root)
+    for seed, symbol in enumerate([BENCHMARK] + symbols):
+        frame = synthetic_frame(bars, seed)[BAR_COLUMNS]
+        frame.index = frame.index.tz_localize('America/New_York')
+        store.append(symbol, frame)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=24)
+    parser.add_argument('--bars', type=int, default=78 * 5, help='bars per symbol (78 is one session)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    symbols = [f"SYN{i:03d}" for i in range(args.symbols)]
+    rows = []
+    with tempfile.TemporaryDirectory() as root:
+        store = fill_store(os.path.join(root, 'bars'), symbols, args.bars)
+        for workers in dict.fromkeys(args.workers):
+            # A fresh model cache each run, so every run fits every model
+            summary = build_report(symbols, os.path.join(root, f"report-{workers}"), store.root, workers=workers,
+                                   model_dir=os.path.join(root, f"models-{workers}"))
+            assert not summary['errors'], summary['errors']
+            row = {'symbols': args.symbols, 'bars': args.bars, 'workers': workers, 'charts': summary['charts'],
+                   'seconds': summary['seconds'], 'charts_per_second': summary['charts_per_second']}
+            rows.append(row)
+            print(json.dumps(row), flush=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
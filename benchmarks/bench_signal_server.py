@@ -0,0 +1,118 @@
+"""Throughput and tail latency of the signal fan-out server.
+
+Checks that binary frames decode to the JSON fields and that the streaming
+relative strength matches calculate_relative_strength, then starts
+websocket_server.py replaying the bundled CSVs as --symbols symbols and
+load-tests it with websocket.py: --clients connections, each subscribed to
+--subscribe symbols, once per encoding. Server and clients run as separate
+processes; the reported messages per second, coalesced bars and latency
+percentiles are the clients'.
+
+    python benchmarks/bench_signal_server.py
+    python benchmarks/bench_signal_server.py --clients 500 --rate 20 --output signal_server.json
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+from python.relativestrength import calculate_relative_strength  # noqa: E402
+from python.streaming import RelativeStrengthIndicator  # noqa: E402
+from synthetic import synthetic_frame  # noqa: E402
+
+
+def check_binary():
+    from python.signal_server import SignalUpdate, SymbolFeed, decode_binary
+    feed = SymbolFeed('SYN')
+    frame = synthetic_frame(400)
+    feed.warm_up(frame.iloc[:200])
+    for time_, row in frame.iloc[200:].iterrows():
+        update = SignalUpdate(feed.update(time_, row.to_dict()))
+        fields = json.loads(update.encode('json'))
+        decoded = decode_binary(update.encode('binary'))
+        for key, value in fields.items():
+            if isinstance(value, float):
+                assert math.isclose(decoded[key], value, rel_tol=1e-12), (key, decoded[key], value)
+            else:
+                assert decoded[key] == value, (key, decoded[key], value)
+    print(f"binary frames decode to the JSON fields: {len(update.encode('binary'))} bytes vs "
+          f"{len(update.encode('json'))}", flush=True)
+
+
+def check_relative_strength(length=300):
+    stock, spy = synthetic_frame(length, 1), synthetic_frame(length, 2)
+    stock_rs, spy_rs = RelativeStrengthIndicator(), RelativeStrengthIndicator()
+    for i in range(length):
+        streamed = RelativeStrengthIndicator.relative_strength(stock_rs.update(stock.iloc[i]),
+                                                               spy_rs.update(spy.iloc[i]))
+        batch = calculate_relative_strength(stock.iloc[:i + 1], spy.iloc[:i + 1])
+        if batch is None or math.isnan(batch):
+            assert math.isnan(streamed), (i, streamed)
+        else:
+            assert math.isclose(streamed, batch, rel_tol=1e-9, abs_tol=1e-12), (i, streamed, batch)
+    print(f"streaming relative strength matches calculate_relative_strength on {length} prefixes", flush=True)
+
+
+def run_load(args, encoding):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.abspath(args.build_dir),
+                                                                     os.environ.get('PYTHONPATH')])))
+    server = subprocess.Popen([sys.executable, 'websocket_server.py', '--port', str(args.port), '--symbols',
+                               str(args.symbols), '--copies', str(args.copies), '--rate', str(args.rate),
+                               '--start-delay', str(args.start_delay), '--stats-interval', '3600'],
+                              cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        server.stdout.readline()  # "Serving on ..."
+        symbols = ['SPY'] + [f"SYM{i:03d}" for i in range(1, args.subscribe)]
+        client = subprocess.run([sys.executable, 'websocket.py', '--url', f"ws://localhost:{args.port}",
+                                 '--clients', str(args.clients), '--symbols', *symbols, '--encoding', encoding,
+                                 '--duration', str(args.duration)],
+                                cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        result = json.loads(client.stdout.strip().splitlines()[-1])
+    finally:
+        server.terminate()
+        server.wait()
+    print(json.dumps(result), flush=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--build-dir', default=os.path.join(ROOT, 'Release'),
+                        help='directory containing the compiled stock_hmm module')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--symbols', type=int, default=20, help='symbols the server replays')
+    parser.add_argument('--subscribe', type=int, default=5, help='symbols each client subscribes to')
+    parser.add_argument('--copies', type=int, default=20, help='stitched copies of each CSV')
+    parser.add_argument('--rate', type=float, default=10.0, help='bars per second per symbol')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds each load run receives for')
+    parser.add_argument('--start-delay', type=float, default=5.0, help='seconds the server waits for clients')
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--encodings', nargs='+', choices=['json', 'binary'], default=['json', 'binary'])
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.build_dir))
+    from python.signal_server import replay_frames
+
+    check_binary()
+    check_relative_strength()
+    frames = replay_frames([os.path.join(ROOT, name) for name in ('spy_data_5m.csv', 'historical.csv')],
+                           ['SPY', 'SYM001'], args.copies)
+    assert all(np.isfinite(frame.to_numpy()).all() for frame in frames.values())
+
+    results = {'clients': args.clients, 'symbols': args.symbols, 'subscribe': args.subscribe, 'rate': args.rate,
+               'cpu_count': os.cpu_count(), 'runs': [run_load(args, encoding) for encoding in args.encodings]}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
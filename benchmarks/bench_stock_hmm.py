@@ -0,0 +1,95 @@
+"""Timing benchmark for the StockHMM extension.
+
+Times ``forward``, ``viterbi`` and one ``baum_welch`` iteration over a grid of
+state counts and sequence lengths and writes the results as JSON. Point
+``--build-dir`` at two different builds and use ``--compare`` to get a
+before/after table.
+
+    python benchmarks/bench_stock_hmm.py --output after.json
+    python benchmarks/bench_stock_hmm.py --build-dir old/Release --output before.json
+    python benchmarks/bench_stock_hmm.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+from synthetic import discretize, synthetic_returns  # noqa: E402
+
+DEFAULT_STATES = [3, 4, 8, 16]
+DEFAULT_LENGTHS = [10_000, 100_000, 1_000_000]
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(stock_hmm, states, lengths, repeat, max_fit_cells):
+    results = []
+    for length in lengths:
+        returns = synthetic_returns(length)
+        observations = discretize(returns)
+        for num_states in states:
+            model = stock_hmm.StockHMM(num_states)
+            row = {'states': num_states, 'length': length}
+            row['forward'] = best_of(lambda: model.forward(observations), repeat)
+            row['viterbi'] = best_of(lambda: model.viterbi(observations), repeat)
+            if length * num_states * num_states <= max_fit_cells:
+                row['baum_welch_iter'] = best_of(lambda: model.baum_welch(returns, 1, 0.0), repeat)
+            results.append(row)
+            print(json.dumps(row), flush=True)
+    return results
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = {(r['states'], r['length']): r for r in json.load(f)['results']}
+    with open(after_path) as f:
+        after = json.load(f)['results']
+
+    print(f"{'N':>3} {'T':>9} {'stage':>16} {'before (s)':>11} {'after (s)':>10} {'speedup':>8}")
+    for row in after:
+        old = before.get((row['states'], row['length']))
+        if old is None:
+            continue
+        for stage in ('forward', 'viterbi', 'baum_welch_iter'):
+            if stage in row and stage in old:
+                print(f"{row['states']:>3} {row['length']:>9} {stage:>16} {old[stage]:>11.4f} {row[stage]:>10.4f} "
+                      f"{old[stage] / row[stage]:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--build-dir', default=os.path.join(os.path.dirname(__file__), '..', 'Release'),
+                        help='directory containing the compiled stock_hmm module')
+    parser.add_argument('--states', type=int, nargs='+', default=DEFAULT_STATES)
+    parser.add_argument('--lengths', type=int, nargs='+', default=DEFAULT_LENGTHS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-fit-cells', type=float, default=3e7,
+                        help='skip baum_welch when T * N^2 exceeds this (the T x N x N xi buffer of older builds)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='print speedups between two runs')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sys.path.insert(0, os.path.abspath(args.build_dir))
+    import stock_hmm  # type: ignore
+
+    results = run(stock_hmm, args.states, args.lengths, args.repeat, args.max_fit_cells)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'module': stock_hmm.__file__, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Equivalence check and timing for the streaming indicators in python/streaming.py.
+
+Replays synthetic 5-minute bars through an IndicatorPipeline and checks each
+bar's outputs against the batch functions: directional_change and
+calculate_vwap over the whole history, calculate_atr and calculate_trendlines
+on the history up to a sample of bars (their values for the last bar are what
+a live update has to reproduce). Then reports the cost per bar of an update.
+
+    python benchmarks/bench_streaming.py
+    python benchmarks/bench_streaming.py --length 200000 --output streaming.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from python.directional_change import directional_change  # noqa: E402
+from python.relativestrength import calculate_atr  # noqa: E402
+from python.streaming import (ATRIndicator, DirectionalChangeIndicator, IndicatorPipeline,  # noqa: E402
+                              TrendlineIndicator, VWAPIndicator)
+from python.trendline import calculate_trendlines  # noqa: E402
+from python.vwap_calculation import calculate_vwap  # noqa: E402
+from synthetic import synthetic_frame  # noqa: E402
+
+
+def make_pipeline():
+    # The parameters plot_stock_data uses
+    return IndicatorPipeline([
+        DirectionalChangeIndicator(sigma=0.005, min_change=0.002, window=3, min_duration=2),
+        TrendlineIndicator(lookback=12, smoothing_window=3, smoothing_poly=2),
+        VWAPIndicator(),
+        ATRIndicator(14),
+    ])
+
+
+def check_equivalence(length, samples, seed):
+    data = synthetic_frame(length, seed)
+    streamed = make_pipeline().run(data)
+
+    dc = directional_change(data['high'], data['low'], data['close'], sigma=0.005, min_change=0.002, window=3,
+                            min_duration=2)
+    assert (streamed['bullish'].to_numpy() == dc['bullish'].to_numpy()).all()
+    assert (streamed['bearish'].to_numpy() == dc['bearish'].to_numpy()).all()
+    np.testing.assert_allclose(streamed['vwap'], calculate_vwap(data), rtol=1e-12)
+
+    rng = np.random.default_rng(seed)
+    for end in sorted(rng.choice(np.arange(100, length), size=samples, replace=False)):
+        history = data.iloc[:end + 1]
+        np.testing.assert_allclose(streamed['atr'].iloc[end], calculate_atr(history, 14), rtol=1e-12)
+        trend = calculate_trendlines(history[['high', 'low', 'close']].copy(), lookback=12, smoothing_window=3,
+                                     smoothing_poly=2)
+        np.testing.assert_allclose(streamed[['support', 'resistance']].iloc[end], trend.iloc[-1], rtol=1e-12)
+    print(f"equivalent on {length} bars (seed {seed}), {samples} sampled histories", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--length', type=int, default=100_000, help='bars for the timing run')
+    parser.add_argument('--check-length', type=int, default=2_000)
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--output', help='write timings to this JSON file')
+    args = parser.parse_args()
+
+    for seed in range(args.seeds):
+        check_equivalence(args.check_length, args.samples, seed)
+
+    data = synthetic_frame(args.length)
+    start = time.perf_counter()
+    make_pipeline().run(data)
+    elapsed = time.perf_counter() - start
+    row = {'length': args.length, 'seconds': elapsed, 'us_per_bar': elapsed / args.length * 1e6}
+    print(json.dumps(row))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(row, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
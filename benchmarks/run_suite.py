@@ -0,0 +1,218 @@
+"""Benchmark suite: times the analysis, HMM and plotting entry points on synthetic data.
+
+Each benchmark runs on seeded data from benchmarks/synthetic.py at every
+size in --sizes. Fast calls are looped, as timeit does, so that each
+measurement takes at least 0.2 s, and the best of --repeat measurements is
+reported; a call taking over a second is run once. Results and the
+environment they were measured in (commit, library versions, CPU count) are
+written as JSON. Comparing two files prints the ratio per benchmark and
+size, and exits with status 1 if any of them slowed down by more than
+--threshold, so a regression between commits is visible.
+
+Benchmarks whose cost grows quickly are capped at a default size that
+keeps a full run to a few minutes; --no-caps runs every size. The
+stock_hmm and cpp_hmm benchmarks are skipped, with a note in the output,
+when the module is not built.
+
+    python benchmarks/run_suite.py --output before.json
+    python benchmarks/run_suite.py --sizes 1000 100000 10000000 --only directional_change vwap
+    python benchmarks/run_suite.py --compare before.json after.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+from python.directional_change import directional_change  # noqa: E402
+from python.plotter import compute_overlays, plot_stock_data  # noqa: E402
+from python.relativestrength import calculate_relative_strength  # noqa: E402
+from python.trendline import calculate_trendlines  # noqa: E402
+from python.vwap_calculation import calculate_vwap  # noqa: E402
+from synthetic import discretize, synthetic_frame, synthetic_returns  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+HMM_STATES = 3
+NUM_SYMBOLS = 100
+
+
+def stock_hmm_case(method):
+    def setup(size, seed):
+        import stock_hmm  # type: ignore
+        returns = synthetic_returns(size, seed)
+        model = stock_hmm.StockHMM(HMM_STATES, seed=seed)
+        if method == 'baum_welch':
+            # One EM iteration: the cost of a full fit is this times the iterations to converge
+            return lambda: model.baum_welch(returns, 1, 0.0)
+        observations = discretize(returns, NUM_SYMBOLS)
+        return lambda: getattr(model, method)(observations)
+    return setup
+
+
+def cpp_hmm_viterbi(size, seed):
+    import cpp_hmm  # type: ignore
+    rng = np.random.default_rng(seed)
+    model = cpp_hmm.HMM(HMM_STATES, NUM_SYMBOLS)
+    transitions = rng.random((HMM_STATES, HMM_STATES)) + np.eye(HMM_STATES) * 10
+    emissions = rng.random((HMM_STATES, NUM_SYMBOLS))
+    model.transition_probs = (transitions / transitions.sum(axis=1, keepdims=True)).tolist()
+    model.emission_probs = (emissions / emissions.sum(axis=1, keepdims=True)).tolist()
+    model.initial_probs = [1 / HMM_STATES] * HMM_STATES
+    # Includes converting the observations to a std::vector, as callers pay that too
+    observations = discretize(synthetic_returns(size, seed), NUM_SYMBOLS).tolist()
+    return lambda: cpp_hmm.viterbi(model, observations)
+
+
+def directional_change_case(size, seed):
+    df = synthetic_frame(size, seed)
+    return lambda: directional_change(df['high'], df['low'], df['close'])
+
+
+def trendlines_case(size, seed):
+    df = synthetic_frame(size, seed)[['high', 'low', 'close']]
+    return lambda: calculate_trendlines(df.copy())
+
+
+def relative_strength_case(size, seed):
+    df, spy = synthetic_frame(size, seed), synthetic_frame(size, seed + 100)
+    return lambda: calculate_relative_strength(df, spy)
+
+
+def vwap_case(size, seed):
+    df = synthetic_frame(size, seed)
+    return lambda: calculate_vwap(df)
+
+
+def plot_case(size, seed):
+    # Building and drawing the chart; the overlays are computed once, as the GUI does off the Tk thread
+    df = synthetic_frame(size, seed)
+    overlays = compute_overlays(df)
+
+    def run():
+        fig = plt.figure(figsize=(10, 6), dpi=100)
+        with contextlib.redirect_stdout(io.StringIO()):  # plot_stock_data reports its progress
+            plot_stock_data(fig, df, 'SYN', relative_strength='Relative Strength: 0.1000', overlays=overlays)
+        fig.canvas.draw()
+        plt.close(fig)
+    return run
+
+
+# name: (setup(size, seed) returning the call to time, default maximum size or None)
+BENCHMARKS = {
+    'stock_hmm.baum_welch': (stock_hmm_case('baum_welch'), None),
+    'stock_hmm.viterbi': (stock_hmm_case('viterbi'), None),
+    'stock_hmm.forward': (stock_hmm_case('forward'), None),
+    'cpp_hmm.viterbi': (cpp_hmm_viterbi, None),
+    'directional_change': (directional_change_case, None),
+    'calculate_trendlines': (trendlines_case, 1_000_000),  # ~10 s at 10^6 bars
+    'calculate_relative_strength': (relative_strength_case, None),
+    'calculate_vwap': (vwap_case, None),
+    'plot_stock_data': (plot_case, 1_000_000),
+}
+
+
+def best_of(func, repeat):
+    """Seconds per call."""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed > 1.0:
+        return elapsed / number
+    return min(timer.repeat(repeat, number)) / number
+
+
+def environment(seed, repeat):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'matplotlib': matplotlib.__version__, 'seed': seed, 'repeat': repeat}
+
+
+def run(names, sizes, seed, repeat, caps=True):
+    results, skipped = [], {}
+    for name in names:
+        setup, max_size = BENCHMARKS[name]
+        for size in sizes:
+            if caps and max_size is not None and size > max_size:
+                continue
+            try:
+                func = setup(size, seed)
+            except ImportError as e:
+                skipped[name] = str(e)
+                print(f"{name}: skipped ({e})", flush=True)
+                break
+            seconds = best_of(func, repeat)
+            row = {'benchmark': name, 'size': size, 'seconds': seconds, 'ns_per_bar': seconds / size * 1e9}
+            results.append(row)
+            print(json.dumps(row), flush=True)
+    return results, skipped
+
+
+def compare(before_path, after_path, threshold):
+    with open(before_path) as f:
+        before = {(row['benchmark'], row['size']): row for row in json.load(f)['results']}
+    with open(after_path) as f:
+        after = json.load(f)['results']
+
+    regressions = 0
+    print(f"{'benchmark':<28} {'size':>9} {'before (s)':>11} {'after (s)':>10} {'ratio':>7}")
+    for row in after:
+        old = before.get((row['benchmark'], row['size']))
+        if old is None:
+            continue
+        ratio = row['seconds'] / old['seconds']
+        flag = ''
+        if ratio > threshold:
+            regressions += 1
+            flag = '  slower'
+        print(f"{row['benchmark']:<28} {row['size']:>9} {old['seconds']:>11.4f} {row['seconds']:>10.4f} "
+              f"{ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--build-dir', default=os.path.join(ROOT, 'Release'),
+                        help='directory containing the compiled stock_hmm and cpp_hmm modules')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='bars per benchmark')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='run only these benchmarks')
+    parser.add_argument('--no-caps', action='store_true', help='run every size, ignoring the per-benchmark caps')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='print ratios between two runs')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='with --compare, fail when a benchmark takes this many times as long')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    sys.path.insert(0, os.path.abspath(args.build_dir))
+    results, skipped = run(args.only or list(BENCHMARKS), args.sizes, args.seed, args.repeat, not args.no_caps)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(args.seed, args.repeat), 'skipped': skipped, 'results': results},
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Seeded synthetic market data shared by the benchmarks.
+
+Every generator is deterministic for a given length and seed, so timings and
+equivalence checks from different commits run on the same data. They are
+vectorized and scale from 10^3 to 10^7 bars.
+"""
+import numpy as np
+import pandas as pd
+
+
+def synthetic_returns(length, seed=0):
+    """Two-regime return series: a calm drift-up state and a volatile drift-down state."""
+    rng = np.random.default_rng(seed)
+    regime = np.cumsum(rng.random(length) < 0.01) % 2
+    calm = rng.normal(0.0002, 0.002, length)
+    volatile = rng.normal(-0.0003, 0.006, length)
+    return np.where(regime == 0, calm, volatile)
+
+
+def discretize(returns, num_symbols=100):
+    """Bucket returns in [-2%, 2%] into num_symbols observation symbols, for the discrete HMM APIs."""
+    symbols = ((returns + 0.02) * num_symbols / 0.04).astype(np.int32)
+    return np.clip(symbols, 0, num_symbols - 1)
+
+
+def synthetic_bars(length, seed=0):
+    """Random-walk 5-minute bars with volatility regimes, including a few flat stretches."""
+    rng = np.random.default_rng(seed)
+    volatility = np.where(np.cumsum(rng.random(length) < 0.002) % 2 == 0, 0.001, 0.004)
+    steps = rng.normal(0.0, volatility)
+    steps[rng.random(length) < 0.01] = 0.0
+    close = 100 * np.exp(np.cumsum(steps))
+    spread = np.abs(rng.normal(0.0, volatility)) * close
+    index = pd.date_range('2020-01-01 09:30', periods=length, freq='5min')
+    return (pd.Series(close + spread, index=index), pd.Series(close - spread, index=index),
+            pd.Series(close, index=index))
+
+
+def synthetic_frame(length, seed=0):
+    """OHLCV DataFrame in the layout the app uses: lower-case columns on a DatetimeIndex."""
+    high, low, close = synthetic_bars(length, seed)
+    rng = np.random.default_rng(seed + 1)
+    open_ = close.shift(fill_value=close.iloc[0])
+    volume = pd.Series(rng.integers(1_000, 100_000, length).astype(np.float64), index=close.index)
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume})
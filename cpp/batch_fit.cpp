@@ -0,0 +1,19 @@
+#include "batch_fit.h"
+
+#include <random>
+#include "parallel.h"
+
+std::vector<StockHMM> fit_batch(const std::vector<SeriesView>& series, int num_states, int max_iterations,
+                                double tolerance, bool streaming, int num_workers, EmissionMode emission) {
+    std::vector<StockHMM> models;
+    models.reserve(series.size());
+    std::random_device rd;
+    for (size_t i = 0; i < series.size(); ++i) {
+        models.emplace_back(num_states, rd(), emission);
+    }
+
+    parallel_for(series.size(), num_workers, [&](size_t i) {
+        models[i].baum_welch(series[i].data, series[i].length, max_iterations, tolerance, streaming);
+    });
+    return models;
+}
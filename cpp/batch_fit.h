@@ -0,0 +1,19 @@
+#ifndef BATCH_FIT_H
+#define BATCH_FIT_H
+
+#include <vector>
+#include "stock_hmm.h"
+
+// A borrowed, contiguous return series
+struct SeriesView {
+    const double* data;
+    int length;
+};
+
+// Fits one StockHMM per series concurrently on num_workers native threads
+// (0 = one per hardware thread). Models are returned in input order.
+std::vector<StockHMM> fit_batch(const std::vector<SeriesView>& series, int num_states, int max_iterations,
+                                double tolerance, bool streaming, int num_workers,
+                                EmissionMode emission = EmissionMode::Discrete);
+
+#endif
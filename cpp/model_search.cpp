@@ -0,0 +1,65 @@
+#include "model_search.h"
+
+#include <cmath>
+#include <random>
+#include <stdexcept>
+#include "parallel.h"
+
+unsigned int candidate_seed(unsigned int seed, int num_states, int restart) {
+    std::seed_seq sequence{seed, static_cast<unsigned int>(num_states), static_cast<unsigned int>(restart)};
+    unsigned int result;
+    sequence.generate(&result, &result + 1);
+    return result;
+}
+
+namespace {
+
+double score_model(const StockHMM& model, const std::string& criterion, double log_likelihood, int T) {
+    if (criterion == "aic") {
+        return model.calculate_aic(log_likelihood);
+    } else if (criterion == "bic") {
+        return model.calculate_bic(log_likelihood, T);
+    } else if (criterion == "hqc") {
+        return model.calculate_hqc(log_likelihood, T);
+    } else if (criterion == "caic") {
+        return model.calculate_caic(log_likelihood, T);
+    }
+    throw std::invalid_argument("unknown criterion '" + criterion + "'; expected aic, bic, hqc or caic");
+}
+
+}  // namespace
+
+ModelSearchResult select_model(const double* returns, int T, const std::vector<int>& candidate_states, int restarts,
+                               const std::string& criterion, unsigned int seed, int max_iterations,
+                               double tolerance, bool streaming, int num_workers, EmissionMode emission) {
+    if (candidate_states.empty() || restarts <= 0) {
+        throw std::invalid_argument("need at least one candidate state count and one restart");
+    }
+    // Validate the criterion before spending time on any fit
+    score_model(StockHMM(1, 0), criterion, 0.0, T);
+
+    std::vector<StockHMM> models;
+    std::vector<CandidateScore> scores;
+    for (int num_states : candidate_states) {
+        for (int restart = 0; restart < restarts; ++restart) {
+            unsigned int model_seed = candidate_seed(seed, num_states, restart);
+            models.emplace_back(num_states, model_seed, emission);
+            scores.push_back({num_states, restart, model_seed, 0.0, 0.0});
+        }
+    }
+
+    parallel_for(models.size(), num_workers, [&](size_t i) {
+        models[i].baum_welch(returns, T, max_iterations, tolerance, streaming);
+        scores[i].log_likelihood = models[i].log_likelihood(returns, T);
+        scores[i].score = score_model(models[i], criterion, scores[i].log_likelihood, T);
+    });
+
+    // NaN scores (degenerate fits) never win
+    size_t best = 0;
+    for (size_t i = 1; i < scores.size(); ++i) {
+        if (scores[i].score < scores[best].score || std::isnan(scores[best].score)) {
+            best = i;
+        }
+    }
+    return {std::move(models[best]), std::move(scores)};
+}
@@ -0,0 +1,33 @@
+#ifndef MODEL_SEARCH_H
+#define MODEL_SEARCH_H
+
+#include <string>
+#include <vector>
+#include "stock_hmm.h"
+
+struct CandidateScore {
+    int num_states;
+    int restart;
+    unsigned int seed;
+    double log_likelihood;
+    double score;
+};
+
+struct ModelSearchResult {
+    StockHMM best_model;
+    std::vector<CandidateScore> scores;
+};
+
+// Seed used for one (num_states, restart) candidate. It depends only on the base
+// seed and the candidate, so results do not change with the worker count.
+unsigned int candidate_seed(unsigned int seed, int num_states, int restart);
+
+// Fits `restarts` randomly initialized models for every candidate state count
+// on num_workers threads and scores each with criterion ("aic", "bic", "hqc"
+// or "caic"; lower is better). Returns the best model and the full score table.
+ModelSearchResult select_model(const double* returns, int T, const std::vector<int>& candidate_states, int restarts,
+                               const std::string& criterion, unsigned int seed, int max_iterations,
+                               double tolerance, bool streaming, int num_workers,
+                               EmissionMode emission = EmissionMode::Discrete);
+
+#endif
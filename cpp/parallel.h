@@ -0,0 +1,64 @@
+#ifndef PARALLEL_H
+#define PARALLEL_H
+
+#include <algorithm>
+#include <atomic>
+#include <cstddef>
+#include <exception>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+// A requested worker count of zero or less means one worker per hardware thread.
+inline int resolve_workers(int requested, size_t tasks) {
+    int workers = requested > 0 ? requested : static_cast<int>(std::thread::hardware_concurrency());
+    workers = std::max(workers, 1);
+    return static_cast<int>(std::min<size_t>(workers, std::max<size_t>(tasks, 1)));
+}
+
+// Runs task(i) for every i in [0, count) on up to num_workers native threads.
+// Indices are handed out one at a time so long and short tasks balance across
+// workers. The calling thread takes part in the work. The first exception thrown
+// by a task stops the remaining tasks and is rethrown here.
+template <typename Task>
+void parallel_for(size_t count, int num_workers, Task task) {
+    int workers = resolve_workers(num_workers, count);
+    if (workers == 1) {
+        for (size_t i = 0; i < count; ++i) {
+            task(i);
+        }
+        return;
+    }
+
+    std::atomic<size_t> next(0);
+    std::exception_ptr error;
+    std::mutex error_mutex;
+    auto worker = [&]() {
+        for (size_t i = next++; i < count; i = next++) {
+            try {
+                task(i);
+            } catch (...) {
+                std::lock_guard<std::mutex> lock(error_mutex);
+                if (!error) {
+                    error = std::current_exception();
+                }
+                next = count;
+            }
+        }
+    };
+
+    std::vector<std::thread> threads;
+    threads.reserve(workers - 1);
+    for (int w = 1; w < workers; ++w) {
+        threads.emplace_back(worker);
+    }
+    worker();
+    for (std::thread& thread : threads) {
+        thread.join();
+    }
+    if (error) {
+        std::rethrow_exception(error);
+    }
+}
+
+#endif
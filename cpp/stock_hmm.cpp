@@ -1,316 +1,779 @@
-#include <vector>
-#include <random>
+#include "stock_hmm.h"
+
 #include <algorithm>
+#include <chrono>
 #include <cmath>
+#include <cstdint>
+#include <cstring>
 #include <limits>
 #include <numeric>
-#include <pybind11/pybind11.h>
-#include <pybind11/stl.h>
-
-namespace py = pybind11;
-
-// Helper function
-double logsumexp(const std::vector<double>& vec) {
-    double max_val = *std::max_element(vec.begin(), vec.end());
+#include <random>
+#include <stdexcept>
+
+namespace {
+
+constexpr double kReturnRange = 0.02;  // Returns are binned over +/-2%
+constexpr double kMinProb = 1e-300;    // Floor before taking logs so empty bins stay finite
+constexpr double kMinStd = 1e-8;
+constexpr int kDriftSpan = 100;        // Bars in the EWMA of the filter's predictive log-likelihood
+constexpr double kNegInf = -std::numeric_limits<double>::infinity();
+constexpr double kPi = 3.14159265358979323846;  // M_PI is not available on MSVC by default
+const double kLogSqrt2Pi = 0.5 * std::log(2.0 * kPi);
+
+double logsumexp(const double* values, int n) {
+    double max_val = *std::max_element(values, values + n);
+    if (max_val == kNegInf) {
+        return kNegInf;
+    }
     double sum = 0.0;
-    for (double x : vec) {
-        sum += std::exp(x - max_val);
+    for (int i = 0; i < n; ++i) {
+        sum += std::exp(values[i] - max_val);
     }
     return max_val + std::log(sum);
 }
 
-class StockHMM {
-private:
-    int num_states;
-    int num_symbols;
-    std::vector<double> initial_probs;
-    std::vector<std::vector<double>> transition_probs;
-    std::vector<std::vector<double>> emission_probs;
-    std::vector<double> mean_returns;
-    std::vector<double> std_returns;
+constexpr char kFormatMagic[4] = {'Q', 'H', 'M', 'M'};
+constexpr std::uint32_t kFormatVersion = 1;
+
+template <typename T>
+void write_value(std::string& out, const T& value) {
+    out.append(reinterpret_cast<const char*>(&value), sizeof(T));
+}
+
+void write_array(std::string& out, const std::vector<double>& values) {
+    out.append(reinterpret_cast<const char*>(values.data()), values.size() * sizeof(double));
+}
 
+// Sequential reader over a serialized model that fails on truncated input
+class SnapshotReader {
 public:
-    StockHMM(int states = 4) : num_states(states), num_symbols(100) {
-        std::random_device rd;
-        std::mt19937 gen(rd());
-        std::uniform_real_distribution<> dis(0.0, 1.0);
-
-        // Initialize probabilities
-        initial_probs.resize(num_states);
-        transition_probs.resize(num_states, std::vector<double>(num_states));
-        emission_probs.resize(num_states, std::vector<double>(num_symbols));
-        mean_returns.resize(num_states);
-        std_returns.resize(num_states);
-
-        // Random initialization
-        for (int i = 0; i < num_states; ++i) {
-            initial_probs[i] = dis(gen);
-            mean_returns[i] = dis(gen) * 0.02 - 0.01;  // Random mean between -1% and 1%
-            std_returns[i] = dis(gen) * 0.02;  // Random std between 0% and 2%
-            for (int j = 0; j < num_states; ++j) {
-                transition_probs[i][j] = dis(gen);
-            }
-            for (int k = 0; k < num_symbols; ++k) {
-                emission_probs[i][k] = dis(gen);
-            }
-        }
+    explicit SnapshotReader(const std::string& data) : data(data) {}
 
-        // Normalize probabilities
-        double sum_initial = std::accumulate(initial_probs.begin(), initial_probs.end(), 0.0);
-        for (int i = 0; i < num_states; ++i) {
-            initial_probs[i] /= sum_initial;
-            double sum_trans = std::accumulate(transition_probs[i].begin(), transition_probs[i].end(), 0.0);
-            double sum_emis = std::accumulate(emission_probs[i].begin(), emission_probs[i].end(), 0.0);
-            for (int j = 0; j < num_states; ++j) {
-                transition_probs[i][j] /= sum_trans;
-            }
-            for (int k = 0; k < num_symbols; ++k) {
-                emission_probs[i][k] /= sum_emis;
-            }
+    template <typename T>
+    T value() {
+        T result;
+        std::memcpy(&result, take(sizeof(T)), sizeof(T));
+        return result;
+    }
+
+    void array(std::vector<double>& values) {
+        if (!values.empty()) {
+            std::memcpy(values.data(), take(values.size() * sizeof(double)), values.size() * sizeof(double));
         }
     }
 
-    std::vector<double> forward(const std::vector<int>& observations) const {
-        int T = observations.size();
-        std::vector<std::vector<double>> alpha(T, std::vector<double>(num_states));
+    bool done() const { return offset == data.size(); }
+    size_t remaining() const { return data.size() - offset; }
+
+private:
+    const std::string& data;
+    size_t offset = 0;
 
-        // Initialize
-        for (int i = 0; i < num_states; ++i) {
-            alpha[0][i] = std::log(initial_probs[i]) + std::log(emission_probs[i][observations[0]]);
+    const char* take(size_t size) {
+        if (data.size() - offset < size) {
+            throw std::invalid_argument("serialized model is truncated");
         }
+        const char* result = data.data() + offset;
+        offset += size;
+        return result;
+    }
+};
 
-        // Iterate
-        for (int t = 1; t < T; ++t) {
-            for (int j = 0; j < num_states; ++j) {
-                std::vector<double> temp(num_states);
-                for (int i = 0; i < num_states; ++i) {
-                    temp[i] = alpha[t-1][i] + std::log(transition_probs[i][j]);
-                }
-                alpha[t][j] = logsumexp(temp) + std::log(emission_probs[j][observations[t]]);
+void require_observations(int T) {
+    if (T <= 0) {
+        throw std::invalid_argument("observation sequence must not be empty");
+    }
+}
+
+}  // namespace
+
+StockHMM::StockHMM(int states) : StockHMM(states, std::random_device()()) {}
+
+StockHMM::StockHMM(int states, unsigned int seed, EmissionMode emission)
+    : num_states(states), num_symbols(100), emission_mode(emission) {
+    if (num_states <= 0) {
+        throw std::invalid_argument("number of states must be positive");
+    }
+    std::mt19937 gen(seed);
+    std::uniform_real_distribution<> dis(0.0, 1.0);
+
+    const int N = num_states;
+    const int M = num_symbols;
+    const bool discrete = emission_mode == EmissionMode::Discrete;
+    initial_probs.resize(N);
+    transition_probs.resize(N * N);
+    emission_probs.resize(discrete ? N * M : 0);
+    mean_returns.resize(N);
+    std_returns.resize(N);
+
+    // Random initialization. The emission draws are made in both modes so a seed
+    // yields the same transition and moment initialization either way.
+    for (int i = 0; i < N; ++i) {
+        initial_probs[i] = dis(gen);
+        mean_returns[i] = dis(gen) * 0.02 - 0.01;  // Random mean between -1% and 1%
+        std_returns[i] = std::max(dis(gen) * 0.02, kMinStd);  // Random std between 0% and 2%
+        for (int j = 0; j < N; ++j) {
+            transition_probs[i * N + j] = dis(gen);
+        }
+        for (int k = 0; k < M; ++k) {
+            double value = dis(gen);
+            if (discrete) {
+                emission_probs[i * M + k] = value;
             }
         }
+    }
 
-        return alpha.back();
+    // Normalize probabilities
+    double sum_initial = std::accumulate(initial_probs.begin(), initial_probs.end(), 0.0);
+    for (int i = 0; i < N; ++i) {
+        initial_probs[i] /= sum_initial;
+        double* trans_row = &transition_probs[i * N];
+        double sum_trans = std::accumulate(trans_row, trans_row + N, 0.0);
+        for (int j = 0; j < N; ++j) {
+            trans_row[j] /= sum_trans;
+        }
+        if (discrete) {
+            double* emis_row = &emission_probs[i * M];
+            double sum_emis = std::accumulate(emis_row, emis_row + M, 0.0);
+            for (int k = 0; k < M; ++k) {
+                emis_row[k] /= sum_emis;
+            }
+        }
     }
 
-    std::vector<int> viterbi(const std::vector<int>& observations) const {
-        int T = observations.size();
-        std::vector<std::vector<double>> delta(T, std::vector<double>(num_states));
-        std::vector<std::vector<int>> psi(T, std::vector<int>(num_states));
+    refresh_log_tables();
+}
 
-        // Initialize
-        for (int i = 0; i < num_states; ++i) {
-            delta[0][i] = std::log(initial_probs[i]) + std::log(emission_probs[i][observations[0]]);
-            psi[0][i] = 0;
+void StockHMM::refresh_log_tables() {
+    const int N = num_states;
+    const int M = num_symbols;
+    log_initial.resize(N);
+    log_transition.resize(N * N);
+    log_transition_t.resize(N * N);
+    next_state_means.assign(N, 0.0);
+
+    for (int i = 0; i < N; ++i) {
+        log_initial[i] = std::log(std::max(initial_probs[i], kMinProb));
+        for (int j = 0; j < N; ++j) {
+            double value = std::log(std::max(transition_probs[i * N + j], kMinProb));
+            log_transition[i * N + j] = value;
+            log_transition_t[j * N + i] = value;
+            next_state_means[i] += transition_probs[i * N + j] * mean_returns[j];
         }
+    }
 
-        // Iterate
-        for (int t = 1; t < T; ++t) {
-            for (int j = 0; j < num_states; ++j) {
-                delta[t][j] = -std::numeric_limits<double>::infinity();
-                for (int i = 0; i < num_states; ++i) {
-                    double prob = delta[t-1][i] + std::log(transition_probs[i][j]) + std::log(emission_probs[j][observations[t]]);
-                    if (prob > delta[t][j]) {
-                        delta[t][j] = prob;
-                        psi[t][j] = i;
-                    }
-                }
+    if (emission_mode == EmissionMode::Discrete) {
+        log_emission.resize(M * N);
+        for (int i = 0; i < N; ++i) {
+            for (int k = 0; k < M; ++k) {
+                log_emission[k * N + i] = std::log(std::max(emission_probs[i * M + k], kMinProb));
             }
         }
+    } else {
+        inv_std_returns.resize(N);
+        log_density_norm.resize(N);
+        for (int i = 0; i < N; ++i) {
+            inv_std_returns[i] = 1.0 / std_returns[i];
+            log_density_norm[i] = -std::log(std_returns[i]) - kLogSqrt2Pi;
+        }
+    }
+}
 
-        // Backtrack
-        std::vector<int> path(T);
-        path[T-1] = std::max_element(delta[T-1].begin(), delta[T-1].end()) - delta[T-1].begin();
-        for (int t = T - 2; t >= 0; --t) {
-            path[t] = psi[t+1][path[t+1]];
+// Rebuilds the binned emission table from the per-state Gaussian moments. The
+// bins match discretize_returns; the outer two are open-ended because
+// discretization clamps out-of-range returns into them.
+void StockHMM::update_emission_probs() {
+    const int M = num_symbols;
+    const double width = 2.0 * kReturnRange / M;
+    for (int i = 0; i < num_states; ++i) {
+        double scale = std_returns[i] * std::sqrt(2.0);
+        double lower_cdf = -1.0;
+        for (int k = 0; k < M; ++k) {
+            double upper_cdf = 1.0;
+            if (k < M - 1) {
+                double upper = -kReturnRange + (k + 1) * width;
+                upper_cdf = std::erf((upper - mean_returns[i]) / scale);
+            }
+            emission_probs[i * M + k] = (upper_cdf - lower_cdf) / 2;
+            lower_cdf = upper_cdf;
         }
+    }
+}
 
-        return path;
+void StockHMM::require_discrete() const {
+    if (emission_mode != EmissionMode::Discrete) {
+        throw std::invalid_argument("symbol observations require the discrete emission mode; pass returns instead");
     }
+}
 
-    void baum_welch(const std::vector<double>& returns, int max_iterations = 100, double tolerance = 1e-6) {
-        int T = returns.size();
-        std::vector<int> discretized_returns = discretize_returns(returns);
-        double prev_log_likelihood = -std::numeric_limits<double>::infinity();
+void StockHMM::gaussian_log_densities(double r, double* out) const {
+    for (int i = 0; i < num_states; ++i) {
+        double z = (r - mean_returns[i]) * inv_std_returns[i];
+        out[i] = log_density_norm[i] - 0.5 * z * z;
+    }
+}
 
-        for (int iteration = 0; iteration < max_iterations; ++iteration) {
-            // Forward-Backward algorithm
-            auto [alpha, beta, log_likelihood] = forward_backward(discretized_returns);
+const double* StockHMM::emission_row(double r, double* buffer) const {
+    if (emission_mode == EmissionMode::Discrete) {
+        return log_emission_row(discretize(r));
+    }
+    gaussian_log_densities(r, buffer);
+    return buffer;
+}
 
-            // Compute gamma and xi
-            std::vector<std::vector<double>> gamma(T, std::vector<double>(num_states));
-            std::vector<std::vector<std::vector<double>>> xi(T-1, std::vector<std::vector<double>>(num_states, std::vector<double>(num_states)));
+StockHMM::EmissionRows StockHMM::emission_rows(const double* returns, int T, std::vector<int>& symbols,
+                                               std::vector<double>& densities) const {
+    if (emission_mode == EmissionMode::Discrete) {
+        symbols = discretize_returns(returns, T);
+        return {log_emission.data(), symbols.data(), num_states};
+    }
+    const int N = num_states;
+    densities.resize(static_cast<size_t>(T) * N);
+    for (int t = 0; t < T; ++t) {
+        gaussian_log_densities(returns[t], &densities[t * static_cast<size_t>(N)]);
+    }
+    return {densities.data(), nullptr, N};
+}
 
-            for (int t = 0; t < T; ++t) {
-                for (int i = 0; i < num_states; ++i) {
-                    gamma[t][i] = std::exp(alpha[t][i] + beta[t][i] - log_likelihood);
-                    if (t < T - 1) {
-                        for (int j = 0; j < num_states; ++j) {
-                            xi[t][i][j] = std::exp(alpha[t][i] + std::log(transition_probs[i][j]) +
-                                                   std::log(emission_probs[j][discretized_returns[t+1]]) +
-                                                   beta[t+1][j] - log_likelihood);
-                        }
-                    }
-                }
-            }
+void StockHMM::init_alpha(const double* log_b, double* alpha) const {
+    for (int i = 0; i < num_states; ++i) {
+        alpha[i] = log_initial[i] + log_b[i];
+    }
+}
 
-            // Update parameters
-            for (int i = 0; i < num_states; ++i) {
-                initial_probs[i] = gamma[0][i];
-
-                double sum_gamma = 0;
-                double sum_returns = 0;
-                double sum_squared_returns = 0;
-                for (int t = 0; t < T - 1; ++t) {
-                    sum_gamma += gamma[t][i];
-                    sum_returns += gamma[t][i] * returns[t];
-                    sum_squared_returns += gamma[t][i] * returns[t] * returns[t];
-                }
+void StockHMM::forward_step(const double* alpha, const double* log_b, double* next, double* scratch) const {
+    const int N = num_states;
+    for (int j = 0; j < N; ++j) {
+        const double* log_a = &log_transition_t[j * N];
+        for (int i = 0; i < N; ++i) {
+            scratch[i] = alpha[i] + log_a[i];
+        }
+        next[j] = logsumexp(scratch, N) + log_b[j];
+    }
+}
 
-                for (int j = 0; j < num_states; ++j) {
-                    double sum_xi = 0;
-                    for (int t = 0; t < T - 1; ++t) {
-                        sum_xi += xi[t][i][j];
-                    }
-                    transition_probs[i][j] = sum_xi / sum_gamma;
-                }
+std::vector<double> StockHMM::run_forward(const EmissionRows& rows, int T) const {
+    require_observations(T);
+    std::vector<double> alpha(num_states), next(num_states), scratch(num_states);
 
-                mean_returns[i] = sum_returns / sum_gamma;
-                std_returns[i] = std::sqrt(sum_squared_returns / sum_gamma - mean_returns[i] * mean_returns[i]);
+    init_alpha(rows[0], alpha.data());
+    for (int t = 1; t < T; ++t) {
+        forward_step(alpha.data(), rows[t], next.data(), scratch.data());
+        alpha.swap(next);
+    }
 
-                for (int k = 0; k < num_symbols; ++k) {
-                    double lower = (k - num_symbols/2) * (4.0 / num_symbols);
-                    double upper = (k - num_symbols/2 + 1) * (4.0 / num_symbols);
-                    emission_probs[i][k] = (std::erf((upper - mean_returns[i]) / (std_returns[i] * std::sqrt(2))) -
-                                            std::erf((lower - mean_returns[i]) / (std_returns[i] * std::sqrt(2)))) / 2;
+    return alpha;
+}
+
+std::vector<int> StockHMM::run_viterbi(const EmissionRows& rows, int T) const {
+    require_observations(T);
+    const int N = num_states;
+    std::vector<double> delta(N), next(N);
+    std::vector<int> psi(static_cast<size_t>(T) * N, 0);
+
+    // Initialize
+    init_alpha(rows[0], delta.data());
+
+    // Iterate
+    for (int t = 1; t < T; ++t) {
+        const double* log_b = rows[t];
+        int* psi_t = &psi[static_cast<size_t>(t) * N];
+        for (int j = 0; j < N; ++j) {
+            const double* log_a = &log_transition_t[j * N];
+            double best = kNegInf;
+            int best_state = 0;
+            for (int i = 0; i < N; ++i) {
+                double prob = delta[i] + log_a[i];
+                if (prob > best) {
+                    best = prob;
+                    best_state = i;
                 }
             }
+            next[j] = best + log_b[j];
+            psi_t[j] = best_state;
+        }
+        delta.swap(next);
+    }
 
-            // Check for convergence
-            if (std::abs(log_likelihood - prev_log_likelihood) < tolerance) {
-                break;
-            }
-            prev_log_likelihood = log_likelihood;
+    // Backtrack
+    std::vector<int> path(T);
+    path[T - 1] = std::max_element(delta.begin(), delta.end()) - delta.begin();
+    for (int t = T - 2; t >= 0; --t) {
+        path[t] = psi[static_cast<size_t>(t + 1) * N + path[t + 1]];
+    }
+
+    return path;
+}
+
+std::vector<double> StockHMM::forward(const int* observations, int T) const {
+    require_discrete();
+    return run_forward({log_emission.data(), observations, num_states}, T);
+}
+
+std::vector<int> StockHMM::viterbi(const int* observations, int T) const {
+    require_discrete();
+    return run_viterbi({log_emission.data(), observations, num_states}, T);
+}
+
+std::vector<int> StockHMM::decode(const double* returns, int T) const {
+    std::vector<int> symbols;
+    std::vector<double> densities;
+    return run_viterbi(emission_rows(returns, T, symbols, densities), T);
+}
+
+void StockHMM::backward_step(const double* beta_next, const double* log_b_next, double* beta,
+                             double* scratch, double* weighted) const {
+    const int N = num_states;
+    for (int j = 0; j < N; ++j) {
+        weighted[j] = log_b_next[j] + beta_next[j];
+    }
+    for (int i = 0; i < N; ++i) {
+        const double* log_a = &log_transition[i * N];
+        for (int j = 0; j < N; ++j) {
+            scratch[j] = log_a[j] + weighted[j];
+        }
+        beta[i] = logsumexp(scratch, N);
+    }
+}
+
+double StockHMM::forward_backward(const EmissionRows& rows, int T,
+                                  std::vector<double>& alpha, std::vector<double>& beta) const {
+    require_observations(T);
+    const int N = num_states;
+    const size_t size = static_cast<size_t>(T) * N;
+    alpha.resize(size);
+    beta.resize(size);
+    std::vector<double> scratch(N), weighted(N);
+
+    // Forward pass
+    init_alpha(rows[0], alpha.data());
+    for (int t = 1; t < T; ++t) {
+        forward_step(&alpha[(t - 1) * static_cast<size_t>(N)], rows[t],
+                     &alpha[t * static_cast<size_t>(N)], scratch.data());
+    }
+
+    // Backward pass
+    std::fill(beta.end() - N, beta.end(), 0.0);
+    for (int t = T - 2; t >= 0; --t) {
+        backward_step(&beta[(t + 1) * static_cast<size_t>(N)], rows[t + 1],
+                      &beta[t * static_cast<size_t>(N)], scratch.data(), weighted.data());
+    }
+
+    return logsumexp(&alpha[(T - 1) * static_cast<size_t>(N)], N);
+}
+
+void StockHMM::ExpectedCounts::reset(int N) {
+    log_likelihood = 0.0;
+    initial.assign(N, 0.0);
+    transitions.assign(N * N, 0.0);
+    transition_totals.assign(N, 0.0);
+    occupancy.assign(N, 0.0);
+    return_sum.assign(N, 0.0);
+    squared_sum.assign(N, 0.0);
+}
+
+// Adds the state posterior at one bar to the occupancy and return-moment sums.
+void StockHMM::accumulate_state(const double* alpha, const double* beta, double r, bool first, bool last,
+                                ExpectedCounts& counts) const {
+    for (int i = 0; i < num_states; ++i) {
+        double gamma = std::exp(alpha[i] + beta[i] - counts.log_likelihood);
+        if (first) {
+            counts.initial[i] = gamma;
+        }
+        counts.occupancy[i] += gamma;
+        counts.return_sum[i] += gamma * r;
+        counts.squared_sum[i] += gamma * r * r;
+        if (!last) {
+            counts.transition_totals[i] += gamma;
         }
     }
+}
 
-    std::tuple<std::vector<std::vector<double>>, std::vector<std::vector<double>>, double>
-    forward_backward(const std::vector<int>& observations) const {
-        int T = observations.size();
-        std::vector<std::vector<double>> alpha(T, std::vector<double>(num_states));
-        std::vector<std::vector<double>> beta(T, std::vector<double>(num_states, 0.0));
+// Adds the expected transitions between bar t and t+1 without materializing xi.
+void StockHMM::accumulate_transitions(const double* alpha, const double* beta_next, const double* log_b_next,
+                                      ExpectedCounts& counts, double* weighted) const {
+    const int N = num_states;
+    for (int j = 0; j < N; ++j) {
+        weighted[j] = log_b_next[j] + beta_next[j] - counts.log_likelihood;
+    }
+    for (int i = 0; i < N; ++i) {
+        const double* log_a = &log_transition[i * N];
+        double* row = &counts.transitions[i * N];
+        for (int j = 0; j < N; ++j) {
+            row[j] += std::exp(alpha[i] + log_a[j] + weighted[j]);
+        }
+    }
+}
 
-        // Forward pass
-        for (int i = 0; i < num_states; ++i) {
-            alpha[0][i] = std::log(initial_probs[i]) + std::log(emission_probs[i][observations[0]]);
+void StockHMM::expectation(const double* returns, const EmissionRows& rows, int T,
+                           std::vector<double>& alpha, std::vector<double>& beta, ExpectedCounts& counts) const {
+    const int N = num_states;
+    std::vector<double> weighted(N);
+    counts.reset(N);
+    counts.log_likelihood = forward_backward(rows, T, alpha, beta);
+
+    for (int t = 0; t < T; ++t) {
+        const double* alpha_t = &alpha[t * static_cast<size_t>(N)];
+        accumulate_state(alpha_t, &beta[t * static_cast<size_t>(N)], returns[t], t == 0, t == T - 1, counts);
+        if (t < T - 1) {
+            accumulate_transitions(alpha_t, &beta[(t + 1) * static_cast<size_t>(N)], rows[t + 1],
+                                   counts, weighted.data());
         }
-        for (int t = 1; t < T; ++t) {
-            for (int j = 0; j < num_states; ++j) {
-                std::vector<double> temp(num_states);
-                for (int i = 0; i < num_states; ++i) {
-                    temp[i] = alpha[t-1][i] + std::log(transition_probs[i][j]);
-                }
-                alpha[t][j] = logsumexp(temp) + std::log(emission_probs[j][observations[t]]);
+    }
+}
+
+// Checkpointed E-step: the forward pass keeps alpha only every K ~ sqrt(T) bars,
+// and the backward sweep recomputes one block of K alphas at a time from its
+// checkpoint. Memory is O(N^2 + sqrt(T) * N) at the cost of a second forward pass.
+void StockHMM::expectation_checkpointed(const double* returns, int T, ExpectedCounts& counts) const {
+    const int N = num_states;
+    const int K = std::max(1, static_cast<int>(std::ceil(std::sqrt(static_cast<double>(T)))));
+    const int num_blocks = (T + K - 1) / K;
+    std::vector<double> checkpoints(static_cast<size_t>(num_blocks) * N);
+    std::vector<double> block(static_cast<size_t>(K) * N);
+    std::vector<double> alpha(N), next(N), beta(N), beta_next(N), scratch(N), weighted(N), row(N);
+    counts.reset(N);
+
+    // Forward pass, keeping only the checkpoints
+    init_alpha(emission_row(returns[0], row.data()), alpha.data());
+    std::copy(alpha.begin(), alpha.end(), checkpoints.begin());
+    for (int t = 1; t < T; ++t) {
+        forward_step(alpha.data(), emission_row(returns[t], row.data()), next.data(), scratch.data());
+        alpha.swap(next);
+        if (t % K == 0) {
+            std::copy(alpha.begin(), alpha.end(), checkpoints.begin() + static_cast<size_t>(t / K) * N);
+        }
+    }
+    counts.log_likelihood = logsumexp(alpha.data(), N);
+
+    // Backward sweep, one block at a time
+    for (int b = num_blocks - 1; b >= 0; --b) {
+        const int start = b * K;
+        const int end = std::min(T, start + K);
+        std::copy(checkpoints.begin() + static_cast<size_t>(b) * N,
+                  checkpoints.begin() + static_cast<size_t>(b + 1) * N, block.begin());
+        for (int t = start + 1; t < end; ++t) {
+            forward_step(&block[(t - start - 1) * static_cast<size_t>(N)], emission_row(returns[t], row.data()),
+                         &block[(t - start) * static_cast<size_t>(N)], scratch.data());
+        }
+
+        for (int t = end - 1; t >= start; --t) {
+            const double* alpha_t = &block[(t - start) * static_cast<size_t>(N)];
+            if (t == T - 1) {
+                std::fill(beta.begin(), beta.end(), 0.0);
+            } else {
+                const double* log_b_next = emission_row(returns[t + 1], row.data());
+                backward_step(beta_next.data(), log_b_next, beta.data(), scratch.data(), weighted.data());
+                accumulate_transitions(alpha_t, beta_next.data(), log_b_next, counts, weighted.data());
             }
+            accumulate_state(alpha_t, beta.data(), returns[t], t == 0, t == T - 1, counts);
+            beta.swap(beta_next);
         }
+    }
+}
 
-        // Backward pass
-        for (int t = T - 2; t >= 0; --t) {
-            for (int i = 0; i < num_states; ++i) {
-                std::vector<double> temp(num_states);
-                for (int j = 0; j < num_states; ++j) {
-                    temp[j] = std::log(transition_probs[i][j]) + std::log(emission_probs[j][observations[t+1]]) + beta[t+1][j];
-                }
-                beta[t][i] = logsumexp(temp);
+void StockHMM::maximize(const ExpectedCounts& counts) {
+    const int N = num_states;
+    for (int i = 0; i < N; ++i) {
+        initial_probs[i] = counts.initial[i];
+
+        if (counts.transition_totals[i] > 0) {
+            for (int j = 0; j < N; ++j) {
+                transition_probs[i * N + j] = counts.transitions[i * N + j] / counts.transition_totals[i];
             }
         }
 
-        double log_likelihood = logsumexp(alpha.back());
-        return {alpha, beta, log_likelihood};
+        if (counts.occupancy[i] > 0) {
+            mean_returns[i] = counts.return_sum[i] / counts.occupancy[i];
+            double variance = counts.squared_sum[i] / counts.occupancy[i] - mean_returns[i] * mean_returns[i];
+            std_returns[i] = std::max(std::sqrt(std::max(variance, 0.0)), kMinStd);
+        }
+    }
+    if (emission_mode == EmissionMode::Discrete) {
+        update_emission_probs();
     }
+    refresh_log_tables();
+}
+
+void StockHMM::baum_welch(const double* returns, int T, int max_iterations, double tolerance, bool streaming) {
+    require_observations(T);
+    double prev_log_likelihood = kNegInf;
+
+    // Buffers shared by every iteration; the streaming mode keeps no per-bar state
+    ExpectedCounts counts;
+    std::vector<int> symbols;
+    std::vector<double> densities, alpha, beta;
+    convergence_trace.clear();
+    iteration_seconds.clear();
+
+    for (int iteration = 0; iteration < max_iterations; ++iteration) {
+        auto started = std::chrono::steady_clock::now();
+        if (streaming) {
+            expectation_checkpointed(returns, T, counts);
+        } else {
+            // Gaussian log-densities depend on the parameters, so the rows are rebuilt every iteration
+            EmissionRows rows = emission_rows(returns, T, symbols, densities);
+            expectation(returns, rows, T, alpha, beta, counts);
+        }
+        maximize(counts);
+        convergence_trace.push_back(counts.log_likelihood);
+        iteration_seconds.push_back(std::chrono::duration<double>(std::chrono::steady_clock::now() - started).count());
 
-    std::vector<int> discretize_returns(const std::vector<double>& returns) const {
-        std::vector<int> discretized(returns.size());
-        for (size_t i = 0; i < returns.size(); ++i) {
-            int symbol = static_cast<int>((returns[i] + 0.02) * num_symbols / 0.04);
-            discretized[i] = std::max(0, std::min(num_symbols - 1, symbol));
+        // Check for convergence
+        if (std::abs(counts.log_likelihood - prev_log_likelihood) < tolerance) {
+            break;
         }
-        return discretized;
+        prev_log_likelihood = counts.log_likelihood;
     }
 
-    double predict_next_return() const {
+    // The parameters changed, so any running filter state is stale
+    fit_log_likelihood_per_bar = counts.log_likelihood / T;
+    reset_filter();
+}
+
+double StockHMM::log_likelihood(const double* returns, int T) const {
+    std::vector<int> symbols;
+    std::vector<double> densities;
+    std::vector<double> alpha = run_forward(emission_rows(returns, T, symbols, densities), T);
+    return logsumexp(alpha.data(), num_states);
+}
+
+int StockHMM::discretize(double r) const {
+    int symbol = static_cast<int>((r + kReturnRange) * num_symbols / (2 * kReturnRange));
+    return std::max(0, std::min(num_symbols - 1, symbol));
+}
+
+std::vector<int> StockHMM::discretize_returns(const double* returns, int T) const {
+    std::vector<int> discretized(T);
+    for (int i = 0; i < T; ++i) {
+        discretized[i] = discretize(returns[i]);
+    }
+    return discretized;
+}
+
+double StockHMM::predict_next_return() const {
+    double predicted_return = 0.0;
+    for (int i = 0; i < num_states; ++i) {
+        predicted_return += initial_probs[i] * mean_returns[i];
+    }
+    return predicted_return;
+}
+
+int StockHMM::num_params() const {
+    if (emission_mode == EmissionMode::Gaussian) {
+        return num_states * (num_states - 1) + num_states * 2;
+    }
+    return num_states * (num_states - 1) + num_states * (num_symbols - 1) + num_states * 2;
+}
+
+double StockHMM::calculate_aic(double log_likelihood) const {
+    return 2 * num_params() - 2 * log_likelihood;
+}
+
+double StockHMM::calculate_bic(double log_likelihood, int num_observations) const {
+    return num_params() * std::log(num_observations) - 2 * log_likelihood;
+}
+
+double StockHMM::calculate_hqc(double log_likelihood, int num_observations) const {
+    return -2 * log_likelihood + 2 * num_params() * std::log(std::log(num_observations));
+}
+
+double StockHMM::calculate_caic(double log_likelihood, int num_observations) const {
+    return -2 * log_likelihood + num_params() * (std::log(num_observations) + 1);
+}
+
+double StockHMM::calculate_out_of_sample_r_squared(const double* true_returns, const double* predicted_returns, int n) const {
+    double mean_return = std::accumulate(true_returns, true_returns + n, 0.0) / n;
+    double tss = 0.0, rss = 0.0;
+    for (int i = 0; i < n; ++i) {
+        tss += std::pow(true_returns[i] - mean_return, 2);
+        rss += std::pow(true_returns[i] - predicted_returns[i], 2);
+    }
+    return 1.0 - (rss / tss);
+}
+
+std::string StockHMM::signal_from_return(double predicted_return) {
+    if (predicted_return > 0.005) {  // 0.5% threshold for buying
+        return "BUY";
+    } else if (predicted_return < -0.005) {  // -0.5% threshold for selling
+        return "SELL";
+    } else {
+        return "HOLD";
+    }
+}
+
+std::string StockHMM::get_trading_signal() const {
+    return signal_from_return(predict_next_return());
+}
+
+// One prediction per bar: the filtered state posterior at t is pushed through the
+// transition matrix and weighted by the state means to predict the return at t+1.
+std::vector<double> StockHMM::predict_returns(const double* returns, int T) const {
+    std::vector<double> predicted(T);
+    if (T == 0) {
+        return predicted;
+    }
+    const int N = num_states;
+    std::vector<int> symbols;
+    std::vector<double> densities;
+    EmissionRows rows = emission_rows(returns, T, symbols, densities);
+    std::vector<double> alpha(N), next(N), scratch(N);
+
+    init_alpha(rows[0], alpha.data());
+    for (int t = 0; t < T; ++t) {
+        if (t > 0) {
+            forward_step(alpha.data(), rows[t], next.data(), scratch.data());
+            alpha.swap(next);
+        }
+
+        double norm = logsumexp(alpha.data(), N);
         double predicted_return = 0.0;
-        for (int i = 0; i < num_states; ++i) {
-            predicted_return += initial_probs[i] * mean_returns[i];
+        for (int i = 0; i < N; ++i) {
+            predicted_return += std::exp(alpha[i] - norm) * next_state_means[i];
         }
-        return predicted_return;
+        predicted[t] = predicted_return;
+    }
+    return predicted;
+}
+
+std::vector<std::string> StockHMM::get_trading_signals(const double* returns, int T) const {
+    std::vector<double> predicted = predict_returns(returns, T);
+    std::vector<std::string> signals(T);
+    for (int t = 0; t < T; ++t) {
+        signals[t] = signal_from_return(predicted[t]);
     }
+    return signals;
+}
+
+void StockHMM::reset_filter() {
+    filter_log_posterior.clear();
+    filter_bars = 0;
+    predictive_log_likelihood = std::numeric_limits<double>::quiet_NaN();
+}
 
-    double calculate_aic(double log_likelihood) const {
-        int num_params = num_states * (num_states - 1) + num_states * (num_symbols - 1) + num_states * 2;
-        return 2 * num_params - 2 * log_likelihood;
+FilterUpdate StockHMM::update(double r) {
+    const int N = num_states;
+    filter_next.resize(N);
+    filter_scratch.resize(N);
+    filter_emission.resize(N);
+    const double* log_b = emission_row(r, filter_emission.data());
+    if (filter_log_posterior.empty()) {
+        filter_log_posterior.resize(N);
+        init_alpha(log_b, filter_next.data());
+    } else {
+        forward_step(filter_log_posterior.data(), log_b, filter_next.data(), filter_scratch.data());
     }
 
-    double calculate_bic(double log_likelihood, int num_observations) const {
-        int num_params = num_states * (num_states - 1) + num_states * (num_symbols - 1) + num_states * 2;
-        return num_params * std::log(num_observations) - 2 * log_likelihood;
+    // The previous posterior is normalized, so the mass of the new alpha is p(r_t | r_<t)
+    FilterUpdate result;
+    result.log_predictive = logsumexp(filter_next.data(), N);
+    result.posterior.resize(N);
+    result.predicted_return = 0.0;
+    for (int i = 0; i < N; ++i) {
+        filter_log_posterior[i] = filter_next[i] - result.log_predictive;
+        result.posterior[i] = std::exp(filter_log_posterior[i]);
+        result.predicted_return += result.posterior[i] * next_state_means[i];
     }
+    result.signal = signal_from_return(result.predicted_return);
+
+    const double weight = 2.0 / (kDriftSpan + 1);
+    predictive_log_likelihood = std::isnan(predictive_log_likelihood)
+                                ? result.log_predictive
+                                : weight * result.log_predictive + (1 - weight) * predictive_log_likelihood;
+    ++filter_bars;
+    return result;
+}
 
-    double calculate_hqc(double log_likelihood, int num_observations) const {
-        int num_params = num_states * (num_states - 1) + num_states * (num_symbols - 1) + num_states * 2;
-        return -2 * log_likelihood + 2 * num_params * std::log(std::log(num_observations));
+FilterUpdate StockHMM::filter(const double* returns, int T) {
+    require_observations(T);
+    reset_filter();
+    FilterUpdate result;
+    for (int t = 0; t < T; ++t) {
+        result = update(returns[t]);
     }
+    return result;
+}
 
-    double calculate_caic(double log_likelihood, int num_observations) const {
-        int num_params = num_states * (num_states - 1) + num_states * (num_symbols - 1) + num_states * 2;
-        return -2 * log_likelihood + num_params * (std::log(num_observations) + 1);
+double StockHMM::drift() const {
+    if (filter_bars < kDriftSpan || std::isnan(fit_log_likelihood_per_bar)) {
+        return 0.0;
     }
+    return fit_log_likelihood_per_bar - predictive_log_likelihood;
+}
 
-    double calculate_out_of_sample_r_squared(const std::vector<double>& true_returns, const std::vector<double>& predicted_returns) const {
-        double mean_return = std::accumulate(true_returns.begin(), true_returns.end(), 0.0) / true_returns.size();
-        double tss = 0.0, rss = 0.0;
-        for (size_t i = 0; i < true_returns.size(); ++i) {
-            tss += std::pow(true_returns[i] - mean_return, 2);
-            rss += std::pow(true_returns[i] - predicted_returns[i], 2);
-        }
-        return 1.0 - (rss / tss);
+bool StockHMM::needs_refit(int max_bars, double drift_threshold) const {
+    if (std::isnan(fit_log_likelihood_per_bar)) {
+        return true;  // Never fitted
     }
+    return (max_bars > 0 && filter_bars >= max_bars) || drift() > drift_threshold;
+}
 
-    std::string get_trading_signal() const {
-        double predicted_return = predict_next_return();
-        if (predicted_return > 0.005) {  // 0.5% threshold for buying
-            return "BUY";
-        } else if (predicted_return < -0.005) {  // -0.5% threshold for selling
-            return "SELL";
-        } else {
-            return "HOLD";
-        }
+std::string StockHMM::serialize() const {
+    std::string out(kFormatMagic, sizeof(kFormatMagic));
+    write_value(out, kFormatVersion);
+    write_value(out, static_cast<std::int32_t>(num_states));
+    write_value(out, static_cast<std::int32_t>(num_symbols));
+    write_value(out, static_cast<std::int32_t>(emission_mode));
+    write_value(out, fit_log_likelihood_per_bar);
+    write_array(out, initial_probs);
+    write_array(out, transition_probs);
+    write_array(out, emission_probs);
+    write_array(out, mean_returns);
+    write_array(out, std_returns);
+    return out;
+}
+
+StockHMM StockHMM::deserialize(const std::string& data) {
+    if (data.compare(0, sizeof(kFormatMagic), kFormatMagic, sizeof(kFormatMagic)) != 0) {
+        throw std::invalid_argument("not a serialized StockHMM");
+    }
+    SnapshotReader reader(data);
+    reader.value<std::uint32_t>();  // Magic
+    if (reader.value<std::uint32_t>() != kFormatVersion) {
+        throw std::invalid_argument("unsupported StockHMM format version");
+    }
+    const int states = reader.value<std::int32_t>();
+    const int symbols = reader.value<std::int32_t>();
+    const int mode = reader.value<std::int32_t>();
+    if (symbols != 100 || (mode != static_cast<int>(EmissionMode::Discrete) &&
+                           mode != static_cast<int>(EmissionMode::Gaussian))) {
+        throw std::invalid_argument("serialized StockHMM has an unsupported layout");
+    }
+    // Check the header against the payload size before allocating anything from it
+    const size_t N = states > 0 ? static_cast<size_t>(states) : 0;
+    const size_t emission = mode == static_cast<int>(EmissionMode::Discrete) ? N * static_cast<size_t>(symbols) : 0;
+    const size_t remaining = reader.remaining();
+    if (N == 0 || N > remaining / sizeof(double) ||
+        remaining != sizeof(double) * (1 + N + N * N + emission + 2 * N)) {
+        throw std::invalid_argument("serialized StockHMM size does not match its header");
     }
 
-    // Getter methods
-    std::vector<double> get_initial_probs() const { return initial_probs; }
-    std::vector<std::vector<double>> get_transition_probs() const { return transition_probs; }
-    std::vector<std::vector<double>> get_emission_probs() const { return emission_probs; }
-    std::vector<double> get_mean_returns() const { return mean_returns; }
-    std::vector<double> get_std_returns() const { return std_returns; }
-};
+    // Shapes come from the constructor; the random draws are overwritten below
+    StockHMM model(states, 0, static_cast<EmissionMode>(mode));
+    model.fit_log_likelihood_per_bar = reader.value<double>();
+    reader.array(model.initial_probs);
+    reader.array(model.transition_probs);
+    reader.array(model.emission_probs);
+    reader.array(model.mean_returns);
+    reader.array(model.std_returns);
+    if (!reader.done()) {
+        throw std::invalid_argument("serialized StockHMM has trailing data");
+    }
+    model.refresh_log_tables();
+    return model;
+}
 
-PYBIND11_MODULE(cpp_stock_hmm, m) {
-py::class_<StockHMM>(m, "StockHMM")
-.def(py::init<int>())
-.def("forward", &StockHMM::forward)
-.def("viterbi", &StockHMM::viterbi)
-.def("baum_welch", &StockHMM::baum_welch)
-.def("predict_next_return", &StockHMM::predict_next_return)
-.def("calculate_aic", &StockHMM::calculate_aic)
-.def("calculate_bic", &StockHMM::calculate_bic)
-.def("calculate_hqc", &StockHMM::calculate_hqc)
-.def("calculate_caic", &StockHMM::calculate_caic)
-.def("calculate_out_of_sample_r_squared", &StockHMM::calculate_out_of_sample_r_squared)
-.def("get_trading_signal", &StockHMM::get_trading_signal)
-.def("get_initial_probs", &StockHMM::get_initial_probs)
-.def("get_transition_probs", &StockHMM::get_transition_probs)
-.def("get_emission_probs", &StockHMM::get_emission_probs)
-.def("get_mean_returns", &StockHMM::get_mean_returns)
-.def("get_std_returns", &StockHMM::get_std_returns);
-}
\ No newline at end of file
+void StockHMM::warm_start(const StockHMM& fitted) {
+    if (fitted.num_states != num_states || fitted.num_symbols != num_symbols ||
+        fitted.emission_mode != emission_mode) {
+        throw std::invalid_argument("warm start model must have the same number of states and emission mode");
+    }
+    initial_probs = fitted.initial_probs;
+    transition_probs = fitted.transition_probs;
+    emission_probs = fitted.emission_probs;
+    mean_returns = fitted.mean_returns;
+    std_returns = fitted.std_returns;
+    fit_log_likelihood_per_bar = fitted.fit_log_likelihood_per_bar;
+    refresh_log_tables();
+    reset_filter();
+}
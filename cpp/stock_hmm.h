@@ -0,0 +1,187 @@
+#ifndef STOCK_HMM_H
+#define STOCK_HMM_H
+
+#include <cstddef>
+#include <limits>
+#include <string>
+#include <vector>
+
+// How returns are scored in each state: looked up in a binned table over +/-2%
+// (Discrete), or evaluated as a Gaussian log-density from the state moments.
+enum class EmissionMode { Discrete, Gaussian };
+
+// Result of advancing the online filter by one bar
+struct FilterUpdate {
+    std::vector<double> posterior;  // P(state | returns so far)
+    double predicted_return = 0.0;  // Expected return of the next bar
+    std::string signal;
+    double log_predictive = 0.0;    // log p(r_t | r_<t)
+};
+
+// HMM over intraday returns with discrete (binned) or Gaussian emissions.
+//
+// Parameters are stored as contiguous row-major arrays (transition is N x N,
+// emission is N x num_symbols in discrete mode and empty in Gaussian mode).
+// Log-space copies of the parameters are kept in the layout the inner loops
+// read them in and are refreshed once whenever the parameters change, so
+// forward/backward/viterbi never call std::log per step. In Gaussian mode the
+// per-bar log-densities are computed once per EM iteration into a T x N matrix.
+//
+// An instance is not synchronized. Const methods may run concurrently with each
+// other; baum_welch, warm_start, update, filter and reset_filter need exclusive
+// use of the instance. The Python bindings release the GIL around them, so one
+// instance must be owned by one thread at a time there as well.
+class StockHMM {
+public:
+    explicit StockHMM(int states = 4);
+    // Reproducible random initialization
+    StockHMM(int states, unsigned int seed, EmissionMode emission = EmissionMode::Discrete);
+
+    // Symbol observations (see discretize_returns); discrete mode only
+    std::vector<double> forward(const int* observations, int T) const;
+    std::vector<int> viterbi(const int* observations, int T) const;
+    // Most likely state path for a return series, in either emission mode
+    std::vector<int> decode(const double* returns, int T) const;
+    // streaming=true runs the checkpointed E-step, which keeps O(N^2 + sqrt(T) * N)
+    // state instead of the T x N alpha/beta tables.
+    void baum_welch(const double* returns, int T, int max_iterations = 100, double tolerance = 1e-6,
+                    bool streaming = false);
+
+    double log_likelihood(const double* returns, int T) const;
+    int discretize(double r) const;
+    std::vector<int> discretize_returns(const double* returns, int T) const;
+
+    double predict_next_return() const;
+    double calculate_aic(double log_likelihood) const;
+    double calculate_bic(double log_likelihood, int num_observations) const;
+    double calculate_hqc(double log_likelihood, int num_observations) const;
+    double calculate_caic(double log_likelihood, int num_observations) const;
+    double calculate_out_of_sample_r_squared(const double* true_returns, const double* predicted_returns, int n) const;
+
+    // Predicted next-bar return after each bar of a series, from the filtered posterior (no lookahead)
+    std::vector<double> predict_returns(const double* returns, int T) const;
+    static std::string signal_from_return(double predicted_return);
+    std::string get_trading_signal() const;
+    std::vector<std::string> get_trading_signals(const double* returns, int T) const;
+
+    // Online filtering. The filter keeps the normalized forward vector of the
+    // last bar so each update is O(N^2). baum_welch resets it.
+    void reset_filter();
+    FilterUpdate update(double r);
+    FilterUpdate filter(const double* returns, int T);  // Reset, then update over a history
+    int get_filter_bars() const { return filter_bars; }
+    // Average per-bar log-likelihood at the last fit minus the EWMA of the filter's
+    // predictive log-likelihood (nats per bar); 0 until enough bars were seen.
+    double drift() const;
+    // True after max_bars filtered bars (0 disables the schedule) or once drift() exceeds the threshold.
+    bool needs_refit(int max_bars, double drift_threshold) const;
+
+    // Binary snapshot of the fitted parameters (not the filter state), in host byte order
+    std::string serialize() const;
+    static StockHMM deserialize(const std::string& data);
+    // Start the next baum_welch from another model's parameters; the shapes and emission mode must match
+    void warm_start(const StockHMM& fitted);
+
+    // Getter methods
+    int get_num_states() const { return num_states; }
+    int get_num_symbols() const { return num_symbols; }
+    EmissionMode get_emission_mode() const { return emission_mode; }
+    const std::vector<double>& get_initial_probs() const { return initial_probs; }
+    const std::vector<double>& get_transition_probs() const { return transition_probs; }
+    const std::vector<double>& get_emission_probs() const { return emission_probs; }
+    const std::vector<double>& get_mean_returns() const { return mean_returns; }
+    const std::vector<double>& get_std_returns() const { return std_returns; }
+    // Diagnostics of the last baum_welch, one entry per EM iteration: the log-likelihood of the
+    // parameters the iteration started from, and its wall time. Not serialized.
+    const std::vector<double>& get_convergence_trace() const { return convergence_trace; }
+    const std::vector<double>& get_iteration_seconds() const { return iteration_seconds; }
+
+private:
+    // Sufficient statistics gathered by one E-step
+    struct ExpectedCounts {
+        double log_likelihood = 0.0;
+        std::vector<double> initial;            // N, posterior at t = 0
+        std::vector<double> transitions;        // N x N, expected transition counts
+        std::vector<double> transition_totals;  // N, occupancy over t < T - 1
+        std::vector<double> occupancy;          // N
+        std::vector<double> return_sum;         // N, occupancy-weighted returns
+        std::vector<double> squared_sum;        // N, occupancy-weighted squared returns
+
+        void reset(int N);
+    };
+
+    // Log-emission rows for a whole sequence: a gather from the symbol table in
+    // discrete mode, or a precomputed T x N matrix of Gaussian log-densities.
+    struct EmissionRows {
+        const double* table;
+        const int* index;  // nullptr: row t is table + t * stride
+        int stride;
+
+        const double* operator[](int t) const {
+            return table + static_cast<size_t>(index ? index[t] : t) * stride;
+        }
+    };
+
+    int num_states;
+    int num_symbols;
+    EmissionMode emission_mode;
+    std::vector<double> initial_probs;     // N
+    std::vector<double> transition_probs;  // N x N, row i = from state i
+    std::vector<double> emission_probs;    // N x num_symbols
+    std::vector<double> mean_returns;
+    std::vector<double> std_returns;
+
+    std::vector<double> log_initial;       // N
+    std::vector<double> log_transition;    // N x N, same layout as transition_probs
+    std::vector<double> log_transition_t;  // N x N, transposed: row j = into state j
+    std::vector<double> log_emission;      // num_symbols x N, row k = log P(k | state)
+    std::vector<double> inv_std_returns;   // N, Gaussian mode only
+    std::vector<double> log_density_norm;  // N, -log(std) - log(sqrt(2 pi)), Gaussian mode only
+    std::vector<double> next_state_means;  // N, expected next-bar return given the current state
+
+    // Online filter state
+    std::vector<double> filter_log_posterior;
+    std::vector<double> filter_next;
+    std::vector<double> filter_scratch;
+    std::vector<double> filter_emission;
+    int filter_bars = 0;
+    double predictive_log_likelihood = std::numeric_limits<double>::quiet_NaN();
+    double fit_log_likelihood_per_bar = std::numeric_limits<double>::quiet_NaN();
+
+    std::vector<double> convergence_trace;
+    std::vector<double> iteration_seconds;
+
+    void refresh_log_tables();
+    void update_emission_probs();
+    int num_params() const;
+
+    void require_discrete() const;
+
+    const double* log_emission_row(int observation) const { return &log_emission[observation * num_states]; }
+    void gaussian_log_densities(double r, double* out) const;
+    // Log-emission row for one return; Gaussian mode writes it into buffer (N)
+    const double* emission_row(double r, double* buffer) const;
+    EmissionRows emission_rows(const double* returns, int T, std::vector<int>& symbols,
+                               std::vector<double>& densities) const;
+
+    void init_alpha(const double* log_b, double* alpha) const;
+    void forward_step(const double* alpha, const double* log_b, double* next, double* scratch) const;
+    void backward_step(const double* beta_next, const double* log_b_next, double* beta,
+                       double* scratch, double* weighted) const;
+    std::vector<double> run_forward(const EmissionRows& rows, int T) const;
+    std::vector<int> run_viterbi(const EmissionRows& rows, int T) const;
+    // Fills alpha and beta (T x N, row-major, log space) and returns the log-likelihood.
+    double forward_backward(const EmissionRows& rows, int T,
+                            std::vector<double>& alpha, std::vector<double>& beta) const;
+
+    void accumulate_state(const double* alpha, const double* beta, double r, bool first, bool last,
+                          ExpectedCounts& counts) const;
+    void accumulate_transitions(const double* alpha, const double* beta_next, const double* log_b_next,
+                                ExpectedCounts& counts, double* weighted) const;
+    void expectation(const double* returns, const EmissionRows& rows, int T,
+                     std::vector<double>& alpha, std::vector<double>& beta, ExpectedCounts& counts) const;
+    void expectation_checkpointed(const double* returns, int T, ExpectedCounts& counts) const;
+    void maximize(const ExpectedCounts& counts);
+};
+
+#endif
@@ -0,0 +1,271 @@
+#include <algorithm>
+#include <optional>
+#include <random>
+#include <string>
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+#include <pybind11/stl.h>
+#include "batch_fit.h"
+#include "model_search.h"
+#include "stock_hmm.h"
+
+namespace py = pybind11;
+
+// Buffers are taken as C-contiguous arrays; float64/int32 input of that layout is used in place.
+using DoubleArray = py::array_t<double, py::array::c_style | py::array::forcecast>;
+using IntArray = py::array_t<int, py::array::c_style | py::array::forcecast>;
+
+template <typename T>
+py::array_t<T> to_array(const std::vector<T>& values) {
+    return py::array_t<T>(values.size(), values.data());
+}
+
+py::array_t<double> to_array(const std::vector<double>& values, size_t rows, size_t cols) {
+    py::array_t<double> result({rows, cols});
+    std::copy(values.begin(), values.end(), result.mutable_data());
+    return result;
+}
+
+py::tuple filter_result(const FilterUpdate& update) {
+    return py::make_tuple(to_array(update.posterior), update.predicted_return, update.signal);
+}
+
+EmissionMode parse_emission(const std::string& name) {
+    if (name == "discrete") {
+        return EmissionMode::Discrete;
+    } else if (name == "gaussian") {
+        return EmissionMode::Gaussian;
+    }
+    throw py::value_error("emission must be 'discrete' or 'gaussian', got '" + name + "'");
+}
+
+SeriesView series_view(const DoubleArray& returns) {
+    if (returns.ndim() != 1) {
+        throw py::value_error("each return series must be one-dimensional");
+    }
+    return {returns.data(), static_cast<int>(returns.size())};
+}
+
+// Symbols index the emission table without bounds checks, so they are validated while the GIL is held
+void check_observations(const StockHMM& self, const IntArray& observations) {
+    if (observations.ndim() != 1) {
+        throw py::value_error("observations must be one-dimensional");
+    }
+    const int* data = observations.data();
+    const int num_symbols = self.get_num_symbols();
+    for (py::ssize_t t = 0; t < observations.size(); ++t) {
+        if (data[t] < 0 || data[t] >= num_symbols) {
+            throw py::value_error("observation " + std::to_string(data[t]) + " at index " + std::to_string(t) +
+                                  " is outside [0, " + std::to_string(num_symbols) + ")");
+        }
+    }
+}
+
+// The GIL is released around every native computation; buffers stay alive
+// because the arrays are held by the caller's frame for the whole call. The
+// GIL therefore does not serialize calls on one StockHMM: see the ownership
+// rule in stock_hmm.h.
+PYBIND11_MODULE(stock_hmm, m) {
+py::class_<StockHMM>(m, "StockHMM",
+    "Not thread-safe: fitting and filtering change the model without the GIL, so an instance must not be "
+    "fitted or filtered from two threads at once. Give each thread its own instance (from_bytes makes a copy).")
+.def(py::init([](int states, std::optional<unsigned int> seed, const std::string& emission) {
+    return StockHMM(states, seed ? *seed : std::random_device()(), parse_emission(emission));
+}), py::arg("states") = 4, py::arg("seed") = py::none(), py::arg("emission") = "discrete")
+.def("forward", [](const StockHMM& self, IntArray observations) {
+    check_observations(self, observations);
+    std::vector<double> alpha;
+    {
+        py::gil_scoped_release release;
+        alpha = self.forward(observations.data(), observations.size());
+    }
+    return to_array(alpha);
+}, py::arg("observations"))
+.def("viterbi", [](const StockHMM& self, IntArray observations) {
+    check_observations(self, observations);
+    std::vector<int> path;
+    {
+        py::gil_scoped_release release;
+        path = self.viterbi(observations.data(), observations.size());
+    }
+    return to_array(path);
+}, py::arg("observations"))
+.def("decode", [](const StockHMM& self, DoubleArray returns) {
+    std::vector<int> path;
+    {
+        py::gil_scoped_release release;
+        path = self.decode(returns.data(), returns.size());
+    }
+    return to_array(path);
+}, "Most likely state path for a return series", py::arg("returns"))
+.def("baum_welch", [](StockHMM& self, DoubleArray returns, int max_iterations, double tolerance, bool streaming,
+                      const StockHMM* warm_start) {
+    py::gil_scoped_release release;
+    if (warm_start) {
+        self.warm_start(*warm_start);
+    }
+    self.baum_welch(returns.data(), returns.size(), max_iterations, tolerance, streaming);
+}, "Fit with EM; warm_start=model starts from that model's parameters instead of the current ones",
+py::arg("returns"), py::arg("max_iterations") = 100, py::arg("tolerance") = 1e-6, py::arg("streaming") = false,
+py::arg("warm_start") = nullptr)
+.def("log_likelihood", [](const StockHMM& self, DoubleArray returns) {
+    py::gil_scoped_release release;
+    return self.log_likelihood(returns.data(), returns.size());
+}, py::arg("returns"))
+.def("predict_next_return", &StockHMM::predict_next_return)
+.def("calculate_aic", &StockHMM::calculate_aic)
+.def("calculate_bic", &StockHMM::calculate_bic)
+.def("calculate_hqc", &StockHMM::calculate_hqc)
+.def("calculate_caic", &StockHMM::calculate_caic)
+.def("calculate_out_of_sample_r_squared", [](const StockHMM& self, DoubleArray true_returns, DoubleArray predicted_returns) {
+    if (true_returns.size() != predicted_returns.size()) {
+        throw py::value_error("true_returns and predicted_returns must have the same length");
+    }
+    return self.calculate_out_of_sample_r_squared(true_returns.data(), predicted_returns.data(), true_returns.size());
+}, py::arg("true_returns"), py::arg("predicted_returns"))
+.def("predict_returns", [](const StockHMM& self, DoubleArray returns) {
+    std::vector<double> predicted;
+    {
+        py::gil_scoped_release release;
+        predicted = self.predict_returns(returns.data(), returns.size());
+    }
+    return to_array(predicted);
+}, "Predicted next-bar return after each bar; get_trading_signals thresholds these", py::arg("returns"))
+.def("get_trading_signal", &StockHMM::get_trading_signal)
+.def("get_trading_signals", [](const StockHMM& self, DoubleArray returns) {
+    std::vector<std::string> signals;
+    {
+        py::gil_scoped_release release;
+        signals = self.get_trading_signals(returns.data(), returns.size());
+    }
+    return signals;
+}, py::arg("returns"))
+.def("update", [](StockHMM& self, double new_return) {
+    return filter_result(self.update(new_return));
+}, "Advance the online filter by one bar; returns (posterior, predicted_next_return, signal)",
+py::arg("new_return"))
+.def("filter", [](StockHMM& self, DoubleArray returns) {
+    FilterUpdate result;
+    {
+        py::gil_scoped_release release;
+        result = self.filter(returns.data(), returns.size());
+    }
+    return filter_result(result);
+}, "Reset the online filter and run it over a history; returns the state after the last bar",
+py::arg("returns"))
+.def("reset_filter", &StockHMM::reset_filter)
+.def("drift", &StockHMM::drift)
+.def("needs_refit", &StockHMM::needs_refit, py::arg("max_bars") = 0, py::arg("drift_threshold") = 0.5)
+.def("get_filter_bars", &StockHMM::get_filter_bars)
+.def("get_num_states", &StockHMM::get_num_states)
+.def("get_initial_probs", [](const StockHMM& self) { return to_array(self.get_initial_probs()); })
+.def("get_transition_probs", [](const StockHMM& self) {
+    return to_array(self.get_transition_probs(), self.get_num_states(), self.get_num_states());
+})
+.def("get_emission_probs", [](const StockHMM& self) {
+    // N x num_symbols in discrete mode, N x 0 in Gaussian mode
+    const std::vector<double>& probs = self.get_emission_probs();
+    return to_array(probs, self.get_num_states(), probs.size() / self.get_num_states());
+})
+.def("get_emission", [](const StockHMM& self) {
+    return self.get_emission_mode() == EmissionMode::Gaussian ? "gaussian" : "discrete";
+})
+.def("get_mean_returns", [](const StockHMM& self) { return to_array(self.get_mean_returns()); })
+.def("get_std_returns", [](const StockHMM& self) { return to_array(self.get_std_returns()); })
+.def("get_convergence_trace", [](const StockHMM& self) { return to_array(self.get_convergence_trace()); },
+     "Log-likelihood at each EM iteration of the last baum_welch")
+.def("get_iteration_seconds", [](const StockHMM& self) { return to_array(self.get_iteration_seconds()); },
+     "Wall time of each EM iteration of the last baum_welch")
+.def("to_bytes", [](const StockHMM& self) { return py::bytes(self.serialize()); })
+.def_static("from_bytes", [](const py::bytes& data) { return StockHMM::deserialize(data); }, py::arg("data"))
+.def(py::pickle(
+    [](const StockHMM& self) { return py::bytes(self.serialize()); },
+    [](const py::bytes& data) { return StockHMM::deserialize(data); }));
+
+m.def("fit_batch", [](py::dict series, int num_states, int max_iterations, double tolerance, bool streaming,
+                      int num_workers, const std::string& emission) {
+    EmissionMode mode = parse_emission(emission);
+    std::vector<py::object> symbols;
+    std::vector<DoubleArray> arrays;
+    std::vector<SeriesView> views;
+    for (auto item : series) {
+        symbols.push_back(py::reinterpret_borrow<py::object>(item.first));
+        arrays.push_back(py::cast<DoubleArray>(item.second));
+        views.push_back(series_view(arrays.back()));
+    }
+
+    std::vector<StockHMM> models;
+    {
+        py::gil_scoped_release release;
+        models = fit_batch(views, num_states, max_iterations, tolerance, streaming, num_workers, mode);
+    }
+
+    py::dict result;
+    for (size_t i = 0; i < models.size(); ++i) {
+        result[symbols[i]] = py::cast(std::move(models[i]));
+    }
+    return result;
+}, "Fit one StockHMM per symbol concurrently; returns {symbol: model}",
+py::arg("series"), py::arg("num_states") = 4, py::arg("max_iterations") = 100, py::arg("tolerance") = 1e-6,
+py::arg("streaming") = false, py::arg("num_workers") = 0, py::arg("emission") = "discrete");
+
+m.def("fit_batch", [](DoubleArray series, int num_states, int max_iterations, double tolerance, bool streaming,
+                      int num_workers, const std::string& emission) {
+    EmissionMode mode = parse_emission(emission);
+    if (series.ndim() != 2) {
+        throw py::value_error("series must be a 2-D array with one return series per row");
+    }
+    const int rows = series.shape(0);
+    const int cols = series.shape(1);
+    std::vector<SeriesView> views;
+    for (int i = 0; i < rows; ++i) {
+        views.push_back({series.data() + static_cast<size_t>(i) * cols, cols});
+    }
+
+    std::vector<StockHMM> models;
+    {
+        py::gil_scoped_release release;
+        models = fit_batch(views, num_states, max_iterations, tolerance, streaming, num_workers, mode);
+    }
+
+    py::list result;
+    for (StockHMM& model : models) {
+        result.append(py::cast(std::move(model)));
+    }
+    return result;
+}, "Fit one StockHMM per row of a 2-D array concurrently; returns a list of models",
+py::arg("series"), py::arg("num_states") = 4, py::arg("max_iterations") = 100, py::arg("tolerance") = 1e-6,
+py::arg("streaming") = false, py::arg("num_workers") = 0, py::arg("emission") = "discrete");
+
+m.def("select_model", [](DoubleArray returns, std::vector<int> candidate_states, int restarts,
+                         const std::string& criterion, unsigned int seed, int max_iterations, double tolerance,
+                         bool streaming, int num_workers, const std::string& emission) {
+    EmissionMode mode = parse_emission(emission);
+    SeriesView view = series_view(returns);
+    std::vector<CandidateScore> scores;
+    std::optional<StockHMM> best;
+    {
+        py::gil_scoped_release release;
+        ModelSearchResult result = select_model(view.data, view.length, candidate_states, restarts, criterion, seed,
+                                                max_iterations, tolerance, streaming, num_workers, mode);
+        best.emplace(std::move(result.best_model));
+        scores = std::move(result.scores);
+    }
+
+    py::list table;
+    for (const CandidateScore& row : scores) {
+        py::dict entry;
+        entry["num_states"] = row.num_states;
+        entry["restart"] = row.restart;
+        entry["seed"] = row.seed;
+        entry["log_likelihood"] = row.log_likelihood;
+        entry[py::str(criterion)] = row.score;
+        table.append(entry);
+    }
+    return py::make_tuple(std::move(*best), table);
+}, "Fit `restarts` seeded models per candidate state count in parallel and keep the one with the lowest "
+   "criterion score; returns (best_model, score_table)",
+py::arg("returns"), py::arg("candidate_states") = std::vector<int>{2, 3, 4, 5, 6}, py::arg("restarts") = 5,
+py::arg("criterion") = "bic", py::arg("seed") = 0, py::arg("max_iterations") = 100, py::arg("tolerance") = 1e-6,
+py::arg("streaming") = false, py::arg("num_workers") = 0, py::arg("emission") = "discrete");
+}
@@ -0,0 +1,291 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+# Same layout as gui.py: the extension in Release, the package from the repository root
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Release')))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stock_hmm  # type: ignore  # noqa: E402
+
+from python import instrumentation  # noqa: E402
+from python.bar_store import BarStore, DEFAULT_STORE_DIR  # noqa: E402
+from python.ingest import read_bars  # noqa: E402
+from python.market_data import YAHOO  # noqa: E402
+
+SIGNAL_THRESHOLD = 0.005  # StockHMM::signal_from_return: BUY above +0.5% predicted return, SELL below -0.5%
+BARS_PER_YEAR = 252 * 78  # 5-minute bars in a regular session
+BUY, HOLD, SELL = 1, 0, -1
+
+
+def walk_forward_windows(length, train, test, step=None, anchored=False):
+    """
+    Train/test windows over a series of `length` bars.
+
+    Each window trains on `train` bars (all bars so far when anchored) and
+    tests on the next `test`; windows advance by `step` bars, `test` by
+    default, so the test windows tile the series without overlapping. A
+    smaller step would score bars more than once when the windows are
+    joined, so it is rejected; a larger one leaves bars between windows
+    untested.
+
+    Returns:
+    list: (train_start, test_start, test_end) per window.
+    """
+    step = step or test
+    if step < test:
+        raise ValueError(f"step ({step}) must be at least test ({test}) so test windows do not overlap")
+    windows = []
+    for test_start in range(train, length - test + 1, step):
+        windows.append((0 if anchored else test_start - train, test_start, test_start + test))
+    return windows
+
+
+def fit_fold(returns, train_length, num_states=3, emission='discrete', seed=0, max_iterations=100, tolerance=1e-6):
+    """
+    Fit an HMM on the first `train_length` returns and forecast the rest out of sample.
+
+    The forecast for each test bar is the model's predicted return after
+    the bar before it, from the filter run over the training bars and the
+    test bars up to then, so it uses nothing from the bar itself. Runs in a
+    worker process, so it takes and returns only arrays and plain values.
+
+    Returns:
+    dict: 'forecast' (one per test bar), the fit's log-likelihood per bar and EM iterations, and the seconds taken.
+    """
+    start = time.perf_counter()
+    train = returns[:train_length]
+    model = stock_hmm.StockHMM(num_states, seed=seed, emission=emission)
+    model.baum_welch(train, max_iterations, tolerance)
+    predicted = model.predict_returns(returns)
+    return {'forecast': predicted[train_length - 1:-1], 'iterations': len(model.get_convergence_trace()),
+            'log_likelihood_per_bar': model.log_likelihood(train) / len(train),
+            'seconds': time.perf_counter() - start}
+
+
+def signals_from_forecasts(forecast, threshold=SIGNAL_THRESHOLD):
+    """BUY (1), SELL (-1) or HOLD (0) per bar, with StockHMM's rule and a configurable threshold."""
+    return np.where(forecast > threshold, BUY, np.where(forecast < -threshold, SELL, HOLD)).astype(np.int8)
+
+
+def positions_from_signals(signals, hold='keep', allow_short=True):
+    """
+    Position held over each bar: 1 long, -1 short, 0 flat.
+
+    hold='keep' holds the position of the last BUY or SELL through HOLD
+    signals; hold='flat' is flat on HOLD. Without allow_short a SELL closes
+    a long position instead of opening a short one.
+    """
+    targets = signals if allow_short else np.maximum(signals, 0)
+    if hold == 'flat':
+        return targets.astype(np.int8)
+    # Forward-fill the last BUY/SELL: the index of the latest non-HOLD signal at or before each bar
+    last = np.maximum.accumulate(np.where(signals != HOLD, np.arange(len(signals)), -1))
+    return np.where(last >= 0, targets[np.maximum(last, 0)], 0).astype(np.int8)
+
+
+def r_squared(returns, forecast):
+    """Out-of-sample R², as StockHMM.calculate_out_of_sample_r_squared (against the mean of `returns`)."""
+    residual = returns - forecast
+    centered = returns - returns.mean()
+    return float(1.0 - residual @ residual / (centered @ centered))
+
+
+def evaluate(returns, forecast, threshold=SIGNAL_THRESHOLD, hold='keep', allow_short=True, cost=0.0,
+             bars_per_year=BARS_PER_YEAR):
+    """
+    Trade the forecasts' signals over the returns they forecast and measure the result.
+
+    The position for bar t comes from the forecast made after bar t-1 and
+    earns bar t's return. `cost` is charged per unit of position change (0.0005
+    is 5 bp per side), including the opening trade.
+
+    Returns:
+    dict: total and buy-and-hold return, annualized Sharpe ratio, maximum drawdown, hit rate (share of
+    bars in the market whose return had the position's sign), trades, exposure and out-of-sample R².
+    """
+    positions = positions_from_signals(signals_from_forecasts(forecast, threshold), hold, allow_short)
+    turnover = np.abs(np.diff(positions, prepend=0))
+    strategy = positions * returns - cost * turnover
+
+    equity = np.exp(np.cumsum(np.log1p(strategy)))
+    drawdown = 1.0 - equity / np.maximum.accumulate(np.maximum(equity, 1.0))
+    invested = positions != 0
+    deviation = strategy.std()
+    return {'bars': len(returns), 'total_return': float(equity[-1] - 1.0) if len(equity) else 0.0,
+            'buy_and_hold_return': float(np.expm1(np.log1p(returns).sum())),
+            'sharpe': float(strategy.mean() / deviation * np.sqrt(bars_per_year)) if deviation > 0 else None,
+            'max_drawdown': float(drawdown.max()) if len(drawdown) else 0.0,
+            'hit_rate': float((positions[invested] * returns[invested] > 0).mean()) if invested.any() else None,
+            'trades': int(np.count_nonzero(turnover)), 'exposure': float(invested.mean()),
+            'long_bars': int(np.count_nonzero(positions > 0)), 'short_bars': int(np.count_nonzero(positions < 0)),
+            'oos_r_squared': r_squared(returns, forecast)}
+
+
+def _tasks(returns, train, test, step, anchored, refit):
+    """(train_start, test_start, test_end) slices to fit; without refit one fit covers every test window."""
+    windows = walk_forward_windows(len(returns), train, test, step, anchored)
+    if not windows or refit:
+        return windows
+    return [(windows[0][0], windows[0][1], windows[-1][2])]
+
+
+def walk_forward(series, models, rules, train, test, step=None, anchored=False, refit=True, workers=None,
+                 max_iterations=100, tolerance=1e-6, bars_per_year=BARS_PER_YEAR):
+    """
+    Walk-forward evaluation of HMM signals over several symbols and parameter sets.
+
+    Every (symbol, model, window) fit is independent, so they are spread
+    over a process pool; only the returns each fit needs and its forecasts
+    cross process boundaries. The trading rules only change how forecasts
+    become positions, so each is evaluated on the fitted forecasts in this
+    process, vectorized, without refitting.
+
+    Parameters:
+    series (dict): symbol -> 1-D array of bar returns.
+    models (list): dicts of StockHMM settings: num_states, emission and seed.
+    rules (list): dicts of evaluate() arguments: threshold, hold, allow_short and cost.
+    train, test, step, anchored: Window lengths in bars, as for walk_forward_windows().
+    refit (bool): Refit on every window; False fits on the first training window and filters through the rest.
+    workers (int): Worker processes, os.cpu_count() by default. 1 fits in this process.
+
+    Returns:
+    dict: 'results' with one row per symbol, model and rule (metrics over all test windows joined), and
+    'folds' with each fit's window, EM iterations and seconds, and 'errors' for fits that failed and
+    series shorter than one window.
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs, errors = [], []
+    for symbol, returns in series.items():
+        returns = np.ascontiguousarray(returns, dtype=np.float64)
+        if len(returns) < train + test:
+            errors.append({'symbol': symbol, 'model': None,
+                           'error': f"{len(returns)} returns, fewer than train + test = {train + test}"})
+            continue
+        for m, model in enumerate(models):
+            for train_start, test_start, test_end in _tasks(returns, train, test, step, anchored, refit):
+                jobs.append(((symbol, m, test_start, test_end),
+                             (returns[train_start:test_end], test_start - train_start, model.get('num_states', 3),
+                              model.get('emission', 'discrete'), model.get('seed', 0), max_iterations, tolerance)))
+
+    fits = {}
+    with instrumentation.stage('walk_forward_fits', fits=len(jobs), workers=workers):
+        if workers == 1:
+            for key, job in jobs:
+                try:
+                    fits[key] = fit_fold(*job)
+                except Exception as e:
+                    errors.append({'symbol': key[0], 'model': models[key[1]], 'error': str(e)})
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(fit_fold, *job): key for key, job in jobs}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        fits[key] = future.result()
+                    except Exception as e:
+                        errors.append({'symbol': key[0], 'model': models[key[1]], 'error': str(e)})
+
+    results, folds = [], []
+    with instrumentation.stage('walk_forward_evaluate', rules=len(rules)):
+        for symbol, returns in series.items():
+            returns = np.asarray(returns, dtype=np.float64)
+            for m, model in enumerate(models):
+                keys = sorted(key for key in fits if key[:2] == (symbol, m))
+                if not keys:
+                    continue
+                forecast = np.concatenate([fits[key]['forecast'] for key in keys])
+                tested = np.concatenate([returns[key[2]:key[3]] for key in keys])
+                folds += [{'symbol': symbol, 'model': model, 'test_start': key[2], 'test_end': key[3],
+                           'iterations': fits[key]['iterations'], 'seconds': fits[key]['seconds'],
+                           'oos_r_squared': r_squared(returns[key[2]:key[3]], fits[key]['forecast'])} for key in keys]
+                for rule in rules:
+                    metrics = evaluate(tested, forecast, bars_per_year=bars_per_year, **rule)
+                    results.append({'symbol': symbol, 'model': model, 'rule': rule, 'windows': len(keys),
+                                    **metrics})
+    return {'results': results, 'folds': folds, 'errors': errors}
+
+
+def load_returns(symbols, csv_paths, store_root, days=None):
+    """Bar returns per symbol, from the BarStore and from CSV files (named after the file)."""
+    series = {}
+    store = BarStore(store_root) if symbols else None
+    for symbol in symbols:
+        data = store.load(symbol, days=days)
+        if data.empty:
+            raise ValueError(f"No stored bars for {symbol} in {store_root}")
+        series[symbol] = data['close'].pct_change().dropna().to_numpy(dtype=np.float64)
+    for path in csv_paths:
+        data = read_bars(path)
+        series[os.path.splitext(os.path.basename(path))[0]] = \
+            data['close'].pct_change().dropna().to_numpy(dtype=np.float64)
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Walk-forward backtest of the HMM trading signals over stored bars or CSV files.")
+    parser.add_argument('symbols', nargs='*', help='symbols in the BarStore')
+    parser.add_argument('--csv', nargs='+', default=[], help='CSV files of bars to test, named after the file')
+    parser.add_argument('--store', help='BarStore directory (default: the GUI store for Yahoo)')
+    parser.add_argument('--days', type=int, help='only the most recent stored days')
+    parser.add_argument('--train', type=int, default=2000, help='bars per training window')
+    parser.add_argument('--test', type=int, default=500, help='bars per test window')
+    parser.add_argument('--step', type=int, help='bars between windows, at least --test (default: --test)')
+    parser.add_argument('--anchored', action='store_true', help='train on all bars before each test window')
+    parser.add_argument('--no-refit', action='store_true',
+                        help='fit once on the first training window and filter through the rest')
+    parser.add_argument('--states', type=int, nargs='+', default=[3], help='HMM states to try')
+    parser.add_argument('--emission', nargs='+', choices=['discrete', 'gaussian'], default=['discrete'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[SIGNAL_THRESHOLD],
+                        help='predicted returns beyond which to BUY/SELL')
+    parser.add_argument('--hold', nargs='+', choices=['keep', 'flat'], default=['keep'],
+                        help='keep the last position or go flat on HOLD')
+    parser.add_argument('--long-only', action='store_true', help='SELL closes longs instead of going short')
+    parser.add_argument('--cost', type=float, default=0.0, help='cost per unit of position change, e.g. 0.0005')
+    parser.add_argument('--bars-per-year', type=float, default=BARS_PER_YEAR, help='for the annualized Sharpe')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--output', help='write results and folds to this JSON file')
+    args = parser.parse_args()
+
+    if not args.symbols and not args.csv:
+        parser.error("no symbols or --csv files given")
+    if args.step is not None and args.step < args.test:
+        parser.error("--step must be at least --test, or test windows overlap and bars are scored twice")
+    series = load_returns([symbol.upper() for symbol in args.symbols], args.csv,
+                          args.store or os.path.join(DEFAULT_STORE_DIR, YAHOO), args.days)
+    models = [{'num_states': states, 'emission': emission, 'seed': args.seed}
+              for states, emission in itertools.product(args.states, args.emission)]
+    rules = [{'threshold': threshold, 'hold': hold, 'allow_short': not args.long_only, 'cost': args.cost}
+             for threshold, hold in itertools.product(args.thresholds, args.hold)]
+
+    start = time.perf_counter()
+    summary = walk_forward(series, models, rules, args.train, args.test, args.step, args.anchored,
+                           not args.no_refit, args.workers, bars_per_year=args.bars_per_year)
+    elapsed = time.perf_counter() - start
+    for row in summary['results']:
+        model, rule = row['model'], row['rule']
+        sharpe = 'N/A' if row['sharpe'] is None else f"{row['sharpe']:6.2f}"
+        hit_rate = 'N/A' if row['hit_rate'] is None else f"{row['hit_rate']:.1%}"
+        print(f"{row['symbol']:<12} {model['num_states']} states {model['emission']:<8} "
+              f"threshold {rule['threshold']:<8g} {rule['hold']:<4}  return {row['total_return']:+8.2%} "
+              f"(hold {row['buy_and_hold_return']:+8.2%})  Sharpe {sharpe}  hit {hit_rate:>6}  "
+              f"trades {row['trades']:>5}  R² {row['oos_r_squared']:+.4f}")
+    for row in summary['errors']:
+        print(f"{row['symbol']:<12} {row['model'] or ''} failed: {row['error']}")
+    print(f"{len(summary['folds'])} fits over {sum(len(returns) for returns in series.values())} bars "
+          f"in {elapsed:.1f} s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(summary, seconds=elapsed), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
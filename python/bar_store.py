@@ -0,0 +1,213 @@
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from python.ingest import read_bars
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser('~'), '.quantispy', 'bars')
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+_DAY_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class BarStore:
+    """
+    On-disk store of OHLCV bars, one directory per symbol and trading day.
+
+    Each day holds one .npy file per column plus the bar timestamps (int64
+    nanoseconds, UTC for timezone-aware data). Reads memory-map only the
+    requested columns and load() copies each selected range once, so the
+    returned frames never keep a day's files open while append() replaces
+    them (which Windows refuses). Appends skip bars at or before the last
+    stored timestamp and only rewrite the days they touch.
+
+    Parameters:
+    root (str): Directory holding the store; created on first write.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def _symbol_dir(self, symbol):
+        return os.path.join(self.root, re.sub(r'[^A-Za-z0-9._-]', '_', str(symbol).upper()))
+
+    def _meta_path(self, symbol):
+        return os.path.join(self._symbol_dir(symbol), 'meta.json')
+
+    def _read_meta(self, symbol):
+        try:
+            with open(self._meta_path(symbol)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, symbol, meta):
+        path = self._meta_path(symbol)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(f"{path}.tmp", path)
+
+    def days(self, symbol):
+        """Stored trading days of a symbol as sorted 'YYYY-MM-DD' strings."""
+        directory = self._symbol_dir(symbol)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory) if _DAY_PATTERN.match(name))
+
+    def last_timestamp(self, symbol):
+        """Timestamp of the newest stored bar, or None for an unknown symbol."""
+        meta = self._read_meta(symbol)
+        if meta is None or meta['last_timestamp'] is None:
+            return None
+        return self._to_index(np.array([meta['last_timestamp']], dtype=np.int64), meta['tz'])[0]
+
+    @staticmethod
+    def _to_index(nanoseconds, tz):
+        index = pd.DatetimeIndex(nanoseconds.astype('datetime64[ns]'))
+        return index.tz_localize('UTC').tz_convert(tz) if tz else index
+
+    def read_day(self, symbol, day, columns=None):
+        """Memory-mapped, read-only arrays of one day: {'timestamp': int64 ns, column: float64, ...}."""
+        directory = os.path.join(self._symbol_dir(symbol), day)
+        return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+                for name in ['timestamp'] + list(columns or BAR_COLUMNS)}
+
+    def load(self, symbol, start=None, end=None, columns=None, days=None):
+        """
+        Load stored bars as a DataFrame indexed by timestamp.
+
+        Parameters:
+        start, end: Optional inclusive bounds (anything pd.Timestamp accepts).
+        columns (list): Columns to read; the others are never opened.
+        days (int): Only the most recent `days` stored days.
+
+        Returns:
+        pd.DataFrame: The bars, empty when nothing matches.
+        """
+        meta = self._read_meta(symbol)
+        columns = list(columns or BAR_COLUMNS)
+        if meta is None:
+            return pd.DataFrame(columns=columns, dtype=np.float64)
+        tz = meta['tz']
+
+        def bound(value):
+            if value is None:
+                return None
+            value = pd.Timestamp(value)
+            if tz and value.tzinfo is None:
+                value = value.tz_localize(tz)
+            return value
+
+        start, end = bound(start), bound(end)
+        selected = self.days(symbol)
+        if days is not None:
+            selected = selected[-days:] if days > 0 else []
+        local = lambda value: value.tz_convert(tz) if tz else value  # noqa: E731
+        if start is not None:
+            selected = [day for day in selected if day >= local(start).strftime('%Y-%m-%d')]
+        if end is not None:
+            selected = [day for day in selected if day <= local(end).strftime('%Y-%m-%d')]
+
+        parts = []
+        for day in selected:
+            arrays = self.read_day(symbol, day, columns)
+            index = self._to_index(arrays['timestamp'], tz)
+            lo = 0 if start is None else index.searchsorted(start, side='left')
+            hi = len(index) if end is None else index.searchsorted(end, side='right')
+            if hi > lo:
+                parts.append((index[lo:hi], {name: arrays[name][lo:hi] for name in columns}))
+
+        if not parts:
+            return pd.DataFrame(columns=columns, dtype=np.float64)
+        if len(parts) == 1:
+            index, arrays = parts[0]
+            return pd.DataFrame({name: np.array(array) for name, array in arrays.items()}, index=index, copy=False)
+        return pd.DataFrame({name: np.concatenate([arrays[name] for _, arrays in parts]) for name in columns},
+                            index=parts[0][0].append([index for index, _ in parts[1:]]))
+
+    def append(self, symbol, bars: pd.DataFrame):
+        """
+        Store the bars newer than the last stored timestamp.
+
+        Parameters:
+        bars (pd.DataFrame): Bars with a DatetimeIndex and the open/high/low/close/volume columns.
+
+        Returns:
+        int: The number of bars added.
+        """
+        missing = [column for column in BAR_COLUMNS if column not in bars.columns]
+        if missing:
+            raise KeyError(f"Columns {missing} are missing from the bars.")
+        if bars.empty:
+            return 0
+
+        index = pd.DatetimeIndex(bars.index)
+        tz = str(index.tz) if index.tz is not None else None
+        meta = self._read_meta(symbol) or {'tz': tz, 'last_timestamp': None}
+        if (meta['tz'] is None) != (tz is None):
+            raise ValueError(f"{symbol} is stored with timezone {meta['tz']} but the new bars have {tz}")
+        if tz:
+            index = index.tz_convert(meta['tz'])
+        nanoseconds = (index.tz_convert('UTC') if tz else index).as_unit('ns').asi8
+
+        order = np.argsort(nanoseconds, kind='stable')
+        keep = order if meta['last_timestamp'] is None else order[nanoseconds[order] > meta['last_timestamp']]
+        if len(keep) == 0:
+            return 0
+        keep = keep[np.r_[True, np.diff(nanoseconds[keep]) != 0]]  # Drop duplicate timestamps
+
+        values = {column: bars[column].to_numpy(dtype=np.float64)[keep] for column in BAR_COLUMNS}
+        values['timestamp'] = nanoseconds[keep]
+        day_labels = index[keep].strftime('%Y-%m-%d')
+
+        os.makedirs(self._symbol_dir(symbol), exist_ok=True)
+        boundaries = np.flatnonzero(np.r_[True, day_labels[1:] != day_labels[:-1], True])
+        for lo, hi in zip(boundaries[:-1], boundaries[1:]):
+            day = day_labels[lo]
+            new = {name: array[lo:hi] for name, array in values.items()}
+            if day in self.days(symbol):
+                old = self.read_day(symbol, day)
+                new = {name: np.concatenate([old[name], new[name]]) for name in new}
+                del old  # Close the memory maps before the day's directory is replaced
+            self._write_day(symbol, day, new)
+
+        meta['last_timestamp'] = int(values['timestamp'][-1])
+        self._write_meta(symbol, meta)
+        return len(keep)
+
+    def _write_day(self, symbol, day, arrays):
+        directory = os.path.join(self._symbol_dir(symbol), day)
+        staging = f"{directory}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+
+    def update(self, symbol, fetch, days=None):
+        """
+        Append what fetch(since) returns and load the stored bars.
+
+        fetch receives the last stored timestamp (None for a new symbol) and
+        returns a DataFrame of bars. If it fails and bars are already stored,
+        the stored bars are returned so analysis keeps working offline.
+        Errors writing the fetched bars are raised.
+        """
+        try:
+            bars = fetch(self.last_timestamp(symbol))
+        except Exception as e:
+            if self._read_meta(symbol) is None:
+                raise
+            print(f"Fetching {symbol} failed, using stored bars: {e}")
+        else:
+            added = self.append(symbol, bars)
+            print(f"Stored {added} new bars for {symbol}")
+        return self.load(symbol, days=days)
+
+    def import_csv(self, symbol, path):
+        """Append bars from a CSV in one of the layouts python.ingest reads (historical.csv, spy_data_5m.csv)."""
+        return self.append(symbol, read_bars(path, cache=False, compact=False))
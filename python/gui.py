@@ -1,6 +1,6 @@
 import sys
 import os
-import numpy as np
+import threading
 import traceback
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
@@ -9,18 +9,18 @@ from ttkbootstrap.dialogs import Messagebox
 # Add the Release directory to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Release')))
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import stock_hmm  # type: ignore
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from alpha_vantage.timeseries import TimeSeries
-import pandas as pd
-import yfinance as yf
-from python.plotter import plot_stock_data
-from PIL import Image, ImageTk
-from python.directional_change import directional_change
-from python.trendline import calculate_trendlines
-import matplotlib.dates as mdates
-from python.relativestrength import calculate_relative_strength
+from python.instrumentation import record_em, stage
+from python.task_scheduler import TaskScheduler
+
+# NumPy, pandas, matplotlib, SciPy, aiohttp and stock_hmm take seconds to import and
+# none of them is needed to show the window, so they are imported in the methods that
+# use them (benchmarks/bench_import_time.py keeps it that way). Once the window is up,
+# preload_modules imports them in the background.
+
+# Provider names of python.market_data, repeated here so the window opens without importing it
+ALPHA_VANTAGE = 'alpha_vantage'
+YAHOO = 'yahoo'
+PROVIDERS = {"Alpha Vantage": ALPHA_VANTAGE, "Yahoo Finance": YAHOO}
 
 class StockAnalyzerGUI:
     def __init__(self, master):
@@ -34,10 +34,25 @@ class StockAnalyzerGUI:
         self.api_key = ttk.StringVar()
         self.data = None
         self.spy_data = None
+        self.symbol = None
+        self.chart = None
         self.hmm = None
         self.num_states = ttk.IntVar(value=3)
+        self.auto_states = ttk.BooleanVar(value=False)
+        # Created on first use, on a worker thread
+        self.model_cache = None
+        self.bar_stores = {}
+        self.market_data = None
+        self.services_lock = threading.Lock()
+        self.store_lock = threading.Lock()  # A superseded analysis may still be writing to a store
+        self.scheduler = TaskScheduler(self.master)
+        self.status = ttk.StringVar(value="Ready")
+        self.progress = ttk.DoubleVar(value=0)
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.create_widgets()
+        self.master.after(200, lambda: self.scheduler.submit('preload', self.preload_modules,
+                                                             on_error=lambda e: print(f"Preloading failed: {e}")))
 
     def create_widgets(self):
         # Logo
@@ -72,17 +87,26 @@ class StockAnalyzerGUI:
 
         ttk.Label(hmm_frame, text="Number of States:").grid(row=0, column=0, padx=5, pady=5)
         ttk.Entry(hmm_frame, textvariable=self.num_states, width=5).grid(row=0, column=1, padx=5, pady=5)
+        ttk.Checkbutton(hmm_frame, text="Auto-select (BIC)", variable=self.auto_states).grid(row=0, column=2, padx=5,
+                                                                                             pady=5)
         ttk.Button(hmm_frame, text="Apply HMM", command=self.apply_hmm_analysis, style="info.TButton").grid(row=0,
-                                                                                                            column=2,
+                                                                                                            column=3,
                                                                                                             padx=5,
                                                                                                             pady=5)
 
+        # Status Bar
+        status_frame = ttk.Frame(self.master)
+        status_frame.pack(side=BOTTOM, fill="x", padx=10, pady=5)
+        ttk.Label(status_frame, textvariable=self.status).pack(side=LEFT)
+        ttk.Progressbar(status_frame, variable=self.progress, maximum=1.0, length=200).pack(side=RIGHT)
+
         # Chart Area
         self.chart_frame = ttk.Frame(self.master)
         self.chart_frame.pack(fill="both", expand=True, pady=10, padx=10)
 
     def load_logo(self, frame):
         try:
+            from PIL import Image, ImageTk
             image = Image.open("QuantSPY.png")
             image = image.resize((200, 200), Image.LANCZOS)
             photo = ImageTk.PhotoImage(image)
@@ -92,6 +116,53 @@ class StockAnalyzerGUI:
         except Exception as e:
             print(f"Error loading logo: {e}")
 
+    def on_close(self):
+        self.scheduler.shutdown()
+        if self.market_data is not None:
+            self.market_data.close()
+        self.master.destroy()
+
+    def preload_modules(self, task):
+        # Runs on a worker thread after the window is shown, so the first click does not wait for imports
+        import matplotlib.backends.backend_tkagg  # noqa: F401
+        import python.plotter  # noqa: F401
+        task.check()
+        import python.market_data  # noqa: F401
+        import python.model_cache  # noqa: F401
+
+    def get_bar_store(self, provider):
+        # Bars are kept per provider
+        with self.services_lock:
+            if provider not in self.bar_stores:
+                from python.bar_store import BarStore, DEFAULT_STORE_DIR
+                self.bar_stores[provider] = BarStore(os.path.join(DEFAULT_STORE_DIR, provider))
+            return self.bar_stores[provider]
+
+    def get_market_data(self):
+        with self.services_lock:
+            if self.market_data is None:
+                from python.market_data import MarketDataService
+                self.market_data = MarketDataService()
+            return self.market_data
+
+    def get_model_cache(self):
+        with self.services_lock:
+            if self.model_cache is None:
+                from python.model_cache import ModelCache
+                self.model_cache = ModelCache()
+            return self.model_cache
+
+    def set_status(self, message, fraction=None):
+        self.status.set(message)
+        if fraction is not None:
+            self.progress.set(fraction)
+
+    def task_failed(self, stage, e):
+        print(f"Error in {stage}: {str(e)}")
+        traceback.print_exception(type(e), e, e.__traceback__)
+        self.set_status("Ready", 0)
+        Messagebox.show_error("Error", str(e))
+
     def analyze_stock(self):
         symbol = self.symbol_entry.get().upper()
 
@@ -99,47 +170,71 @@ class StockAnalyzerGUI:
             Messagebox.show_error("Error", "Please enter a stock symbol")
             return
 
+        provider = PROVIDERS[self.api_var.get()]
+        if provider == ALPHA_VANTAGE and not self.api_key.get():
+            Messagebox.show_error("Error", "Please enter your Alpha Vantage API key")
+            return
+
+        # A new symbol supersedes whatever is still running for the previous one
+        self.scheduler.cancel('hmm')
+        self.set_status(f"Fetching {symbol}...", 0)
+        self.scheduler.submit('analyze', self.load_and_analyze, symbol, provider, self.api_key.get(),
+                              on_done=self.show_analysis, on_error=lambda e: self.task_failed("analyze_stock", e),
+                              on_progress=self.set_status)
+
+    def load_and_analyze(self, task, symbol, provider, api_key):
+        # Runs on a worker thread: no Tk calls here, only plain values in and out
+        import numpy as np
+        from python.plotter import compute_overlays
+        from python.relativestrength import calculate_relative_strength
+
+        # The symbol and SPY are requested concurrently and only the bars after the
+        # last stored one are downloaded
+        store = self.get_bar_store(provider)
+        market_data = self.get_market_data()
+        pending = {name: market_data.fetch(provider, name, store.last_timestamp(name), api_key)
+                   for name in (symbol, 'SPY')}
+        days = 1 if provider == YAHOO else None  # Yahoo shows the latest session
+        with self.store_lock, stage('fetch', symbol=symbol, provider=provider) as fetch:
+            data = store.update(symbol, lambda since: pending[symbol].result(), days=days)
+            task.progress("Fetching SPY...", 0.3)
+            spy_data = store.update('SPY', lambda since: pending['SPY'].result(), days=days)
+            fetch.annotate(bars=len(data), spy_bars=len(spy_data))
+
+        # Calculate Relative Strength
+        task.progress("Calculating relative strength...", 0.5)
+        with stage('relative_strength', bars=len(data)):
+            relative_strength = calculate_relative_strength(data, spy_data)
+        print(f"Relative Strength: {relative_strength}")
+
+        # Format relative_strength as a string
+        if relative_strength is None or np.isnan(relative_strength):
+            relative_strength = "N/A"
+        else:
+            relative_strength = f"{relative_strength:.4f}"
+
+        task.progress("Calculating directional change and trendlines...", 0.7)
+        overlays = compute_overlays(data)
+        return symbol, data, spy_data, relative_strength, overlays
+
+    def show_analysis(self, result):
+        symbol, self.data, self.spy_data, relative_strength, overlays = result
+        self.symbol = symbol
+        # A fit still running on the previous data no longer matches the chart
+        self.scheduler.cancel('hmm')
+        self.set_status(f"Plotting {symbol}...", 0.9)
         try:
-            if self.api_var.get() == "Alpha Vantage":
-                if not self.api_key.get():
-                    Messagebox.show_error("Error", "Please enter your Alpha Vantage API key")
-                    return
-                self.data = self.get_stock_data_alpha_vantage(symbol)
-                self.spy_data = self.get_stock_data_alpha_vantage('SPY')
-            else:
-                self.data = self.get_stock_data_yahoo(symbol)
-                self.spy_data = self.get_stock_data_yahoo('SPY')
-
-            # Calculate Relative Strength
-            relative_strength = calculate_relative_strength(self.data, self.spy_data)
-            print(f"Relative Strength: {relative_strength}")
+            self.plot_stock_chart(self.data, symbol, relative_strength, overlays)
+        except Exception as e:
+            self.task_failed("plot_stock_chart", e)
+            return
+        self.set_status(f"{symbol}: {len(self.data)} bars", 1.0)
 
-            # Format relative_strength as a string
-            if relative_strength is None or np.isnan(relative_strength):
-                relative_strength = "N/A"
-            else:
-                relative_strength = f"{relative_strength:.4f}"
+    def plot_stock_chart(self, df, symbol, relative_strength, overlays=None):
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from python.plotter import plot_stock_data
 
-            self.plot_stock_chart(self.data, symbol, relative_strength)
-        except Exception as e:
-            print(f"Error in analyze_stock: {str(e)}")
-            traceback.print_exc()
-            Messagebox.show_error("Error", str(e))
-
-    def get_stock_data_alpha_vantage(self, symbol):
-        ts = TimeSeries(key=self.api_key.get(), output_format='pandas')
-        data, _ = ts.get_intraday(symbol=symbol, interval='5min', outputsize='full')
-        df = data.iloc[::-1]
-        df.columns = ['open', 'high', 'low', 'close', 'volume']
-        return df
-
-    def get_stock_data_yahoo(self, symbol):
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period="1d", interval="5m")
-        df.columns = df.columns.str.lower()
-        return df
-
-    def plot_stock_chart(self, df, symbol, relative_strength):
         for widget in self.chart_frame.winfo_children():
             widget.destroy()
 
@@ -152,10 +247,14 @@ class StockAnalyzerGUI:
             # If it's not a string, assume it's a float and format it
             relative_strength_text = f"Relative Strength: {relative_strength:.4f}"
 
-        plot_stock_data(fig, df, symbol, relative_strength=relative_strength_text)
+        # The chart handles pan, zoom and level of detail while it is shown
+        with stage('plot', symbol=symbol, bars=len(df)):
+            self.chart = plot_stock_data(fig, df, symbol, relative_strength=relative_strength_text,
+                                         overlays=overlays)
 
         canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
-        canvas.draw()
+        with stage('draw', chart='stock'):
+            canvas.draw()
         canvas.get_tk_widget().pack(fill="both", expand=True)
 
     def apply_hmm_analysis(self):
@@ -163,102 +262,71 @@ class StockAnalyzerGUI:
             ttk.Messagebox.show_error("Error", "Please analyze a stock first")
             return
 
+        print("Apply HMM button clicked")
+        num_states = None if self.auto_states.get() else self.num_states.get()
+        self.set_status(f"Fitting HMM for {self.symbol}...", 0)
+        self.scheduler.submit('hmm', self.fit_hmm, self.symbol, self.data, num_states,
+                              on_done=self.show_hmm_results, on_error=lambda e: self.task_failed("apply_hmm_analysis", e),
+                              on_progress=self.set_status)
+
+    def fit_hmm(self, task, symbol, data, num_states):
+        # Runs on a worker thread; the fits release the GIL, so the UI stays responsive
+        import numpy as np
+        import stock_hmm  # type: ignore
+
+        returns = data['close'].pct_change().dropna().to_numpy(dtype=np.float64)
+
+        # Initialize and train HMM
+        if num_states is None:
+            task.progress("Selecting the number of states (BIC)...", 0.1)
+            with stage('select_model', symbol=symbol, bars=len(returns)) as search:
+                hmm, scores = stock_hmm.select_model(returns, candidate_states=[2, 3, 4, 5, 6], restarts=5,
+                                                     criterion="bic", seed=0)
+                search.annotate(states=hmm.get_num_states(), candidates=len(scores), scores=scores)
+            # The trace is the winning candidate's own fit, which ran somewhere inside the search
+            record_em(hmm, search.start, symbol=symbol)
+        else:
+            # Reuse the fit for this window, or warm-start from the symbol's last fit
+            window = (data.index[0], data.index[-1])
+            hmm = self.get_model_cache().fit(symbol, returns, num_states, window)
+
+        # Predict next return
+        task.progress("Generating trading signals...", 0.8)
+        predicted_return = hmm.predict_next_return()
+
+        # Get trading signals for the entire history
+        with stage('trading_signals', bars=len(returns)):
+            trading_signals = hmm.get_trading_signals(returns)
+        return symbol, data, hmm, returns, predicted_return, trading_signals
+
+    def show_hmm_results(self, result):
+        # The window shows the data the model was fitted on, which may differ from the current chart
+        symbol, data, self.hmm, returns, predicted_return, trading_signals = result
+        self.num_states.set(self.hmm.get_num_states())
+        self.set_status(f"{symbol}: {self.hmm.get_num_states()}-state HMM", 1.0)
         try:
-            print("Apply HMM button clicked")
-            returns = self.data['close'].pct_change().dropna().values
-
-            # Initialize and train HMM
-            self.hmm = stock_hmm.StockHMM(self.num_states.get())
-            self.hmm.baum_welch(returns.tolist(), 100, 1e-6)
-
-            # Predict next return
-            predicted_return = self.hmm.predict_next_return()
-
-            # Get trading signals for the entire history
-            trading_signals = self.hmm.get_trading_signals(returns.tolist())
-
-            # Show HMM visualization in a separate window
-            self.master.after(100, lambda: self.show_hmm_visualization(returns, predicted_return, trading_signals))
-
+            self.show_hmm_visualization(symbol, data, returns, predicted_return, trading_signals)
         except Exception as e:
-            print(f"Error in apply_hmm_analysis: {str(e)}")
-            traceback.print_exc()
-            ttk.Messagebox.show_error("Error", f"An error occurred: {str(e)}")
+            self.task_failed("show_hmm_visualization", e)
+
+    def show_hmm_visualization(self, symbol, data, returns, predicted_return, trading_signals):
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        from python.plotter import plot_hmm_analysis
 
-    def show_hmm_visualization(self, returns, predicted_return, trading_signals):
         hmm_window = ttk.Toplevel(self.master)
-        hmm_window.title(f"HMM Analysis for {self.symbol_entry.get().upper()}")
+        hmm_window.title(f"HMM Analysis for {symbol}")
         hmm_window.geometry("1200x800")
 
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10), sharex=True, gridspec_kw={'height_ratios': [3, 1]})
-        fig.patch.set_facecolor('black')
-
-        dates = self.data.index[-len(returns):]
-        prices = self.data['close'].iloc[-len(returns):]
-
-        # Plot stock prices as a line chart
-        ax1.plot(dates, prices, label='Close Price', color='white', linewidth=1)
-
-        # Color the price line based on trading signals
-        signal_colors = {'BUY': 'green', 'SELL': 'red', 'HOLD': 'gray'}
-        for i, (date, price, signal) in enumerate(zip(dates, prices, trading_signals)):
-            if i > 0:
-                ax1.plot(dates[i - 1:i + 1], prices[i - 1:i + 1], color=signal_colors[signal], linewidth=2)
-
-        ax1.set_title(f"Stock Price and HMM Analysis for {self.symbol_entry.get().upper()}", color='white')
-        ax1.set_ylabel("Price ($)", color='white')
-        ax1.tick_params(axis='y', colors='white')
-        ax1.legend(loc='upper left')
-
-        # Add price information
-        current_price = prices.iloc[-1]
-        day_high = prices.max()
-        day_low = prices.min()
-        price_info = f"Current: ${current_price:.2f}\nHigh: ${day_high:.2f}\nLow: ${day_low:.2f}"
-        ax1.text(0.02, 0.05, price_info, transform=ax1.transAxes, fontsize=10,
-                 verticalalignment='bottom', color='white', bbox=dict(facecolor='black', alpha=0.7))
-
-        # Plot returns as a line
-        ax2.plot(dates, returns, color='blue', linewidth=1)
-        ax2.fill_between(dates, returns, 0, where=(returns > 0), facecolor='green', alpha=0.3)
-        ax2.fill_between(dates, returns, 0, where=(returns <= 0), facecolor='red', alpha=0.3)
-        ax2.axhline(y=0, color='white', linestyle='-', linewidth=0.5)
-        ax2.set_ylabel("Returns (%)", color='white')
-        ax2.set_xlabel("Date", color='white')
-        ax2.tick_params(axis='y', colors='white')
-
-        # Add returns information
-        mean_return = np.mean(returns) * 100
-        std_return = np.std(returns) * 100
-        returns_info = f"Mean: {mean_return:.2f}%\nStd Dev: {std_return:.2f}%"
-        ax2.text(0.02, 0.95, returns_info, transform=ax2.transAxes, fontsize=10,
-                 verticalalignment='top', color='white', bbox=dict(facecolor='black', alpha=0.7))
-
-        # Plot predicted return
-        if not np.isnan(predicted_return):
-            predicted_price = current_price * (1 + predicted_return)
-            ax1.axhline(y=predicted_price, color='yellow', linestyle='--',
-                        label=f'Predicted Next Close: ${predicted_price:.2f}')
-            ax1.text(dates[-1], predicted_price, f'${predicted_price:.2f}', color='yellow', ha='right', va='bottom')
-
-        # Add current trading signal
-        current_signal = trading_signals[-1] if trading_signals else "N/A"
-        ax1.text(0.02, 0.95, f"Current Signal: {current_signal}", transform=ax1.transAxes, fontsize=12,
-                 verticalalignment='top', color='white', bbox=dict(facecolor='black', alpha=0.7))
-
-        # Create a custom legend for trading signals
-        from matplotlib.lines import Line2D
-        legend_elements = [Line2D([0], [0], color=c, lw=2, label=s) for s, c in signal_colors.items()]
-        ax1.legend(handles=legend_elements, loc='upper left', title='Signals')
-
-        date_formatter = mdates.DateFormatter('%Y-%m-%d %I:%M %p')  # %I for 12-hour clock, %p for AM/PM
-        ax1.xaxis.set_major_formatter(date_formatter)
-        ax2.xaxis.set_major_formatter(date_formatter)
-
-        plt.tight_layout()
+        fig = plt.figure(figsize=(14, 10))
+        dates = data.index[-len(returns):]
+        prices = data['close'].iloc[-len(returns):]
+        with stage('plot_hmm', symbol=symbol, bars=len(returns)):
+            plot_hmm_analysis(fig, dates, prices, returns, predicted_return, trading_signals, symbol)
 
         canvas = FigureCanvasTkAgg(fig, master=hmm_window)
-        canvas.draw()
+        with stage('draw', chart='hmm'):
+            canvas.draw()
         canvas.get_tk_widget().pack(fill="both", expand=True)
 
         toolbar = NavigationToolbar2Tk(canvas, hmm_window)
@@ -269,6 +337,13 @@ class StockAnalyzerGUI:
         close_button.pack(pady=10)
 
     def visualize_results(self):
+        import matplotlib.pyplot as plt
+        import pandas as pd
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from python.directional_change import directional_change
+        from python.relativestrength import calculate_relative_strength
+        from python.trendline import calculate_trendlines
+
         try:
             for widget in self.chart_frame.winfo_children():
                 widget.destroy()
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.quantispy', 'csv_cache')
+DEFAULT_TZ = 'America/New_York'
+CACHE_VERSION = 1
+
+# Known layouts of the bundled files. Timestamps are parsed with an explicit
+# format instead of per-row inference.
+SCHEMAS = {
+    # historical.csv: daily bars with a UTC offset, plus corporate actions
+    'daily': {
+        'header': ['Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits', 'Capital Gains'],
+        'time_format': '%Y-%m-%d %H:%M:%S%z',
+        'columns': ['open', 'high', 'low', 'close', 'volume', 'dividends', 'stock_splits', 'capital_gains'],
+    },
+    # spy_data_5m.csv: naive exchange-time 5-minute bars
+    'intraday': {
+        'header': ['Date', 'Open', 'High', 'Low', 'Close', 'Volume'],
+        'time_format': '%Y-%m-%d %H:%M:%S',
+        'columns': ['open', 'high', 'low', 'close', 'volume'],
+    },
+    # data.csv: one price per line, no header and no timestamps
+    'prices': {
+        'header': None,
+        'time_format': None,
+        'columns': ['close'],
+    },
+}
+
+
+def detect_schema(path):
+    """Name of the SCHEMAS entry matching the file's first line."""
+    with open(path, newline='') as f:
+        first = f.readline().strip()
+    fields = first.split(',')
+    for name, schema in SCHEMAS.items():
+        if schema['header'] == fields:
+            return name
+    try:
+        float(first)
+        return 'prices'
+    except ValueError:
+        raise ValueError(f"Unrecognized CSV layout in {path}: {first[:80]!r}") from None
+
+
+def _column_dtype(column, values, compact):
+    whole = column == 'volume' and len(values) and np.all(np.mod(values, 1) == 0) and values.min() >= 0
+    if not compact:
+        return np.dtype(np.int64) if whole else np.dtype(np.float64)
+    if whole:
+        return np.dtype(np.uint32) if values.max() <= np.iinfo(np.uint32).max else np.dtype(np.uint64)
+    return np.dtype(np.float32)
+
+
+def _parse_chunk(chunk, schema, tz):
+    frame = chunk.copy()
+    frame.columns = ['date'] + schema['columns'] if schema['header'] else schema['columns']
+    if schema['time_format'] is None:
+        return None, frame
+    if '%z' in schema['time_format']:
+        # Offsets change across DST, so parse to UTC and convert to the exchange timezone
+        index = pd.to_datetime(frame.pop('date'), format=schema['time_format'], utc=True).dt.tz_convert(tz)
+    else:
+        index = pd.to_datetime(frame.pop('date'), format=schema['time_format'])
+    return pd.DatetimeIndex(index).rename(None), frame
+
+
+class _CacheWriter:
+    """Appends parsed chunks to one raw binary file per column, widening a column's dtype if a chunk needs it."""
+
+    def __init__(self, directory, compact):
+        self.directory = directory
+        self.compact = compact
+        self.dtypes = {}
+        self.rows = 0
+
+    def _path(self, column):
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def write(self, column, values):
+        dtype = _column_dtype(column, values, self.compact) if column != 'timestamp' else np.dtype(np.int64)
+        current = self.dtypes.get(column)
+        if current is not None and np.promote_types(current, dtype) != current:
+            # Rare: an earlier chunk chose a narrower type; rewrite what was written so far
+            widened = np.promote_types(current, dtype)
+            np.fromfile(self._path(column), dtype=current).astype(widened).tofile(self._path(column))
+            current = widened
+        self.dtypes[column] = current or dtype
+        with open(self._path(column), 'ab') as f:
+            np.ascontiguousarray(values, dtype=self.dtypes[column]).tofile(f)
+
+
+def _cache_directory(path, cache_dir):
+    absolute = os.path.abspath(path)
+    digest = hashlib.sha1(absolute.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.basename(absolute)}-{digest}")
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _load_cache(directory, path, compact):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if meta.get('version') != CACHE_VERSION or meta['source'] != _source_signature(path) or meta['compact'] != compact:
+        return None
+
+    def column(name):
+        if meta['rows'] == 0:
+            return np.empty(0, dtype=meta['dtypes'][name])
+        return np.memmap(os.path.join(directory, f"{name}.bin"), dtype=meta['dtypes'][name], mode='r',
+                         shape=(meta['rows'],))
+
+    data = {name: column(name) for name in meta['columns']}
+    index = None
+    if 'timestamp' in meta['dtypes']:
+        index = pd.DatetimeIndex(column('timestamp').view('datetime64[ns]'))
+        if meta['tz']:
+            index = index.tz_localize('UTC').tz_convert(meta['tz'])
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def read_bars(path, cache=True, cache_dir=DEFAULT_CACHE_DIR, compact=True, tz=DEFAULT_TZ, chunksize=1_000_000):
+    """
+    Read one of the bundled CSV layouts into a normalized DataFrame.
+
+    Column names are lower case (open, high, low, close, volume, ...), the index
+    is a DatetimeIndex (timezone-aware for files with UTC offsets, converted to
+    `tz`), or a RangeIndex for files without timestamps.
+
+    The file is parsed in chunks of `chunksize` rows. With cache=True each chunk
+    is appended to a binary column cache, so memory stays bounded on large
+    files. Later reads memory-map that cache instead of parsing, until the
+    CSV's size or modification time changes.
+
+    Parameters:
+    path (str): CSV file.
+    cache (bool): Read from and write to the binary cache.
+    cache_dir (str): Where caches are kept, one directory per source file.
+    compact (bool): Store prices as float32 and whole-number volumes as uint32 (uint64 if needed),
+        instead of float64 and int64.
+    tz (str): Timezone for files whose timestamps carry UTC offsets.
+    chunksize (int): Rows parsed at a time.
+
+    Returns:
+    pd.DataFrame: The bars. Frames loaded from the cache are read-only views of the cache files.
+    """
+    directory = _cache_directory(path, cache_dir)
+    if cache:
+        cached = _load_cache(directory, path, compact)
+        if cached is not None:
+            return cached
+
+    name = detect_schema(path)
+    schema = SCHEMAS[name]
+    reader = pd.read_csv(path, header=0 if schema['header'] else None, dtype={0: str} if schema['header'] else None,
+                         chunksize=chunksize, engine='c')
+
+    if not cache:
+        frames = []
+        index = None
+        for chunk in reader:
+            index, frame = _parse_chunk(chunk, schema, tz)
+            frames.append(frame.set_axis(index) if index is not None else frame)
+        frame = pd.concat(frames) if frames else pd.DataFrame(columns=schema['columns'])
+        if index is None:
+            frame = frame.reset_index(drop=True)
+        return frame.astype({column: _column_dtype(column, frame[column].to_numpy(), compact)
+                             for column in frame.columns})
+
+    staging = f"{directory}.tmp"
+    os.makedirs(staging, exist_ok=True)
+    for stale in os.listdir(staging):
+        os.remove(os.path.join(staging, stale))
+    writer = _CacheWriter(staging, compact)
+    tz_name = None
+    for chunk in reader:
+        index, frame = _parse_chunk(chunk, schema, tz)
+        if index is not None:
+            tz_name = str(index.tz) if index.tz is not None else None
+            utc = index.tz_convert('UTC').tz_localize(None) if index.tz is not None else index
+            writer.write('timestamp', utc.as_unit('ns').asi8)
+        for column in schema['columns']:
+            writer.write(column, frame[column].to_numpy(dtype=np.float64))
+        writer.rows += len(frame)
+
+    meta = {'version': CACHE_VERSION, 'schema': name, 'source': _source_signature(path), 'compact': compact,
+            'rows': writer.rows, 'tz': tz_name, 'columns': schema['columns'],
+            'dtypes': {column: writer.dtypes.get(column, np.dtype(np.float64)).str
+                       for column in schema['columns'] + (['timestamp'] if schema['time_format'] else [])}}
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    if os.path.isdir(directory):
+        for stale in os.listdir(directory):
+            os.remove(os.path.join(directory, stale))
+        os.rmdir(directory)
+    os.replace(staging, directory)
+    return _load_cache(directory, path, compact)
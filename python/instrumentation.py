@@ -0,0 +1,251 @@
+import atexit
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+TRACE_ENV = 'QUANTISPY_TRACE'
+TRACE_MEMORY_ENV = 'QUANTISPY_TRACE_MEMORY'
+
+
+class _NullStage:
+    """What stage() returns while recording is off: entering, leaving and annotating do nothing."""
+
+    start = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def annotate(self, **args):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('recorder', 'name', 'args', 'start', 'base', 'peak')
+
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+        self.peak = 0
+
+    def __enter__(self):
+        stack = self.recorder._stack()
+        if self.recorder.memory:
+            # tracemalloc has one peak per process: hand the enclosing stage the peak so far, then restart it
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.base = current
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter_ns() - self.start
+        stack = self.recorder._stack()
+        stack.pop()
+        peak = None
+        if self.recorder.memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+            peak = self.peak - self.base
+        self.recorder.add(self.name, self.start, duration, peak, self.args)
+        return False
+
+    def annotate(self, **args):
+        """Attach values known only inside the stage, such as the number of bars fetched."""
+        self.args.update(args)
+
+
+class Recorder:
+    """
+    Collects timed stages, counters and EM iterations from every thread of the process.
+
+    Events hold absolute perf_counter_ns timestamps, so events recorded in
+    worker processes (see extend()) line up with the parent's in a trace.
+    With memory=True each stage also records its peak traced allocation
+    above the level at entry, using tracemalloc. That covers Python and
+    NumPy allocations, not the C++ HMM's. Peaks of stages that overlap on
+    different threads are not separated.
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.pid = os.getpid()
+        self.events = []
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def add(self, name, start_ns, duration_ns, peak_bytes=None, args=None):
+        thread = threading.current_thread()
+        event = {'name': name, 'pid': os.getpid(), 'thread': thread.name, 'tid': thread.ident, 'start_ns': start_ns,
+                 'duration_ns': duration_ns, 'args': args or {}}
+        if peak_bytes is not None:
+            event['peak_bytes'] = peak_bytes
+        with self.lock:
+            self.events.append(event)
+
+    def count(self, name, n=1):
+        with self.lock:
+            value = self.counters[name] = self.counters.get(name, 0) + n
+            self.events.append({'name': name, 'pid': os.getpid(), 'tid': threading.get_ident(),
+                                'start_ns': time.perf_counter_ns(), 'n': n, 'counter': value})
+
+    def extend(self, events):
+        """Merge events recorded by another Recorder, e.g. one in a worker process."""
+        with self.lock:
+            self.events.extend(events)
+            for event in events:
+                if 'counter' in event:
+                    self.counters[event['name']] = self.counters.get(event['name'], 0) + event['n']
+
+    def summary(self):
+        """Calls, total and longest wall time and the largest memory peak, per stage name."""
+        rows = {}
+        for event in self.events:
+            if 'duration_ns' not in event:
+                continue
+            row = rows.setdefault(event['name'], {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                                                  'peak_bytes': None})
+            seconds = event['duration_ns'] / 1e9
+            row['calls'] += 1
+            row['total_seconds'] += seconds
+            row['max_seconds'] = max(row['max_seconds'], seconds)
+            if 'peak_bytes' in event:
+                row['peak_bytes'] = max(row['peak_bytes'] or 0, event['peak_bytes'])
+        return rows
+
+    def chrome_trace(self):
+        """The events in the Chrome trace event format, for chrome://tracing or Perfetto."""
+        origin = min((event['start_ns'] for event in self.events), default=0)
+        trace, threads = [], {}
+        for event in self.events:
+            ts = (event['start_ns'] - origin) / 1000
+            if 'counter' in event:
+                trace.append({'name': event['name'], 'ph': 'C', 'ts': ts, 'pid': event['pid'], 'tid': event['tid'],
+                              'args': {event['name']: event['counter']}})
+                continue
+            args = dict(event['args'])
+            if 'peak_bytes' in event:
+                args['peak_bytes'] = event['peak_bytes']
+            trace.append({'name': event['name'], 'cat': 'quantispy', 'ph': 'X', 'ts': ts,
+                          'dur': event['duration_ns'] / 1000, 'pid': event['pid'], 'tid': event['tid'],
+                          'args': args})
+            threads[(event['pid'], event['tid'])] = event['thread']
+        for (pid, tid), name in threads.items():
+            trace.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def export(self, path):
+        """Write a Chrome trace (.json) or one JSON object per event (.jsonl, for log pipelines)."""
+        with open(path, 'w') as f:
+            if path.endswith('.jsonl'):
+                for event in self.events:
+                    f.write(json.dumps(event) + '\n')
+            else:
+                json.dump(self.chrome_trace(), f)
+
+
+_recorder = None
+
+
+def enable(memory=False):
+    """Start recording in this process, replacing any current recorder; returns the new one."""
+    global _recorder
+    _recorder = Recorder(memory)
+    return _recorder
+
+
+def disable():
+    """Stop recording; returns the recorder that was active (or None) with what it collected."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None and recorder.memory:
+        tracemalloc.stop()
+    return recorder
+
+
+def recorder():
+    """The active recorder, or None. A recorder inherited by a forked worker process belongs to the parent."""
+    if _recorder is None or _recorder.pid != os.getpid():
+        return None
+    return _recorder
+
+
+def stage(name, **args):
+    """
+    Time a block as one pipeline stage:
+
+        with stage('fetch', symbol=symbol) as s:
+            ...
+            s.annotate(bars=len(frame))
+
+    Stages nest per thread. While recording is off (or the recorder was
+    inherited from the parent process) this returns a shared no-op object.
+    """
+    if _recorder is None:  # Fast path while recording is off
+        return _NULL_STAGE
+    active = recorder()
+    if active is None:
+        return _NULL_STAGE
+    return _Stage(active, name, args)
+
+
+def count(name, n=1):
+    active = recorder()
+    if active is not None:
+        active.count(name, n)
+
+
+def record_em(model, start_ns, name='em_iteration', **args):
+    """
+    Record each EM iteration of the model's last baum_welch as a stage, from its convergence trace.
+
+    The fit runs in C++ without the GIL, so iterations are timed there.
+    Their events are laid end to end from start_ns, the perf_counter_ns()
+    taken before the fit.
+    """
+    active = recorder()
+    if active is None:
+        return
+    previous = None
+    for iteration, (log_likelihood, seconds) in enumerate(zip(model.get_convergence_trace(),
+                                                              model.get_iteration_seconds())):
+        duration = int(seconds * 1e9)
+        delta = None if previous is None else float(log_likelihood - previous)
+        active.add(name, start_ns, duration, None,
+                      dict(args, iteration=iteration, log_likelihood=float(log_likelihood), delta=delta))
+        start_ns += duration
+        previous = log_likelihood
+
+
+def _export_at_exit(path):
+    active = recorder()
+    if active is not None:
+        active.export(path)
+
+
+# QUANTISPY_TRACE=trace.json (or .jsonl) records the whole run and writes it at exit;
+# QUANTISPY_TRACE_MEMORY=1 adds memory peaks
+if os.environ.get(TRACE_ENV):
+    enable(memory=os.environ.get(TRACE_MEMORY_ENV) == '1')
+    atexit.register(_export_at_exit, os.environ[TRACE_ENV])
@@ -0,0 +1,247 @@
+import asyncio
+import threading
+import time
+
+import aiohttp
+import numpy as np
+import pandas as pd
+
+from python.bar_store import BAR_COLUMNS
+
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+YAHOO_CHART_URL = 'https://query1.finance.yahoo.com/v8/finance/chart/'
+ALPHA_VANTAGE = 'alpha_vantage'
+YAHOO = 'yahoo'
+
+
+class RetryableError(Exception):
+    """A response worth retrying: a dropped connection, a 429/5xx, or an Alpha Vantage throttle note."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter for coroutines.
+
+    Parameters:
+    rate (float): Tokens added per second.
+    capacity (float): Maximum burst.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def parse_alpha_vantage(payload):
+    if 'Error Message' in payload:
+        raise ValueError(payload['Error Message'])
+    series = next((value for key, value in payload.items() if key.startswith('Time Series')), None)
+    if series is None:
+        raise ValueError(f"Unexpected Alpha Vantage response with keys {list(payload)}")
+    df = pd.DataFrame.from_dict(series, orient='index', dtype=np.float64)
+    df.columns = [column.split('. ', 1)[-1] for column in df.columns]  # '1. open' -> 'open'
+    df.index = pd.to_datetime(df.index)
+    return df.sort_index()[BAR_COLUMNS]
+
+
+def parse_yahoo(payload):
+    chart = payload.get('chart', {})
+    if chart.get('error'):
+        raise ValueError(f"Yahoo chart error: {chart['error']}")
+    result = chart['result'][0]
+    quote = result['indicators']['quote'][0]
+    tz = result['meta'].get('exchangeTimezoneName', 'America/New_York')
+    index = pd.to_datetime(result.get('timestamp', []), unit='s', utc=True).tz_convert(tz)
+    df = pd.DataFrame({column: np.array(quote.get(column, []), dtype=np.float64) for column in BAR_COLUMNS},
+                      index=index)
+    return df.dropna(subset=['close'])
+
+
+class MarketDataClient:
+    """
+    Asynchronous intraday bar fetcher for Alpha Vantage and Yahoo.
+
+    One aiohttp session per client pools connections across requests. Each
+    provider has its own token bucket (Alpha Vantage's free tier allows 5
+    requests a minute). Failed requests are retried with exponential backoff.
+    Identical requests in flight at the same time share one response. Base URLs
+    are parameters, so the client can run against a local stub server.
+
+    Parameters:
+    alpha_vantage_per_minute (float): Alpha Vantage request quota.
+    yahoo_per_minute (float): Yahoo request rate.
+    max_retries (int): Retries after the first attempt.
+    backoff (float): Seconds before the first retry, doubled on each further one.
+    max_connections (int): Size of the connection pool.
+    timeout (float): Per-request timeout in seconds.
+    """
+
+    def __init__(self, alpha_vantage_url=ALPHA_VANTAGE_URL, yahoo_url=YAHOO_CHART_URL, alpha_vantage_per_minute=5,
+                 yahoo_per_minute=120, max_retries=3, backoff=1.0, max_connections=8, timeout=30.0):
+        self.urls = {ALPHA_VANTAGE: alpha_vantage_url, YAHOO: yahoo_url}
+        self.per_minute = {ALPHA_VANTAGE: alpha_vantage_per_minute, YAHOO: yahoo_per_minute}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.session = None
+        self.limiters = {}
+        self.inflight = {}
+        self.stats = {'requests': 0, 'retries': 0, 'coalesced': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _session(self):
+        # Created on first use so it belongs to the loop the client runs on
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': 'Mozilla/5.0 (QuantiSPY)'})
+        return self.session
+
+    def _limiter(self, provider):
+        if provider not in self.limiters:
+            rate = self.per_minute[provider] / 60.0
+            self.limiters[provider] = TokenBucket(rate, max(1.0, min(self.per_minute[provider], 5)))
+        return self.limiters[provider]
+
+    async def _get_json(self, provider, url, params):
+        for attempt in range(self.max_retries + 1):
+            await self._limiter(provider).acquire()
+            self.stats['requests'] += 1
+            try:
+                async with self._session().get(url, params=params) as response:
+                    if response.status == 429 or response.status >= 500:
+                        retry_after = response.headers.get('Retry-After')
+                        raise RetryableError(f"HTTP {response.status}",
+                                             float(retry_after) if retry_after and retry_after.isdigit() else None)
+                    response.raise_for_status()
+                    payload = await response.json(content_type=None)
+                if provider == ALPHA_VANTAGE and ('Note' in payload or 'Information' in payload):
+                    raise RetryableError(payload.get('Note') or payload.get('Information'))
+                return payload
+            except (RetryableError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                    asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = getattr(e, 'retry_after', None) or self.backoff * 2 ** attempt
+                print(f"{provider} request failed ({e}), retrying in {delay:.1f}s")
+                self.stats['retries'] += 1
+                await asyncio.sleep(delay)
+
+    async def _coalesce(self, key, factory):
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.stats['coalesced'] += 1
+        # Shielded so one caller being cancelled does not cancel the shared request
+        return await asyncio.shield(task)
+
+    async def _alpha_vantage(self, symbol, since, api_key):
+        params = {'function': 'TIME_SERIES_INTRADAY', 'symbol': symbol, 'interval': '5min', 'apikey': api_key,
+                  'outputsize': 'full' if since is None else 'compact'}
+        df = parse_alpha_vantage(await self._get_json(ALPHA_VANTAGE, self.urls[ALPHA_VANTAGE], params))
+        # The compact response (last 100 bars) is enough unless it no longer reaches the stored bars
+        if since is not None and (df.empty or df.index[0] > since):
+            params['outputsize'] = 'full'
+            df = parse_alpha_vantage(await self._get_json(ALPHA_VANTAGE, self.urls[ALPHA_VANTAGE], params))
+        return df
+
+    async def _yahoo(self, symbol, since):
+        params = {'interval': '5m', 'includePrePost': 'false'}
+        # Yahoo serves 5-minute bars for the last 60 days only
+        if since is None or since < pd.Timestamp.now(tz=since.tz) - pd.Timedelta(days=59):
+            params['range'] = '1d'
+        else:
+            params['period1'] = str(int(since.timestamp()))
+            params['period2'] = str(int(time.time()))
+        return parse_yahoo(await self._get_json(YAHOO, self.urls[YAHOO] + symbol, params))
+
+    async def fetch(self, provider, symbol, since=None, api_key=None):
+        """
+        Fetch 5-minute bars for one symbol as a DataFrame with open/high/low/close/volume columns.
+
+        `since` is the last bar already held (None for a full download); the
+        response may still include older bars, which BarStore.append skips.
+        """
+        if provider == ALPHA_VANTAGE:
+            factory = lambda: self._alpha_vantage(symbol, since, api_key)  # noqa: E731
+        elif provider == YAHOO:
+            factory = lambda: self._yahoo(symbol, since)  # noqa: E731
+        else:
+            raise ValueError(f"Unknown provider '{provider}'")
+        return await self._coalesce((provider, symbol.upper(), str(since), api_key), factory)
+
+    async def fetch_many(self, provider, requests, api_key=None):
+        """
+        Fetch several symbols concurrently.
+
+        Parameters:
+        requests (dict): symbol -> since, as for fetch().
+
+        Returns:
+        dict: symbol -> DataFrame, or the exception that request failed with.
+        """
+        symbols = list(requests)
+        results = await asyncio.gather(*(self.fetch(provider, symbol, requests[symbol], api_key)
+                                         for symbol in symbols), return_exceptions=True)
+        return dict(zip(symbols, results))
+
+
+class MarketDataService:
+    """
+    Runs a MarketDataClient on a background event loop for synchronous callers such as the GUI.
+
+    submit() and fetch() return concurrent.futures.Future objects, so callers can
+    start several requests and wait on them later without blocking each other.
+    """
+
+    def __init__(self, **client_options):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='market-data', daemon=True)
+        self.thread.start()
+        self.client = MarketDataClient(**client_options)
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def fetch(self, provider, symbol, since=None, api_key=None):
+        return self.submit(self.client.fetch(provider, symbol, since, api_key))
+
+    def close(self):
+        self.submit(self.client.close()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
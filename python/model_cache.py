@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+
+import stock_hmm  # type: ignore
+
+from python.instrumentation import count, record_em, stage
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.quantispy', 'models')
+
+
+class ModelCache:
+    """
+    On-disk cache of fitted StockHMM models with least-recently-used eviction.
+
+    Entries are keyed by symbol, number of states, emission mode and data window,
+    and stored as one file each in the StockHMM binary format. A file's
+    modification time is its last use, so eviction survives restarts without
+    a separate index.
+
+    Every call returns a new StockHMM, loaded from its file or freshly
+    fitted, which belongs to the caller. StockHMM fits and filters without
+    the GIL and is not thread-safe, so the cache never keeps instances to
+    share between concurrent tasks.
+
+    Parameters:
+    directory (str): Where model files are kept; created on first write.
+    max_entries (int): Number of models kept before the least recently used are deleted.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=64):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def _prefix(self, symbol, num_states, emission):
+        safe_symbol = re.sub(r'[^A-Za-z0-9._-]', '_', str(symbol).upper())
+        return f"{safe_symbol}-{num_states}-{emission}-"
+
+    def _path(self, symbol, num_states, window, emission):
+        digest = hashlib.sha1(repr(tuple(str(bound) for bound in window)).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{self._prefix(symbol, num_states, emission)}{digest}.hmm")
+
+    def _entries(self, prefix=''):
+        if not os.path.isdir(self.directory):
+            return []
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.startswith(prefix) and name.endswith('.hmm')]
+        return sorted(paths, key=os.path.getmtime)
+
+    def _load(self, path):
+        try:
+            with open(path, 'rb') as f:
+                model = stock_hmm.StockHMM.from_bytes(f.read())
+        except (OSError, ValueError) as e:
+            print(f"Discarding unreadable cached model {path}: {e}")
+            self._remove(path)
+            return None
+        os.utime(path)
+        return model
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, symbol, num_states, window, emission='discrete'):
+        """Return the model fitted on exactly this window, or None."""
+        path = self._path(symbol, num_states, window, emission)
+        if not os.path.exists(path):
+            return None
+        return self._load(path)
+
+    def latest(self, symbol, num_states, emission='discrete'):
+        """Return the most recently used model for the symbol on any window, or None."""
+        for path in reversed(self._entries(self._prefix(symbol, num_states, emission))):
+            model = self._load(path)
+            if model is not None:
+                return model
+        return None
+
+    def put(self, symbol, window, model):
+        """Store a fitted model and evict the least recently used entries over max_entries."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(symbol, model.get_num_states(), window, model.get_emission())
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(model.to_bytes())
+        os.replace(temp_path, path)
+
+        entries = self._entries()
+        for stale in entries[:max(0, len(entries) - self.max_entries)]:
+            self._remove(stale)
+
+    def fit(self, symbol, returns, num_states, window, emission='discrete', max_iterations=100, tolerance=1e-6,
+            warm_iterations=10):
+        """
+        Return a model fitted on `returns`, reusing the cache where possible.
+
+        An exact hit on the window is returned as is. Otherwise EM is warm-started
+        from the symbol's most recent model for at most `warm_iterations` steps,
+        which is enough for a rolling window that mostly overlaps the last one,
+        or run for up to `max_iterations` from random parameters when there is
+        none. The result is cached under the window.
+        """
+        model = self.get(symbol, num_states, window, emission)
+        if model is not None:
+            count('model_cache_hits')
+            return model
+
+        previous = self.latest(symbol, num_states, emission)
+        model = stock_hmm.StockHMM(num_states, emission=emission)
+        with stage('baum_welch', symbol=symbol, states=num_states, bars=len(returns),
+                   warm_start=previous is not None) as fit:
+            if previous is None:
+                model.baum_welch(returns, max_iterations, tolerance)
+            else:
+                model.baum_welch(returns, min(warm_iterations, max_iterations), tolerance, warm_start=previous)
+            fit.annotate(iterations=len(model.get_convergence_trace()))
+        record_em(model, fit.start, symbol=symbol)
+        self.put(symbol, window, model)
+        return model
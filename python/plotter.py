@@ -1,57 +1,140 @@
+import functools
 import numpy as np
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba_array
 from matplotlib.lines import Line2D
-from matplotlib.widgets import MultiCursor
+from matplotlib.ticker import MaxNLocator
 from python.directional_change import directional_change
 from python.trendline import calculate_trendlines
-import mplcursors
 from python.relativestrength import calculate_relative_strength
+from python.instrumentation import count, stage
 
 plt.style.use('dark_background')
 
 
-def plot_candlestick(ax, df):
-    print("Plotting candlesticks...")
-    df = df.copy()
-    df['date_num'] = np.arange(len(df))
+UP_COLOR = '#00ff00'  # Bright green
+DOWN_COLOR = '#ff0000'  # Bright red
+
+
+def rgba_array(colors):
+    """Colors as an (n, 4) RGBA array, converting each distinct color once instead of once per element."""
+    names, inverse = np.unique(np.asarray(colors), return_inverse=True)
+    return to_rgba_array(names)[inverse.ravel()]
+
+
+def bar_polygons(x, bottom, top, width=0.8):
+    """Rectangles centred on x as an (n, 4, 2) vertex array for a PolyCollection."""
+    x = np.asarray(x, dtype=np.float64)
+    left, right = x - width / 2, x + width / 2
+    bottom = np.asarray(bottom, dtype=np.float64)
+    top = np.asarray(top, dtype=np.float64)
+    return np.stack([np.column_stack([left, bottom]), np.column_stack([left, top]),
+                     np.column_stack([right, top]), np.column_stack([right, bottom])], axis=1)
+
+
+def colored_segments(x, y, colors, **kwargs):
+    """
+    One LineCollection for the polyline through (x, y), segment i (from point i to i + 1) drawn in colors[i].
+
+    A single artist instead of one Line2D per segment, so drawing cost does not
+    grow with Python-level artist overhead.
+    """
+    points = np.column_stack([np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)])
+    segments = np.stack([points[:-1], points[1:]], axis=1)
+    return LineCollection(segments, colors=rgba_array(colors)[:len(segments)], **kwargs)
+
+
+def bar_arrays(df):
+    """The OHLCV columns as float64 arrays, the input of downsample_ohlc."""
+    return {column: df[column].to_numpy(dtype=np.float64) for column in ['open', 'high', 'low', 'close', 'volume']}
 
-    width = 0.8
 
-    up = df[df.close >= df.open]
-    down = df[df.close < df.open]
+def bucket_size(count, max_bars):
+    """Bars per bucket so that count bars draw as at most max_bars candles."""
+    return max(1, -(-count // max(1, max_bars)))
 
-    # Increase contrast for candlesticks
-    up_color = '#00ff00'  # Bright green
-    down_color = '#ff0000'  # Bright red
 
-    # Plot up candlesticks
-    ax.bar(up.date_num, up.close - up.open, width, bottom=up.open, color=up_color, edgecolor=up_color, linewidth=1,
-           zorder=3)
-    ax.vlines(up.date_num, up.low, up.high, color=up_color, linewidth=1, zorder=2)
+def downsample_ohlc(bars, lo, hi, k):
+    """
+    Aggregate the bars in positions [lo, hi) into buckets of k bars.
+
+    Each bucket gets the first open, the highest
+    high, the lowest low, the last close and the mean volume, so it draws like
+    one candle of a k-times longer interval. Buckets are aligned to multiples
+    of k, so panning at a fixed zoom does not move their boundaries.
+
+    Parameters:
+    bars (dict): Arrays from bar_arrays().
+    lo, hi (int): The range of bar positions to cover.
+    k (int): Bars per bucket (see bucket_size).
+
+    Returns:
+    tuple: (x, aggregated bars) where x holds the bucket centres in bar positions.
+    """
+    n = len(bars['close'])
+    lo, hi = max(0, lo), min(n, hi)
+    if k == 1:
+        return np.arange(lo, hi, dtype=np.float64), {name: values[lo:hi] for name, values in bars.items()}
+    start, stop = lo // k * k, min(n, -(-hi // k) * k)
+    starts = np.arange(start, stop, k)
+    ends = np.minimum(starts + k, stop)
+    offsets = starts - start
+    aggregated = {
+        'open': bars['open'][starts],
+        'high': np.maximum.reduceat(bars['high'][start:stop], offsets),
+        'low': np.minimum.reduceat(bars['low'][start:stop], offsets),
+        'close': bars['close'][ends - 1],
+        'volume': np.add.reduceat(bars['volume'][start:stop], offsets) / (ends - starts),
+    }
+    return (starts + ends - 1) / 2, aggregated
+
+
+def candle_geometry(x, bars, width=0.8):
+    """Body polygons, wick segments and colors for candles centred on x."""
+    colors = rgba_array(np.where(bars['close'] >= bars['open'], UP_COLOR, DOWN_COLOR))
+    wicks = np.stack([np.column_stack([x, bars['low']]), np.column_stack([x, bars['high']])], axis=1)
+    return bar_polygons(x, bars['open'], bars['close'], width), wicks, colors
+
+
+def volume_geometry(x, bars, width=0.8):
+    colors = rgba_array(np.where(bars['close'] >= bars['open'], UP_COLOR, DOWN_COLOR))
+    return bar_polygons(x, np.zeros(len(x)), bars['volume'], width), colors
+
+
+def plot_candlestick(ax, df, max_bars=None):
+    # max_bars: draw at most about this many candles, aggregating neighbouring bars (see downsample_ohlc)
+    k = bucket_size(len(df), max_bars or len(df))
+    x, bars = downsample_ohlc(bar_arrays(df), 0, len(df), k)
+
+    width = 0.8
 
-    # Plot down candlesticks
-    ax.bar(down.date_num, down.close - down.open, width, bottom=down.open, color=down_color, edgecolor=down_color,
-           linewidth=1, zorder=3)
-    ax.vlines(down.date_num, down.low, down.high, color=down_color, linewidth=1, zorder=2)
+    # Bodies and wicks are one collection each rather than a patch and a line per bar
+    polygons, segments, colors = candle_geometry(x, bars, width * k)
+    bodies = PolyCollection(polygons, facecolors=colors, edgecolors=colors, linewidths=1, zorder=3)
+    wicks = LineCollection(segments, colors=colors, linewidths=1, zorder=2)
+    # The limits are set below, so skip computing the data extent of every path
+    ax.add_collection(wicks, autolim=False)
+    ax.add_collection(bodies, autolim=False)
 
     ax.set_xlim(-1, len(df))
     ax.set_ylim(df.low.min() * 0.999, df.high.max() * 1.001)
 
-    print(f"Plotted {len(df)} candlesticks.")
+    count('candles_drawn', len(x))
+    return bodies, wicks
 
 
-def plot_volume(ax, df):
-    print("Plotting volume...")
-    df = df.copy()
-    df['date_num'] = np.arange(len(df))
+def plot_volume(ax, df, max_bars=None):
+    k = bucket_size(len(df), max_bars or len(df))
+    x, bars = downsample_ohlc(bar_arrays(df), 0, len(df), k)
 
     width = 0.8
-    up = df[df.close >= df.open]
-    down = df[df.close < df.open]
 
     # Increase contrast for volume bars
-    ax.bar(up.date_num, up.volume, width, color='#00ff00', alpha=0.5)
-    ax.bar(down.date_num, down.volume, width, color='#ff0000', alpha=0.5)
+    polygons, colors = volume_geometry(x, bars, width * k)
+    volume_bars = PolyCollection(polygons, facecolors=colors, linewidths=0, alpha=0.5)
+    ax.add_collection(volume_bars, autolim=False)
 
     ax.set_xlim(-1, len(df))
     ax.set_ylim(0, df.volume.max() * 1.5)
@@ -59,52 +142,70 @@ def plot_volume(ax, df):
     # Format y-axis to show volume in millions
     ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x / 1e6:.1f}M'))
 
-    print("Volume plotted.")
+    return volume_bars
 
 
 def plot_directional_change(ax, dc_df, marker_size=50):
-    print("Plotting directional changes...")
-    dc_df = dc_df.copy()
-    dc_df['date_num'] = dc_df.index.map(dict(zip(dc_df.index, range(len(dc_df)))))
+    date_num = np.arange(len(dc_df))
 
-    mask = (dc_df['bullish'] == 1) | (dc_df['bearish'] == 1)
-    indices = dc_df.loc[mask, 'date_num']
-    prices = dc_df.loc[mask, 'close']
-    colors = ['#00ff00' if bull else '#ff0000' for bull in dc_df.loc[mask, 'bullish']]
+    mask = ((dc_df['bullish'] == 1) | (dc_df['bearish'] == 1)).to_numpy()
+    indices = date_num[mask]
+    prices = dc_df['close'].to_numpy()[mask]
+    colors = np.where(dc_df['bullish'].to_numpy()[mask] == 1, UP_COLOR, DOWN_COLOR)
 
-    for i in range(len(indices) - 1):
-        ax.plot(indices.iloc[i:i + 2], prices.iloc[i:i + 2], color=colors[i], linewidth=2, alpha=0.7)
+    if len(indices) > 1:
+        ax.add_collection(colored_segments(indices, prices, colors, linewidths=2, alpha=0.7))
 
     ax.scatter(indices, prices, c=colors, s=marker_size, zorder=5, alpha=0.7)
-
-    print(f"Plotted zig-zag line with {len(indices)} turning points.")
+    count('turning_points_drawn', len(indices))
 
 
 def plot_trendlines(ax, df):
-    print("Plotting trendlines...")
     df = df.copy()
     df['date_num'] = np.arange(len(df))
     valid_data = df.dropna(subset=['support', 'resistance'])
     ax.plot(valid_data['date_num'], valid_data['support'], color='#2962ff', linestyle='--', linewidth=2, alpha=0.7)
     ax.plot(valid_data['date_num'], valid_data['resistance'], color='#ff6d00', linestyle='--', linewidth=2, alpha=0.7)
-    print("Trendlines plotted.")
 
 
-def plot_stock_data(fig, df, ticker, relative_strength=None, sigma=0.005, min_change=0.002, window=3, min_duration=2):
+def compute_overlays(df, sigma=0.005, min_change=0.002, window=3, min_duration=2):
+    """Directional-change and trendline frames for plot_stock_data; safe to run off the UI thread."""
+    with stage('directional_change', bars=len(df)):
+        dc_df = directional_change(df['high'], df['low'], df['close'], sigma=sigma, min_change=min_change,
+                                   window=window, min_duration=min_duration)
+    with stage('trendlines', bars=len(df)):
+        trendline_df = calculate_trendlines(df, lookback=12, smoothing_window=3, smoothing_poly=2)
+    return dc_df, trendline_df
+
+
+def plot_stock_data(fig, df, ticker, relative_strength=None, sigma=0.005, min_change=0.002, window=3, min_duration=2,
+                    overlays=None, interactive=True):
+    """
+    Draw the candlestick, volume, directional-change and trendline chart into fig.
+
+    Candles and volume bars are drawn at a level of detail that fits the axes
+    width. With interactive=True, panning, scroll zoom, a crosshair and hover
+    tooltips are connected, and finer detail is swapped in as the view narrows.
+
+    Returns:
+    InteractiveChart: Keep a reference to it for as long as the chart is shown.
+    """
     # Create subplots with shared x-axis
     gs = fig.add_gridspec(2, 1, height_ratios=[3, 1], hspace=0)
     ax1 = fig.add_subplot(gs[0])
     ax2 = fig.add_subplot(gs[1], sharex=ax1)
 
-    plot_candlestick(ax1, df)
-    plot_volume(ax2, df)
-
-    dc_df = directional_change(df['high'], df['low'], df['close'], sigma=sigma, min_change=min_change, window=window,
-                               min_duration=min_duration)
-    plot_directional_change(ax1, dc_df)
+    max_bars = detail_budget(ax1)
+    with stage('plot_candles', bars=len(df)):
+        candles = plot_candlestick(ax1, df, max_bars)
+        volume_bars = plot_volume(ax2, df, max_bars)
 
-    trendline_df = calculate_trendlines(df, lookback=12, smoothing_window=3, smoothing_poly=2)
-    plot_trendlines(ax1, trendline_df)
+    # overlays: a precomputed compute_overlays() result, e.g. from a background task
+    dc_df, trendline_df = overlays or compute_overlays(df, sigma=sigma, min_change=min_change, window=window,
+                                                       min_duration=min_duration)
+    with stage('plot_overlays', bars=len(df)):
+        plot_directional_change(ax1, dc_df)
+        plot_trendlines(ax1, trendline_df)
 
     # Add Relative Strength information if provided
     if relative_strength is not None:
@@ -129,11 +230,19 @@ def plot_stock_data(fig, df, ticker, relative_strength=None, sigma=0.005, min_ch
         ax.grid(True, linestyle='--', alpha=0.3, color='gray')
         ax.set_axisbelow(True)
 
-    # Improve x-axis labels
+    # Improve x-axis labels; x is the bar position, so ticks follow the view when zooming
     num_ticks = 8
-    tick_locations = np.linspace(0, len(df) - 1, num_ticks, dtype=int)
-    ax2.set_xticks(tick_locations)
-    ax2.set_xticklabels(df.index[tick_locations].strftime('%I:%M %p'), rotation=45, ha='right', color='white')
+    index = df.index
+
+    def time_label(x, pos):
+        position = int(round(x))
+        return index[position].strftime('%I:%M %p') if 0 <= position < len(index) else ''
+
+    ax2.xaxis.set_major_locator(MaxNLocator(num_ticks, integer=True))
+    ax2.xaxis.set_major_formatter(plt.FuncFormatter(time_label))
+    ax1.tick_params(axis='x', labelbottom=False)
+    ax2.tick_params(axis='x', labelrotation=45, colors='white')
+    plt.setp(ax2.get_xticklabels(), ha='right')
 
     # Improve y-axis labels
     ax1.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f"${x:.2f}"))
@@ -151,78 +260,327 @@ def plot_stock_data(fig, df, ticker, relative_strength=None, sigma=0.005, min_ch
         ax.set_facecolor('#1e1e1e')
     fig.set_facecolor('#1e1e1e')
 
-    # Enable zooming and panning
-    fig.canvas.mpl_connect('scroll_event', lambda event: on_scroll(event, ax1, ax2))
-    fig.canvas.mpl_connect('button_press_event', lambda event: on_press(event, fig, ax1, ax2))
-    fig.canvas.mpl_connect('button_release_event', lambda event: on_release(event, fig))
-    fig.canvas.mpl_connect('motion_notify_event', lambda event: on_motion(event, fig, ax1, ax2))
-
-    # Add cursor
-    multi = MultiCursor(fig.canvas, (ax1, ax2), color='white', lw=1, horizOn=True, vertOn=True)
-
-    # Add tooltips
-    cursor = mplcursors.cursor(hover=True)
-    cursor.connect("add", lambda sel: sel.annotation.set_text(
-        f'Time: {df.index[int(sel.target.index)].strftime("%Y-%m-%d %H:%M")}\n'
-        f'Open: ${df.iloc[int(sel.target.index)].open:.2f}\n'
-        f'High: ${df.iloc[int(sel.target.index)].high:.2f}\n'
-        f'Low: ${df.iloc[int(sel.target.index)].low:.2f}\n'
-        f'Close: ${df.iloc[int(sel.target.index)].close:.2f}\n'
-        f'Volume: {df.iloc[int(sel.target.index)].volume:,}'
-    ))
-
-    plt.tight_layout()
-
-
-def on_scroll(event, ax1, ax2):
-    base_scale = 1.1
-    # zoom in
-    if event.button == 'up':
-        scale_factor = 1 / base_scale
-    # zoom out
-    else:
-        scale_factor = base_scale
-
-    for ax in [ax1, ax2]:
-        x_min, x_max = ax.get_xlim()
-        y_min, y_max = ax.get_ylim()
+    chart = InteractiveChart(fig, ax1, ax2, df, candles, volume_bars)
+    if not interactive:
+        fig.tight_layout()
+        chart.update_detail()  # The axes width changed
+        return chart
 
-        x_center = x_min + (x_max - x_min) / 2
-        y_center = y_min + (y_max - y_min) / 2
+    # Enable zooming, panning, the crosshair and candle tooltips
+    chart.connect()
 
-        ax.set_xlim([x_center - (x_center - x_min) * scale_factor,
-                     x_center + (x_max - x_center) * scale_factor])
-        ax.set_ylim([y_center - (y_center - y_min) * scale_factor,
-                     y_center + (y_max - y_center) * scale_factor])
+    fig.tight_layout()
+    chart.update_detail()
+    return chart
 
-    event.canvas.draw()
 
+def plot_hmm_analysis(fig, dates, prices, returns, predicted_return, trading_signals, ticker):
+    """
+    Draw the HMM view into fig: the close colored by trading signal with the predicted next close, and the returns.
 
-def on_press(event, fig, ax1, ax2):
-    fig._pan_start = (ax1.get_xlim(), ax1.get_ylim(), ax2.get_ylim(), event.x, event.y)
-
-
-def on_release(event, fig):
-    fig._pan_start = None
-
-
-def on_motion(event, fig, ax1, ax2):
-    if fig._pan_start is None or event.button != 1:  # Left mouse button
-        return
-
-    dx = event.x - fig._pan_start[3]
-    dy = event.y - fig._pan_start[4]
-
-    x_min, x_max = fig._pan_start[0]
-    y1_min, y1_max = fig._pan_start[1]
-    y2_min, y2_max = fig._pan_start[2]
-
-    scale_x = (x_max - x_min) / fig.get_figwidth()
-    scale_y1 = (y1_max - y1_min) / fig.get_figheight()
-    scale_y2 = (y2_max - y2_min) / fig.get_figheight()
-
-    ax1.set_xlim(x_min - dx * scale_x, x_max - dx * scale_x)
-    ax1.set_ylim(y1_min + dy * scale_y1, y1_max + dy * scale_y1)
-    ax2.set_ylim(y2_min + dy * scale_y2, y2_max + dy * scale_y2)
-
-    fig.canvas.draw()
\ No newline at end of file
+    Parameters:
+    dates, prices (pd.Series/DatetimeIndex): The bars the returns were computed from, aligned with `returns`.
+    returns (np.ndarray): The returns the model was fitted on.
+    predicted_return (float): StockHMM.predict_next_return().
+    trading_signals (list): StockHMM.get_trading_signals(returns).
+    """
+    gs = fig.add_gridspec(2, 1, height_ratios=[3, 1])
+    ax1 = fig.add_subplot(gs[0])
+    ax2 = fig.add_subplot(gs[1], sharex=ax1)
+    ax1.tick_params(labelbottom=False)
+    fig.patch.set_facecolor('black')
+
+    # Plot stock prices as a line chart
+    ax1.plot(dates, prices, label='Close Price', color='white', linewidth=1)
+
+    # Color the price line based on trading signals: the segment ending at bar i takes bar i's signal
+    signal_colors = {'BUY': 'green', 'SELL': 'red', 'HOLD': 'gray'}
+    if len(dates) > 1:
+        ax1.add_collection(colored_segments(mdates.date2num(dates), prices,
+                                            [signal_colors[signal] for signal in trading_signals[1:]],
+                                            linewidths=2))
+
+    ax1.set_title(f"Stock Price and HMM Analysis for {ticker}", color='white')
+    ax1.set_ylabel("Price ($)", color='white')
+    ax1.tick_params(axis='y', colors='white')
+    ax1.legend(loc='upper left')
+
+    # Add price information
+    current_price = prices.iloc[-1]
+    day_high = prices.max()
+    day_low = prices.min()
+    price_info = f"Current: ${current_price:.2f}\nHigh: ${day_high:.2f}\nLow: ${day_low:.2f}"
+    ax1.text(0.02, 0.05, price_info, transform=ax1.transAxes, fontsize=10,
+             verticalalignment='bottom', color='white', bbox=dict(facecolor='black', alpha=0.7))
+
+    # Plot returns as a line
+    ax2.plot(dates, returns, color='blue', linewidth=1)
+    ax2.fill_between(dates, returns, 0, where=(returns > 0), facecolor='green', alpha=0.3)
+    ax2.fill_between(dates, returns, 0, where=(returns <= 0), facecolor='red', alpha=0.3)
+    ax2.axhline(y=0, color='white', linestyle='-', linewidth=0.5)
+    ax2.set_ylabel("Returns (%)", color='white')
+    ax2.set_xlabel("Date", color='white')
+    ax2.tick_params(axis='y', colors='white')
+
+    # Add returns information
+    mean_return = np.mean(returns) * 100
+    std_return = np.std(returns) * 100
+    returns_info = f"Mean: {mean_return:.2f}%\nStd Dev: {std_return:.2f}%"
+    ax2.text(0.02, 0.95, returns_info, transform=ax2.transAxes, fontsize=10,
+             verticalalignment='top', color='white', bbox=dict(facecolor='black', alpha=0.7))
+
+    # Plot predicted return
+    if not np.isnan(predicted_return):
+        predicted_price = current_price * (1 + predicted_return)
+        ax1.axhline(y=predicted_price, color='yellow', linestyle='--',
+                    label=f'Predicted Next Close: ${predicted_price:.2f}')
+        ax1.text(dates[-1], predicted_price, f'${predicted_price:.2f}', color='yellow', ha='right', va='bottom')
+
+    # Add current trading signal
+    current_signal = trading_signals[-1] if trading_signals else "N/A"
+    ax1.text(0.02, 0.95, f"Current Signal: {current_signal}", transform=ax1.transAxes, fontsize=12,
+             verticalalignment='top', color='white', bbox=dict(facecolor='black', alpha=0.7))
+
+    # Create a custom legend for trading signals
+    legend_elements = [Line2D([0], [0], color=c, lw=2, label=s) for s, c in signal_colors.items()]
+    ax1.legend(handles=legend_elements, loc='upper left', title='Signals')
+
+    date_formatter = mdates.DateFormatter('%Y-%m-%d %I:%M %p')  # %I for 12-hour clock, %p for AM/PM
+    ax1.xaxis.set_major_formatter(date_formatter)
+    ax2.xaxis.set_major_formatter(date_formatter)
+
+    fig.tight_layout()
+    return ax1, ax2
+
+
+def detail_budget(ax):
+    """Candles worth drawing across the axes: about one per two pixels."""
+    return max(100, int(ax.bbox.width) // 2)
+
+
+class InteractiveChart:
+    """
+    Pan, scroll zoom, crosshair and level of detail for the chart plot_stock_data draws.
+
+    Only the bars in view are drawn, aggregated to about one candle per two
+    pixels (downsample_ohlc), and the detail is rebuilt whenever the x limits
+    change, so zooming in swaps in finer bars and a zoomed-out year of
+    5-minute data draws a few hundred candles instead of every bar.
+
+    Mouse motion is blitted: after each full draw the figure is saved, the
+    crosshair and tooltip are drawn over that copy, and a drag shifts a copy
+    of each axes' pixels instead of re-rendering. The chart is redrawn once,
+    at the new limits, when the button is released.
+
+    Hovering a candle shows a tooltip. The candle under the mouse is found by
+    index arithmetic on the x position rather than by hit-testing artists,
+    and each candle's text is formatted on first hover and then reused.
+
+    Parameters:
+    fig, ax1, ax2: The figure, price axes and volume axes (sharing x).
+    df (pd.DataFrame): The bars drawn.
+    candles (tuple): (bodies, wicks) collections from plot_candlestick.
+    volume_bars: The collection from plot_volume.
+    """
+
+    def __init__(self, fig, ax1, ax2, df, candles, volume_bars):
+        self.fig = fig
+        self.axes = (ax1, ax2)
+        self.bars = bar_arrays(df)
+        self.index = df.index
+        self.bodies, self.wicks = candles
+        self.volume_bars = volume_bars
+        self.detail = None
+        self.background = None
+        self.pan = None
+        self.connections = []
+        self.vertical = [ax.axvline(0, color='white', lw=1, visible=False, animated=True) for ax in self.axes]
+        self.horizontal = [ax.axhline(0, color='white', lw=1, visible=False, animated=True) for ax in self.axes]
+        self.tooltip = ax1.annotate('', xy=(0, 0), xytext=(15, 15), textcoords='offset points', fontsize=9,
+                                    color='white', visible=False, animated=True, zorder=10,
+                                    bbox=dict(boxstyle='round', facecolor='black', edgecolor='white', alpha=0.8))
+        self.tooltip_text = functools.lru_cache(maxsize=4096)(self._format_tooltip)
+        ax1.callbacks.connect('xlim_changed', lambda ax: self.update_detail())
+        self.update_detail()
+
+    @property
+    def canvas(self):
+        return self.fig.canvas
+
+    def connect(self):
+        for event, handler in [('draw_event', self.on_draw), ('resize_event', lambda event: self.update_detail()),
+                               ('scroll_event', self.on_scroll),
+                               ('button_press_event', self.on_press), ('button_release_event', self.on_release),
+                               ('motion_notify_event', self.on_motion)]:
+            self.connections.append(self.canvas.mpl_connect(event, handler))
+
+    def disconnect(self):
+        for connection in self.connections:
+            self.canvas.mpl_disconnect(connection)
+        self.connections = []
+
+    def update_detail(self):
+        """Rebuild candles and volume bars for the visible x range if the range or aggregation changed."""
+        x_min, x_max = self.axes[0].get_xlim()
+        n = len(self.bars['close'])
+        first, last = max(0, int(np.floor(x_min))), min(n, int(np.ceil(x_max)) + 1)
+        visible = max(1, last - first)
+        k = bucket_size(visible, detail_budget(self.axes[0]))
+        if self.detail is not None:
+            drawn_lo, drawn_hi, drawn_k = self.detail
+            if drawn_k == k and drawn_lo <= first and last <= drawn_hi:
+                return
+        # Cover one extra view width on each side so short pans do not need a rebuild
+        lo, hi = max(0, first - visible), min(n, last + visible)
+        x, bars = downsample_ohlc(self.bars, lo, hi, k)
+        polygons, segments, colors = candle_geometry(x, bars, 0.8 * k)
+        self.bodies.set_verts(polygons)
+        self.bodies.set_facecolor(colors)
+        self.bodies.set_edgecolor(colors)
+        self.wicks.set_segments(segments)
+        self.wicks.set_color(colors)
+        polygons, colors = volume_geometry(x, bars, 0.8 * k)
+        self.volume_bars.set_verts(polygons)
+        self.volume_bars.set_facecolor(colors)
+        self.detail = (lo, hi, k)
+        self.drawn = (lo // k * k, x, bars)
+
+    def _format_tooltip(self, start, k):
+        end = min(start + k, len(self.index))
+        time_format = '%Y-%m-%d %H:%M'
+        if k == 1:
+            period = self.index[start].strftime(time_format)
+        else:
+            period = f"{self.index[start].strftime(time_format)} - {self.index[end - 1].strftime(time_format)}"
+        return (f"Time: {period}\n"
+                f"Open: ${self.bars['open'][start]:.2f}\n"
+                f"High: ${self.bars['high'][start:end].max():.2f}\n"
+                f"Low: ${self.bars['low'][start:end].min():.2f}\n"
+                f"Close: ${self.bars['close'][end - 1]:.2f}\n"
+                f"Volume: {self.bars['volume'][start:end].sum():,.0f}")
+
+    def candle_at(self, event, tolerance=4):
+        """Position of the first bar of the drawn candle under the mouse, or None."""
+        if event.inaxes is not self.axes[0] or event.xdata is None:
+            return None
+        start, x, bars = self.drawn
+        k = self.detail[2]
+        j = (int(np.floor(event.xdata + 0.5)) - start) // k
+        if not 0 <= j < len(x) or abs(event.xdata - x[j]) > 0.5 * k:
+            return None
+        # Within the wick, give or take a few pixels
+        transform = self.axes[0].transData
+        low = transform.transform((x[j], bars['low'][j]))[1]
+        high = transform.transform((x[j], bars['high'][j]))[1]
+        if not low - tolerance <= event.y <= high + tolerance:
+            return None
+        return start + j * k
+
+    def update_tooltip(self, event):
+        position = self.candle_at(event)
+        self.tooltip.set_visible(position is not None)
+        if position is None:
+            return
+        k = self.detail[2]
+        self.tooltip.set_text(self.tooltip_text(position, k))
+        self.tooltip.xy = (event.xdata, event.ydata)
+        # Open towards the middle of the chart so the box stays inside the axes
+        x_min, x_max = self.axes[0].get_xlim()
+        right_half = event.xdata > (x_min + x_max) / 2
+        self.tooltip.set_position((-15 if right_half else 15, 15))
+        self.tooltip.set_horizontalalignment('right' if right_half else 'left')
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_crosshair()
+
+    def draw_crosshair(self):
+        for artist in self.vertical + self.horizontal + [self.tooltip]:
+            if artist.get_visible():
+                artist.axes.draw_artist(artist)
+        self.canvas.blit(self.fig.bbox)
+
+    def _toolbar_active(self):
+        toolbar = getattr(self.canvas, 'toolbar', None)
+        return toolbar is not None and bool(toolbar.mode)
+
+    def on_scroll(self, event):
+        if event.inaxes not in self.axes:
+            return
+        base_scale = 1.1
+        # zoom in
+        if event.button == 'up':
+            scale_factor = 1 / base_scale
+        # zoom out
+        else:
+            scale_factor = base_scale
+
+        for ax in self.axes:
+            x_min, x_max = ax.get_xlim()
+            y_min, y_max = ax.get_ylim()
+
+            x_center = x_min + (x_max - x_min) / 2
+            y_center = y_min + (y_max - y_min) / 2
+
+            ax.set_xlim([x_center - (x_center - x_min) * scale_factor,
+                         x_center + (x_max - x_center) * scale_factor])
+            ax.set_ylim([y_center - (y_center - y_min) * scale_factor,
+                         y_center + (y_max - y_center) * scale_factor])
+
+        self.canvas.draw_idle()
+
+    def on_press(self, event):
+        if event.button != 1 or event.inaxes not in self.axes or self._toolbar_active():  # Left mouse button
+            return
+        self.pan = {'x': event.x, 'y': event.y,
+                    'limits': [(ax.get_xlim(), ax.get_ylim()) for ax in self.axes],
+                    'background': self.background,
+                    'images': [self.canvas.copy_from_bbox(ax.bbox) for ax in self.axes]}
+
+    def on_release(self, event):
+        if self.pan is None:
+            return
+        dx, dy = event.x - self.pan['x'], event.y - self.pan['y']
+        for ax, (x_limits, y_limits) in zip(self.axes, self.pan['limits']):
+            # Move the limits by the dragged distance in data units, so the chart follows the mouse
+            x_scale = (x_limits[1] - x_limits[0]) / ax.bbox.width
+            y_scale = (y_limits[1] - y_limits[0]) / ax.bbox.height
+            ax.set_xlim(x_limits[0] - dx * x_scale, x_limits[1] - dx * x_scale)
+            ax.set_ylim(y_limits[0] - dy * y_scale, y_limits[1] - dy * y_scale)
+        self.pan = None
+        self.canvas.draw_idle()
+
+    def on_motion(self, event):
+        if self.pan is not None and event.button == 1:
+            self.draw_pan(int(round(event.x - self.pan['x'])), int(round(event.y - self.pan['y'])))
+            return
+        if self.background is None:
+            return
+        inside = event.inaxes in self.axes
+        for line in self.vertical:
+            line.set_visible(inside)
+            if inside:
+                line.set_xdata([event.xdata, event.xdata])
+        for ax, line in zip(self.axes, self.horizontal):
+            line.set_visible(inside and event.inaxes is ax)
+            if inside and event.inaxes is ax:
+                line.set_ydata([event.ydata, event.ydata])
+        self.update_tooltip(event)
+        self.canvas.restore_region(self.background)
+        self.draw_crosshair()
+
+    def draw_pan(self, dx, dy):
+        """Show the chart shifted by (dx, dy) pixels by moving saved pixels, without rendering the artists."""
+        if self.pan['background'] is None:
+            return
+        self.canvas.restore_region(self.pan['background'])
+        for ax, image in zip(self.axes, self.pan['images']):
+            ax.draw_artist(ax.patch)
+            # Saved regions count rows from the top. Copy the part that stays inside the axes;
+            # xy is where the region's corner lands, and the part keeps its offset from it
+            x1, y1, x2, y2 = image.get_extents()
+            sx1, sx2 = (x1, x2 - dx) if dx >= 0 else (x1 - dx, x2)
+            sy1, sy2 = (y1 + dy, y2) if dy >= 0 else (y1, y2 + dy)
+            if sx2 > sx1 and sy2 > sy1:
+                self.canvas.restore_region(image, bbox=(sx1, sy1, sx2, sy2), xy=(x1 + dx, y1 - dy))
+        self.canvas.blit(self.fig.bbox)
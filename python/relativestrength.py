@@ -1,6 +1,8 @@
+import warnings
+
 import pandas as pd
 import numpy as np
-from typing import Optional
+from typing import Optional, Sequence
 
 
 def calculate_relative_strength(stock_data: pd.DataFrame, spy_data: pd.DataFrame, lookback_periods: int = 12) -> \
@@ -59,3 +61,76 @@ def calculate_atr(data: pd.DataFrame, lookback_periods: int = 14) -> float:
     atr = tr.rolling(window=lookback_periods).mean().iloc[-1]
 
     return float(atr)
+
+
+def _relative_strength_features(high, low, close, volume, lookback_periods):
+    """
+    Per-column inputs of calculate_relative_strength for T x S arrays.
+
+    Only the last lookback_periods bars (plus one previous close) matter, so
+    everything is computed on that tail. Returns (atr, mean return, mean
+    volume-weighted return), each of length S.
+    """
+    if close.shape[0] < lookback_periods:
+        nan = np.full(close.shape[1], np.nan)
+        return nan, nan, nan
+
+    tail = slice(close.shape[0] - lookback_periods, None)
+    previous_close = np.empty_like(close[tail])
+    previous_close[0] = close[-lookback_periods - 1] if close.shape[0] > lookback_periods else np.nan
+    previous_close[1:] = close[tail][:-1]
+
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        true_range = np.fmax(high[tail] - low[tail],
+                             np.fmax(np.abs(high[tail] - previous_close), np.abs(low[tail] - previous_close)))
+        atr = true_range.mean(axis=0)
+
+        # Returns next to a missing close are filled with 0, like pct_change().fillna(0)
+        returns = np.nan_to_num(close[tail] / previous_close - 1, nan=0.0, posinf=np.inf, neginf=-np.inf)
+        mean_return = returns.mean(axis=0)
+        mean_weighted_return = np.nanmean(returns * volume[tail], axis=0)
+    return atr, mean_return, mean_weighted_return
+
+
+def scan_relative_strength(symbols: Sequence[str], high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                           volume: np.ndarray, spy_data: pd.DataFrame, lookback_periods: int = 12) -> pd.DataFrame:
+    """
+    Rank a universe of symbols by relative strength against SPY in one vectorized pass.
+
+    Parameters:
+    symbols (Sequence[str]): Column labels of the price arrays.
+    high, low, close, volume (np.ndarray): T x S arrays with one column per symbol, rows aligned with spy_data.
+    spy_data (pd.DataFrame): SPY bars with 'high', 'low', 'close' and 'volume' columns on the same T rows.
+    lookback_periods (int): Bars used for the ATR and the mean returns.
+
+    Returns:
+    pd.DataFrame: One row per symbol, indexed by symbol and sorted by 'relative_strength' (strongest first),
+    with 'rank', 'relative_strength', 'rs_raw', 'rs_volume_weighted' and 'atr'. Symbols whose score
+    calculate_relative_strength would reject (zero or missing ATR) get NaN and rank last.
+    """
+    arrays = [np.asarray(values, dtype=np.float64) for values in (high, low, close, volume)]
+    if any(values.shape != arrays[2].shape for values in arrays) or arrays[2].ndim != 2:
+        raise ValueError("high, low, close and volume must be 2-D arrays of the same shape")
+    if arrays[2].shape != (len(spy_data), len(symbols)):
+        raise ValueError("price arrays must have one row per spy_data bar and one column per symbol")
+
+    # SPY's features are computed once and broadcast against every symbol
+    spy = [spy_data[column].to_numpy(dtype=np.float64).reshape(-1, 1) for column in ('high', 'low', 'close', 'volume')]
+    spy_atr, spy_return, spy_weighted_return = _relative_strength_features(*spy, lookback_periods)
+    atr, mean_return, mean_weighted_return = _relative_strength_features(*arrays, lookback_periods)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        usable = (atr != 0) & (spy_atr != 0)
+        rs_raw = np.where(usable, mean_return / atr - spy_return / spy_atr, np.nan)
+        rs_volume_weighted = np.where(usable, mean_weighted_return / atr - spy_weighted_return / spy_atr, np.nan)
+
+    table = pd.DataFrame({
+        'relative_strength': (rs_raw + rs_volume_weighted) / 2,
+        'rs_raw': rs_raw,
+        'rs_volume_weighted': rs_volume_weighted,
+        'atr': atr,
+    }, index=pd.Index(symbols, name='symbol'))
+    table = table.sort_values('relative_strength', ascending=False, na_position='last', kind='stable')
+    table.insert(0, 'rank', np.arange(1, len(table) + 1))
+    return table
@@ -0,0 +1,252 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+matplotlib.use('Agg')  # Headless: no Tk, safe in worker processes
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+
+# Same layout as gui.py: the extension in Release, the package from the repository root
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Release')))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from python import instrumentation  # noqa: E402
+from python.bar_store import BarStore, DEFAULT_STORE_DIR  # noqa: E402
+from python.market_data import MarketDataClient, ALPHA_VANTAGE, YAHOO  # noqa: E402
+from python.model_cache import ModelCache, DEFAULT_CACHE_DIR  # noqa: E402
+from python.plotter import plot_stock_data, plot_hmm_analysis  # noqa: E402
+from python.relativestrength import calculate_relative_strength  # noqa: E402
+
+DEFAULT_REPORT_DIR = os.path.join(os.path.expanduser('~'), '.quantispy', 'reports')
+BENCHMARK = 'SPY'
+
+
+def _finite(value):
+    return None if value is None or not np.isfinite(value) else float(value)
+
+
+def _save(fig, output_dir, name, formats, dpi):
+    paths = []
+    for extension in formats:
+        path = os.path.join(output_dir, f"{name}.{extension}")
+        with instrumentation.stage('draw', chart=name, format=extension):
+            fig.savefig(path, format=extension, dpi=dpi, facecolor=fig.get_facecolor())
+        paths.append(path)
+    return paths
+
+
+def _render(symbol, store_root, output_dir, formats, days, num_states, model_dir, dpi):
+    stage = instrumentation.stage
+    start = time.perf_counter()
+    with stage('load', symbol=symbol):
+        store = BarStore(store_root)
+        data = store.load(symbol, days=days)
+        if data.empty:
+            raise ValueError(f"No stored bars for {symbol} in {store_root}")
+        spy_data = store.load(BENCHMARK, days=days)
+
+    with stage('relative_strength', bars=len(data)):
+        relative_strength = calculate_relative_strength(data, spy_data) if not spy_data.empty else None
+    relative_strength = _finite(relative_strength)
+    relative_strength_text = "N/A" if relative_strength is None else f"{relative_strength:.4f}"
+
+    fig = plt.figure(figsize=(10, 6))
+    with stage('plot', symbol=symbol, bars=len(data)):
+        plot_stock_data(fig, data, symbol, relative_strength=f"Relative Strength: {relative_strength_text}",
+                        interactive=False)
+    files = _save(fig, output_dir, f"{symbol}_chart", formats, dpi)
+    plt.close(fig)
+
+    returns = data['close'].pct_change().dropna().to_numpy(dtype=np.float64)
+    hmm = ModelCache(model_dir).fit(symbol, returns, num_states, (data.index[0], data.index[-1]))
+    predicted_return = hmm.predict_next_return()
+    with stage('trading_signals', bars=len(returns)):
+        trading_signals = hmm.get_trading_signals(returns)
+
+    fig = plt.figure(figsize=(14, 10))
+    with stage('plot_hmm', symbol=symbol, bars=len(returns)):
+        plot_hmm_analysis(fig, data.index[-len(returns):], data['close'].iloc[-len(returns):], returns,
+                          predicted_return, trading_signals, symbol)
+    files += _save(fig, output_dir, f"{symbol}_hmm", formats, dpi)
+    plt.close(fig)
+
+    return {'symbol': symbol, 'bars': len(data), 'last_bar': str(data.index[-1]),
+            'relative_strength': relative_strength, 'predicted_return': _finite(predicted_return),
+            'signal': trading_signals[-1] if trading_signals else None, 'num_states': hmm.get_num_states(),
+            'charts': 2, 'files': files, 'seconds': time.perf_counter() - start}
+
+
+def render_symbol(symbol, store_root, output_dir, formats=('png',), days=None, num_states=3,
+                  model_dir=DEFAULT_CACHE_DIR, dpi=100, trace=False, trace_memory=False):
+    """
+    Render the stock chart and the HMM chart of one symbol from stored bars.
+
+    The charts are the ones the GUI shows, drawn by the same plotter functions
+    on the Agg backend. Runs in a worker process, so it takes and returns only
+    plain values. With trace=True and no recorder active in this process (a
+    pool worker), the symbol's instrumentation events are returned under
+    'trace' for the parent to merge.
+
+    Returns:
+    dict: The symbol's summary: relative strength, predicted return, current signal and the files written.
+    """
+    if not trace or instrumentation.recorder() is not None:
+        with instrumentation.stage('render_symbol', symbol=symbol):
+            return _render(symbol, store_root, output_dir, formats, days, num_states, model_dir, dpi)
+
+    instrumentation.enable(trace_memory)
+    try:
+        with instrumentation.stage('render_symbol', symbol=symbol):
+            row = _render(symbol, store_root, output_dir, formats, days, num_states, model_dir, dpi)
+    finally:
+        recorder = instrumentation.disable()
+    row['trace'] = recorder.events
+    return row
+
+
+async def _fetch(symbols, provider, store, api_key):
+    async with MarketDataClient() as client:
+        frames = await client.fetch_many(provider, {symbol: store.last_timestamp(symbol) for symbol in symbols},
+                                         api_key)
+    for symbol, frame in frames.items():
+        if isinstance(frame, Exception):
+            print(f"Fetching {symbol} failed, using stored bars: {frame}")
+        else:
+            print(f"Stored {store.append(symbol, frame)} new bars for {symbol}")
+
+
+def update_bars(symbols, provider, store_root, api_key=None):
+    """Download the bars after the last stored ones for the symbols and SPY, concurrently and rate limited."""
+    asyncio.run(_fetch(sorted(set(symbols) | {BENCHMARK}), provider, BarStore(store_root), api_key))
+
+
+def build_report(symbols, output_dir=DEFAULT_REPORT_DIR, store_root=None, provider=YAHOO, workers=None,
+                 formats=('png',), days=None, num_states=3, model_dir=DEFAULT_CACHE_DIR, dpi=100):
+    """
+    Render charts for a watchlist across a process pool and write summary.json next to them.
+
+    Matplotlib rendering holds the GIL, so symbols are spread over processes
+    rather than threads. Bars are read from the BarStore in each worker
+    (memory-mapped), so only symbol names and summaries cross process
+    boundaries. A symbol that fails is reported in the summary with its error
+    and does not stop the others.
+
+    Parameters:
+    symbols (list): Symbols to render.
+    store_root (str): BarStore directory; the GUI's store for `provider` by default.
+    workers (int): Worker processes, os.cpu_count() by default. 1 renders in this process.
+    formats (tuple): File formats to write, e.g. ('png', 'svg').
+    days (int): Only the most recent stored days; all of them by default.
+
+    While instrumentation is recording, the workers' stages are merged into
+    this process's recorder.
+
+    Returns:
+    dict: The summary, including charts per second over the whole run.
+    """
+    store_root = store_root or os.path.join(DEFAULT_STORE_DIR, provider)
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    recorder = instrumentation.recorder()
+    options = dict(store_root=store_root, output_dir=output_dir, formats=tuple(formats), days=days,
+                   num_states=num_states, model_dir=model_dir, dpi=dpi, trace=recorder is not None,
+                   trace_memory=recorder is not None and recorder.memory)
+
+    start = time.perf_counter()
+    results, errors = [], []
+    if workers == 1:
+        for symbol in symbols:
+            try:
+                results.append(render_symbol(symbol, **options))
+            except Exception as e:
+                errors.append({'symbol': symbol, 'error': str(e)})
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(render_symbol, symbol, **options): symbol for symbol in symbols}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors.append({'symbol': futures[future], 'error': str(e)})
+    elapsed = time.perf_counter() - start
+    for row in results:
+        events = row.pop('trace', None)
+        if events and recorder is not None:
+            recorder.extend(events)
+
+    order = {symbol: i for i, symbol in enumerate(symbols)}
+    results.sort(key=lambda row: order[row['symbol']])
+    charts = sum(row['charts'] for row in results)
+    summary = {'generated': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'provider': provider, 'workers': workers,
+               'symbols': results, 'errors': errors, 'charts': charts, 'seconds': elapsed,
+               'charts_per_second': charts / elapsed if elapsed > 0 else None}
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render the QuantiSPY stock and HMM charts for a watchlist without the GUI.")
+    parser.add_argument('symbols', nargs='*', help='symbols to render')
+    parser.add_argument('--watchlist', help='file with one symbol per line')
+    parser.add_argument('--provider', choices=[YAHOO, ALPHA_VANTAGE], default=YAHOO)
+    parser.add_argument('--api-key', default=os.environ.get('ALPHA_VANTAGE_API_KEY'),
+                        help='Alpha Vantage API key (default: $ALPHA_VANTAGE_API_KEY)')
+    parser.add_argument('--no-fetch', action='store_true', help='render the stored bars without downloading')
+    parser.add_argument('--store', help='BarStore directory (default: the GUI store for the provider)')
+    parser.add_argument('--days', type=int,
+                        help='most recent stored days to chart (default: 1 for Yahoo, as in the GUI, else all)')
+    parser.add_argument('--states', type=int, default=3, help='HMM states')
+    parser.add_argument('--formats', nargs='+', choices=['png', 'svg'], default=['png'])
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--output', default=DEFAULT_REPORT_DIR, help='directory for the charts and summary.json')
+    parser.add_argument('--trace', help='write per-stage timings to this file (.json: Chrome trace, .jsonl: log)')
+    parser.add_argument('--trace-memory', action='store_true', help='also record peak memory per stage')
+    args = parser.parse_args()
+
+    symbols = [symbol.upper() for symbol in args.symbols]
+    if args.watchlist:
+        with open(args.watchlist) as f:
+            symbols += [line.strip().upper() for line in f if line.strip() and not line.startswith('#')]
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        parser.error("no symbols given")
+
+    store_root = args.store or os.path.join(DEFAULT_STORE_DIR, args.provider)
+    if not args.no_fetch:
+        if args.provider == ALPHA_VANTAGE and not args.api_key:
+            parser.error("Alpha Vantage needs --api-key or $ALPHA_VANTAGE_API_KEY")
+        update_bars(symbols, args.provider, store_root, args.api_key)
+
+    if args.trace:
+        instrumentation.enable(args.trace_memory)
+    days = args.days if args.days is not None else (1 if args.provider == YAHOO else None)
+    summary = build_report(symbols, args.output, store_root, args.provider, args.workers, args.formats, days,
+                           args.states, dpi=args.dpi)
+    for row in summary['symbols']:
+        predicted = 'N/A' if row['predicted_return'] is None else f"{row['predicted_return']:+.4%}"
+        relative_strength = 'N/A' if row['relative_strength'] is None else f"{row['relative_strength']:.4f}"
+        print(f"{row['symbol']:<8} RS {relative_strength:>8}  predicted {predicted:>9}  {row['signal']}")
+    for row in summary['errors']:
+        print(f"{row['symbol']:<8} failed: {row['error']}")
+    print(f"{summary['charts']} charts in {summary['seconds']:.1f} s "
+          f"({summary['charts_per_second'] or 0:.2f} charts/s, {summary['workers']} workers) -> {args.output}")
+
+    if args.trace:
+        recorder = instrumentation.disable()
+        recorder.export(args.trace)
+        for name, row in sorted(recorder.summary().items(), key=lambda item: -item[1]['total_seconds']):
+            peak = '' if row['peak_bytes'] is None else f"  peak {row['peak_bytes'] / 2 ** 20:8.1f} MiB"
+            print(f"{name:<20} {row['calls']:>6} calls {row['total_seconds']:9.3f} s{peak}")
+        print(f"Trace written to {args.trace}")
+
+
+if __name__ == '__main__':
+    main()
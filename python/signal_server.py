@@ -0,0 +1,494 @@
+import asyncio
+import json
+import math
+import os
+import struct
+import sys
+import time
+from collections import OrderedDict, defaultdict, deque
+
+import numpy as np
+import pandas as pd
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+# Same layout as gui.py: the extension in Release, the package from the repository root
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Release')))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stock_hmm  # type: ignore  # noqa: E402
+
+from python.ingest import read_bars  # noqa: E402
+from python.market_data import MarketDataClient  # noqa: E402
+from python.streaming import (DirectionalChangeIndicator, IndicatorPipeline, RelativeStrengthIndicator,  # noqa: E402
+                              TrendlineIndicator)
+
+DEFAULT_PORT = 8765
+BENCHMARK = 'SPY'
+SIGNALS = ('HOLD', 'BUY', 'SELL')  # Binary signal codes; 255 means no HMM
+
+# Binary frame: version, symbol length, the symbol (ASCII), then the body. Little-endian throughout.
+BINARY_VERSION = 1
+_HEADER = struct.Struct('<BB')
+# seq, time_ns, published_ns, open, high, low, close, volume, flags (bit 0 bullish, bit 1 bearish),
+# support, resistance, rs, state (-1 without an HMM), signal code, predicted_return
+_BODY = struct.Struct('<Iqq5dB3dbBd')
+
+
+def _finite(value):
+    return None if value is None or math.isnan(value) else value
+
+
+class SignalUpdate:
+    """
+    One bar's update for a symbol. It is encoded at most once per encoding,
+    however many subscribers receive it.
+
+    Fields: symbol, seq (the symbol's bar number, so a client can tell how
+    many bars were coalesced away), time_ns (bar time) and published_ns
+    (wall clock when it was published, both ns since the epoch), open, high,
+    low, close, volume, bullish, bearish, support, resistance, rs, state,
+    signal and predicted_return. Values that are not available yet are None.
+    """
+
+    __slots__ = ('fields', 'json', 'binary')
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.json = None
+        self.binary = None
+
+    @property
+    def symbol(self):
+        return self.fields['symbol']
+
+    def encode(self, encoding):
+        if encoding == 'binary':
+            if self.binary is None:
+                self.binary = encode_binary(self.fields)
+            return self.binary
+        if self.json is None:
+            self.json = json.dumps(self.fields, separators=(',', ':'))
+        return self.json
+
+
+def encode_binary(fields):
+    symbol = fields['symbol'].encode('ascii')
+
+    def number(key):
+        value = fields[key]
+        return math.nan if value is None else value
+
+    signal = SIGNALS.index(fields['signal']) if fields['signal'] in SIGNALS else 255
+    state = -1 if fields['state'] is None else fields['state']
+    flags = int(bool(fields['bullish'])) | int(bool(fields['bearish'])) << 1
+    return _HEADER.pack(BINARY_VERSION, len(symbol)) + symbol + _BODY.pack(
+        fields['seq'], fields['time_ns'], fields['published_ns'], *(number(key) for key in
+                                                                    ('open', 'high', 'low', 'close', 'volume')),
+        flags, number('support'), number('resistance'), number('rs'), state, signal, number('predicted_return'))
+
+
+def decode_binary(data):
+    """The fields of a binary frame, as the JSON encoding would give them."""
+    version, length = _HEADER.unpack_from(data)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary frame version {version}")
+    symbol = bytes(data[_HEADER.size:_HEADER.size + length]).decode('ascii')
+    (seq, time_ns, published_ns, open_, high, low, close, volume, flags, support, resistance, rs, state, signal,
+     predicted_return) = _BODY.unpack_from(data, _HEADER.size + length)
+    return {'symbol': symbol, 'seq': seq, 'time_ns': time_ns, 'published_ns': published_ns, 'open': open_,
+            'high': high, 'low': low, 'close': close, 'volume': volume, 'bullish': flags & 1,
+            'bearish': flags >> 1 & 1, 'support': _finite(support), 'resistance': _finite(resistance),
+            'rs': _finite(rs), 'state': None if state < 0 else state,
+            'signal': SIGNALS[signal] if signal < len(SIGNALS) else None,
+            'predicted_return': _finite(predicted_return)}
+
+
+def fit_model(returns, num_states, warm_start=None, max_iterations=100, warm_iterations=10):
+    """
+    A new StockHMM fitted on `returns`: warm-started from a previous model for
+    at most `warm_iterations` EM steps, as ModelCache does, or from seeded
+    random parameters. Runs on an executor thread; the fit releases the GIL.
+    """
+    model = stock_hmm.StockHMM(num_states, seed=0)
+    if warm_start is None:
+        model.baum_welch(returns, max_iterations)
+    else:
+        model.baum_welch(returns, min(warm_iterations, max_iterations), warm_start=warm_start)
+    return model
+
+
+class SymbolFeed:
+    """
+    Turns one symbol's bars into updates: streaming directional change,
+    trendlines and relative-strength terms, and the HMM's online filter.
+
+    The indicator parameters are the ones plot_stock_data uses. warm_up()
+    replays a history through the indicators and fits the HMM on its
+    returns, so the first live bar already has levels and a state.
+
+    The filter only adapts the state posterior, so the model is refitted on
+    the last `history` returns after `refit_bars` live bars (0: no schedule)
+    or once its drift() exceeds `drift_threshold`. refit_due() says when;
+    the server fits on an executor thread and hands the result to swap().
+    """
+
+    def __init__(self, symbol, num_states=3, refit_bars=5000, drift_threshold=0.5, history=2000):
+        self.symbol = symbol
+        self.num_states = num_states
+        self.refit_bars = refit_bars
+        self.drift_threshold = drift_threshold
+        self.pipeline = IndicatorPipeline([
+            DirectionalChangeIndicator(sigma=0.005, min_change=0.002, window=3, min_duration=2),
+            TrendlineIndicator(lookback=12, smoothing_window=3, smoothing_poly=2),
+            RelativeStrengthIndicator(12),
+        ])
+        self.hmm = None
+        self.returns = deque(maxlen=history)  # What the next refit trains on
+        self.history_bars = 0  # Bars the current model's filter replayed before going live
+        self.refitting = False
+        self.refits = 0
+        self.previous_close = math.nan
+        self.seq = 0
+        self.last = None  # Indicator outputs of the last bar
+        self.last_time = None
+
+    def warm_up(self, history):
+        """Replay a DataFrame of bars (no updates are published) and fit the HMM on its returns."""
+        outputs = self.pipeline.run(history)
+        if len(outputs):
+            self.last = outputs.iloc[-1].to_dict()
+            self.last_time = history.index[-1]
+            self.previous_close = float(history['close'].iloc[-1])
+            self.seq = len(history)
+        self.returns.extend(history['close'].pct_change().dropna().to_numpy(dtype=np.float64))
+        if len(self.returns) > self.num_states * 10:
+            self.swap(fit_model(np.array(self.returns), self.num_states))
+
+    def refit_due(self):
+        if self.refitting or len(self.returns) <= self.num_states * 10:
+            return False
+        if self.hmm is None:
+            return True
+        # The filter's bar count includes the history it replayed; the schedule counts live bars
+        max_bars = self.history_bars + self.refit_bars if self.refit_bars > 0 else 0
+        return self.hmm.needs_refit(max_bars, self.drift_threshold)
+
+    def refit_job(self):
+        """The arguments of fit_model() for a refit: a snapshot of the returns and a copy of the model to start from."""
+        warm_start = None if self.hmm is None else stock_hmm.StockHMM.from_bytes(self.hmm.to_bytes())
+        return np.array(self.returns), self.num_states, warm_start
+
+    def swap(self, model):
+        """Switch to a newly fitted model, filtered over the recent returns including any that arrived during the fit."""
+        returns = np.array(self.returns)
+        model.filter(returns)
+        self.hmm = model
+        self.history_bars = len(returns)
+        self.refits += 1
+
+    def update(self, time, bar, benchmark=None):
+        """
+        Advance by one bar and return its fields. `benchmark` is the SPY feed,
+        already advanced to the same bar, for relative strength.
+        """
+        outputs = self.pipeline.update(bar)
+        self.last = outputs
+        self.last_time = time
+        state = signal = predicted_return = None
+        if not math.isnan(self.previous_close):
+            change = bar['close'] / self.previous_close - 1
+            self.returns.append(change)
+            if self.hmm is not None:
+                posterior, predicted_return, signal = self.hmm.update(change)
+                state = int(np.argmax(posterior))
+        self.previous_close = bar['close']
+
+        rs = None
+        if benchmark is not None and benchmark.last is not None:
+            rs = _finite(RelativeStrengthIndicator.relative_strength(outputs, benchmark.last))
+        fields = {'symbol': self.symbol, 'seq': self.seq, 'time_ns': pd.Timestamp(time).value, 'published_ns': 0,
+                  'open': bar['open'], 'high': bar['high'], 'low': bar['low'], 'close': bar['close'],
+                  'volume': bar['volume'], 'bullish': outputs['bullish'], 'bearish': outputs['bearish'],
+                  'support': _finite(outputs['support']), 'resistance': _finite(outputs['resistance']), 'rs': rs,
+                  'state': state, 'signal': signal, 'predicted_return': predicted_return}
+        self.seq += 1
+        return fields
+
+
+class Subscriber:
+    """
+    One client connection and its send queue.
+
+    The queue holds at most one update per subscribed symbol: an update for a
+    symbol that is still waiting replaces it (and counts as coalesced), so a
+    client that falls behind gets the latest state of each symbol instead of
+    a growing backlog. A send that the client does not drain within
+    `send_timeout` seconds disconnects it.
+    """
+
+    def __init__(self, websocket, send_timeout):
+        self.websocket = websocket
+        self.send_timeout = send_timeout
+        self.encoding = 'json'
+        self.symbols = set()
+        self.pending = OrderedDict()
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.coalesced = 0
+
+    def offer(self, update):
+        if update.symbol in self.pending:
+            self.coalesced += 1
+        self.pending[update.symbol] = update  # Keeps the symbol's place in the queue
+        self.ready.set()
+
+    async def run(self):
+        try:
+            while True:
+                await self.ready.wait()
+                while self.pending:
+                    _, update = self.pending.popitem(last=False)
+                    await asyncio.wait_for(self.websocket.send(update.encode(self.encoding)), self.send_timeout)
+                    self.sent += 1
+                self.ready.clear()
+        except asyncio.TimeoutError:
+            await self.websocket.close(1008, "client too slow")
+        except ConnectionClosed:
+            pass
+
+
+class SignalServer:
+    """
+    Fans per-bar signal updates out to WebSocket subscribers.
+
+    Clients send JSON text messages:
+
+        {"action": "subscribe", "symbols": ["AAPL", "SPY"], "encoding": "binary"}
+        {"action": "unsubscribe", "symbols": ["AAPL"]}
+
+    and get {"subscribed": [...]} (or {"error": ...}) back as text. Updates are
+    JSON text frames (SignalUpdate) or, with "encoding": "binary", binary
+    frames (encode_binary/decode_binary).
+
+    Bars come in through publish(), from replay() or poll_market_data(). A
+    bar for a symbol without a feed starts one.
+
+    Parameters:
+    benchmark (str): Symbol relative strength is measured against. Its bar
+        should be published before the other symbols' bars of the same time.
+    max_symbols (int): Subscriptions per client, which bounds its send queue.
+    send_timeout (float): Seconds a client may take to accept one frame.
+    refit_bars (int): Refit a symbol's HMM after this many live bars; 0 refits only on drift.
+    drift_threshold (float): Refit once the model's drift() (nats per bar) exceeds this.
+    history (int): Recent returns each symbol keeps to refit on.
+    """
+
+    def __init__(self, benchmark=BENCHMARK, max_symbols=100, send_timeout=10.0, num_states=3, refit_bars=5000,
+                 drift_threshold=0.5, history=2000):
+        self.benchmark = benchmark
+        self.max_symbols = max_symbols
+        self.send_timeout = send_timeout
+        self.num_states = num_states
+        self.refit_bars = refit_bars
+        self.drift_threshold = drift_threshold
+        self.history = history
+        self.feeds = {}
+        self.subscribers = defaultdict(set)
+        self.clients = set()
+        self.published = 0
+
+    def feed(self, symbol):
+        if symbol not in self.feeds:
+            self.feeds[symbol] = SymbolFeed(symbol, self.num_states, self.refit_bars, self.drift_threshold,
+                                            self.history)
+        return self.feeds[symbol]
+
+    def publish(self, symbol, time, bar):
+        """Advance the symbol's feed by one bar and queue the update for its subscribers."""
+        feed = self.feed(symbol)
+        fields = feed.update(time, bar, self.feeds.get(self.benchmark))
+        fields['published_ns'] = time_ns = _wall_clock_ns()
+        update = SignalUpdate(fields)
+        for subscriber in self.subscribers.get(symbol, ()):
+            subscriber.offer(update)
+        self.published += 1
+        if feed.refit_due():
+            self._refit(feed)
+        return time_ns
+
+    def _refit(self, feed):
+        # The fit runs on an executor thread against a copy of the model; the event loop keeps
+        # filtering the current one until swap() replaces it
+        feed.refitting = True
+
+        def done(future):
+            feed.refitting = False
+            try:
+                feed.swap(future.result())
+            except Exception as e:
+                print(f"Refitting the {feed.symbol} HMM failed: {e}")
+
+        asyncio.get_running_loop().run_in_executor(None, fit_model, *feed.refit_job()).add_done_callback(done)
+
+    def stats(self):
+        return {'clients': len(self.clients), 'symbols': len(self.feeds), 'published': self.published,
+                'sent': sum(client.sent for client in self.clients),
+                'coalesced': sum(client.coalesced for client in self.clients),
+                'refits': sum(feed.refits for feed in self.feeds.values())}
+
+    def _handle(self, subscriber, message):
+        try:
+            request = json.loads(message)
+            action = request['action']
+            symbols = [str(symbol).upper() for symbol in request.get('symbols', [])]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {'error': 'expected {"action": "subscribe" | "unsubscribe", "symbols": [...]}'}
+
+        if action == 'subscribe':
+            encoding = request.get('encoding', subscriber.encoding)
+            if encoding not in ('json', 'binary'):
+                return {'error': f"unknown encoding {encoding!r}"}
+            if len(subscriber.symbols | set(symbols)) > self.max_symbols:
+                return {'error': f"at most {self.max_symbols} symbols per connection"}
+            subscriber.encoding = encoding
+            for symbol in symbols:
+                subscriber.symbols.add(symbol)
+                self.subscribers[symbol].add(subscriber)
+        elif action == 'unsubscribe':
+            for symbol in symbols:
+                subscriber.symbols.discard(symbol)
+                self.subscribers[symbol].discard(subscriber)
+                subscriber.pending.pop(symbol, None)
+        else:
+            return {'error': f"unknown action {action!r}"}
+        return {'subscribed': sorted(subscriber.symbols), 'encoding': subscriber.encoding}
+
+    async def handler(self, websocket):
+        subscriber = Subscriber(websocket, self.send_timeout)
+        self.clients.add(subscriber)
+        writer = asyncio.create_task(subscriber.run())
+        try:
+            async for message in websocket:
+                await websocket.send(json.dumps(self._handle(subscriber, message)))
+        except ConnectionClosed:
+            pass
+        finally:
+            writer.cancel()
+            self.clients.discard(subscriber)
+            for symbol in subscriber.symbols:
+                self.subscribers[symbol].discard(subscriber)
+
+    def serve(self, host='localhost', port=DEFAULT_PORT):
+        """The websockets server, to be used as `async with server.serve(...)`."""
+        return serve(self.handler, host, port, compression=None)
+
+
+def _wall_clock_ns():
+    # Clients measure latency against this, possibly from another process
+    return time.time_ns()
+
+
+def stitched(frame, copies):
+    """
+    `copies` copies of a frame of bars end to end, scaled so each copy opens
+    where the previous one closed and shifted to continue its timestamps.
+    Turns a short bundled CSV into a long replay without price jumps.
+    """
+    if copies <= 1:
+        return frame
+    step = frame.index[-1] - frame.index[0] + (frame.index[1] - frame.index[0])
+    growth = frame['close'].iloc[-1] / frame['open'].iloc[0]
+    prices = ['open', 'high', 'low', 'close']
+    parts = []
+    for i in range(copies):
+        part = frame.copy()
+        part[prices] = part[prices] * growth ** i
+        part.index = frame.index + step * i
+        parts.append(part)
+    return pd.concat(parts)
+
+
+def replay_frames(paths, symbols, copies=1, benchmark=BENCHMARK):
+    """
+    Aligned frames of bars for `symbols` from the bundled CSVs, for replay().
+
+    Symbol k reads paths[k % len(paths)], stitched `copies` times, starting k
+    bars later than the first symbol on that file so no two symbols move in
+    lockstep. Every frame takes the first file's timestamps. The benchmark,
+    if listed, reads the first file from its start.
+    """
+    sources = [read_bars(path)[['open', 'high', 'low', 'close', 'volume']].astype(np.float64) for path in paths]
+    length = len(sources[0]) * copies
+    index = stitched(sources[0], copies).index
+    frames = {}
+    for k, symbol in enumerate(sorted(symbols, key=lambda symbol: symbol != benchmark)):
+        source = sources[k % len(sources)]
+        offset = k // len(sources) % len(source)
+        frame = stitched(source, -(-(length + offset) // len(source))).iloc[offset:offset + length]
+        frame = frame.iloc[:len(index)].set_axis(index[:len(frame)])
+        frames[symbol] = frame
+    shortest = min(len(frame) for frame in frames.values())
+    return {symbol: frame.iloc[:shortest] for symbol, frame in frames.items()}
+
+
+async def replay(server, frames, rate=None, warmup=0):
+    """
+    Publish aligned frames of bars ({symbol: DataFrame}) bar by bar, the
+    benchmark first at each time. The first `warmup` bars warm the feeds up
+    instead. rate: bars per second per symbol, or None for as fast as the
+    subscribers' queues allow (the loop still yields after every bar time).
+
+    Returns:
+    int: Updates published.
+    """
+    symbols = sorted(frames, key=lambda symbol: symbol != server.benchmark)
+    for symbol in symbols:
+        server.feed(symbol).warm_up(frames[symbol].iloc[:warmup])
+    columns = {symbol: {field: frames[symbol][field].to_numpy(dtype=np.float64).tolist()
+                        for field in ('open', 'high', 'low', 'close', 'volume')} for symbol in symbols}
+    index = frames[symbols[0]].index
+    published = 0
+    start = time.perf_counter()
+    for i in range(warmup, len(index)):
+        for symbol in symbols:
+            server.publish(symbol, index[i], {field: values[i] for field, values in columns[symbol].items()})
+            published += 1
+        if rate:
+            await asyncio.sleep(max(0.0, start + (i - warmup + 1) / rate - time.perf_counter()))
+        else:
+            await asyncio.sleep(0)
+    return published
+
+
+async def poll_market_data(server, symbols, provider, interval=60.0, api_key=None, warmup_days=None):
+    """
+    Publish new bars from a data provider as they appear, polling every
+    `interval` seconds. The first response warms the feeds up.
+
+    A poll can return several new bars per symbol. They are published in
+    time order across symbols, the benchmark first at each time, so every
+    bar's relative strength is measured against the benchmark's bar of the
+    same time, as in replay().
+    """
+    symbols = sorted(set(symbols) | {server.benchmark}, key=lambda symbol: (symbol != server.benchmark, symbol))
+    last = {symbol: None for symbol in symbols}
+    async with MarketDataClient() as client:
+        while True:
+            frames = await client.fetch_many(provider, dict(last), api_key)
+            bars = []
+            for order, symbol in enumerate(symbols):
+                frame = frames.get(symbol)
+                if frame is None or isinstance(frame, Exception) or frame.empty:
+                    continue
+                if last[symbol] is None:
+                    if warmup_days:
+                        frame = frame[frame.index >= frame.index[-1].normalize() - pd.Timedelta(days=warmup_days)]
+                    server.feed(symbol).warm_up(frame)
+                else:
+                    bars += [(time_, order, symbol, row.to_dict())
+                             for time_, row in frame[frame.index > last[symbol]].iterrows()]
+                last[symbol] = frame.index[-1]
+            # symbols lists the benchmark first, so `order` puts it first among bars of the same time
+            for time_, _, symbol, bar in sorted(bars, key=lambda bar: (bar[0], bar[1])):
+                server.publish(symbol, time_, bar)
+            await asyncio.sleep(interval)
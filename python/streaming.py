@@ -0,0 +1,246 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from scipy.signal import savgol_coeffs
+
+from python.trendline import RollingLineFit
+
+
+def _log_price(value):
+    return math.log(value) if value > 0 else math.nan
+
+
+class RollingMax:
+    """Maximum of the last `window` values in O(1) amortized; NaN while the window is short or holds a NaN."""
+
+    def __init__(self, window):
+        self.window = window
+        self.queue = deque()  # (position, value), values decreasing
+        self.count = 0
+        self.last_nan = -window
+
+    def push(self, value):
+        position = self.count
+        self.count += 1
+        while self.queue and self.queue[0][0] <= position - self.window:
+            self.queue.popleft()
+        if math.isnan(value):
+            self.last_nan = position
+        else:
+            while self.queue and self.queue[-1][1] <= value:
+                self.queue.pop()
+            self.queue.append((position, value))
+        if self.count < self.window or self.last_nan > position - self.window:
+            return math.nan
+        return self.queue[0][1]
+
+
+class DirectionalChangeIndicator:
+    """
+    Bar-by-bar directional_change. Emits the same 'bullish'/'bearish' flags the
+    batch function gives for that bar, keeping only the last `window` bars.
+    """
+
+    columns = ('bullish', 'bearish')
+
+    def __init__(self, sigma=0.01, min_change=0.005, window=5, min_duration=3):
+        self.sigma = sigma
+        self.min_change = min_change
+        self.window = window
+        self.min_duration = min_duration
+        self.reset()
+
+    def reset(self):
+        self.rolling_high = RollingMax(self.window)
+        self.closes = deque(maxlen=self.window + 1)
+        self.bars = 0
+        self.tmp_max = math.nan
+        self.last_signal = self.window
+
+    def update(self, bar):
+        i = self.bars
+        self.bars += 1
+        close = bar['close']
+        rolling_high = self.rolling_high.push(bar['high'])
+        self.closes.append(close)
+        price_change = close / self.closes[0] - 1 if len(self.closes) > self.window else math.nan
+
+        bullish = bearish = 0
+        if i == self.window - 1:
+            self.tmp_max = rolling_high
+        elif i >= self.window:
+            if rolling_high > self.tmp_max and price_change > self.min_change:
+                self.tmp_max = rolling_high
+                if i - self.last_signal >= self.min_duration:
+                    bullish = 1
+                    self.last_signal = i
+            elif close < self.tmp_max - self.tmp_max * self.sigma and price_change < -self.min_change:
+                self.tmp_max = rolling_high
+                if i - self.last_signal >= self.min_duration:
+                    bearish = 1
+                    self.last_signal = i
+        return {'bullish': bullish, 'bearish': bearish}
+
+
+class TrendlineIndicator:
+    """
+    Bar-by-bar calculate_trendlines.
+
+    The raw support and resistance levels are the same as the batch function's.
+    Its savgol pass is centred and needs bars that have not arrived yet, so the
+    smoothed value emitted for a bar is the one calculate_trendlines gives for
+    the last bar of the history so far (the polynomial fitted to the last
+    `smoothing_window` levels, evaluated at the newest one). Levels are NaN
+    until that many levels exist.
+    """
+
+    columns = ('support', 'resistance')
+
+    def __init__(self, lookback=30, smoothing_window=5, smoothing_poly=2):
+        self.lookback = lookback
+        self.smoothing_window = smoothing_window
+        self.coefficients = savgol_coeffs(smoothing_window, smoothing_poly, pos=smoothing_window - 1, use='dot')
+        self.reset()
+
+    def reset(self):
+        self.support_fit = RollingLineFit(self.lookback)
+        self.resist_fit = RollingLineFit(self.lookback)
+        self.support_levels = deque(maxlen=self.smoothing_window)
+        self.resist_levels = deque(maxlen=self.smoothing_window)
+        self.bars = 0
+
+    def update(self, bar):
+        self.support_fit.push(_log_price(bar['low']))
+        self.resist_fit.push(_log_price(bar['high']))
+        self.bars += 1
+        if self.bars > self.lookback:
+            support = self.support_fit.value_at(self.lookback, min_count=self.lookback / 2)
+            resist = self.resist_fit.value_at(self.lookback, min_count=self.lookback / 2)
+            if not (math.isnan(support) or math.isnan(resist)):
+                self.support_levels.append(support)
+                self.resist_levels.append(resist)
+
+        if len(self.support_levels) < self.smoothing_window:
+            return {'support': math.nan, 'resistance': math.nan}
+        return {'support': math.exp(np.dot(self.coefficients, self.support_levels)),
+                'resistance': math.exp(np.dot(self.coefficients, self.resist_levels))}
+
+
+class VWAPIndicator:
+    """Bar-by-bar calculate_vwap from running price-volume and volume totals."""
+
+    columns = ('vwap',)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.price_volume = 0.0
+        self.volume = 0.0
+
+    def update(self, bar):
+        self.price_volume += bar['close'] * bar['volume']
+        self.volume += bar['volume']
+        return {'vwap': self.price_volume / self.volume if self.volume else math.nan}
+
+
+class ATRIndicator:
+    """Bar-by-bar calculate_atr: the mean true range of the last `lookback_periods` bars."""
+
+    columns = ('atr',)
+
+    def __init__(self, lookback_periods=14):
+        self.lookback_periods = lookback_periods
+        self.reset()
+
+    def reset(self):
+        self.true_ranges = deque(maxlen=self.lookback_periods)
+        self.previous_close = math.nan
+
+    def update(self, bar):
+        high, low = bar['high'], bar['low']
+        true_range = high - low
+        if not math.isnan(self.previous_close):
+            true_range = max(true_range, abs(high - self.previous_close), abs(low - self.previous_close))
+        self.previous_close = bar['close']
+        self.true_ranges.append(true_range)
+        if len(self.true_ranges) < self.lookback_periods:
+            return {'atr': math.nan}
+        return {'atr': math.fsum(self.true_ranges) / self.lookback_periods}
+
+
+class RelativeStrengthIndicator:
+    """
+    Bar-by-bar terms of calculate_relative_strength for one symbol.
+
+    calculate_relative_strength is the stock's terms minus SPY's: the mean
+    return and the mean volume-weighted return of the last `lookback_periods`
+    bars, each divided by the ATR over as many bars. This emits one symbol's
+    terms and relative_strength() combines a stock's with SPY's; on the same
+    bars that gives the batch function's value for the history so far.
+    """
+
+    columns = ('rs_return', 'rs_volume_return')
+
+    def __init__(self, lookback_periods=12):
+        self.lookback_periods = lookback_periods
+        self.reset()
+
+    def reset(self):
+        self.atr = ATRIndicator(self.lookback_periods)
+        self.returns = deque(maxlen=self.lookback_periods)
+        self.volume_returns = deque(maxlen=self.lookback_periods)
+        self.previous_close = math.nan
+
+    def update(self, bar):
+        close = bar['close']
+        # pct_change().fillna(0): the first bar has no return
+        change = 0.0 if math.isnan(self.previous_close) else close / self.previous_close - 1
+        self.previous_close = close
+        self.returns.append(change)
+        self.volume_returns.append(change * bar['volume'])
+        atr = self.atr.update(bar)['atr']
+        if math.isnan(atr) or atr == 0:
+            return {'rs_return': math.nan, 'rs_volume_return': math.nan}
+        return {'rs_return': math.fsum(self.returns) / len(self.returns) / atr,
+                'rs_volume_return': math.fsum(self.volume_returns) / len(self.volume_returns) / atr}
+
+    @staticmethod
+    def relative_strength(stock, spy):
+        """Combine a stock's and SPY's outputs for the same bar; NaN where the batch function gives None."""
+        return ((stock['rs_return'] - spy['rs_return']) + (stock['rs_volume_return'] - spy['rs_volume_return'])) / 2
+
+
+class IndicatorPipeline:
+    """
+    Runs a chain of streaming indicators over the same bars.
+
+    Each bar is a mapping with 'open', 'high', 'low', 'close' and 'volume' (a dict
+    or a DataFrame row). update() returns the merged outputs of every indicator
+    for that bar. run() replays a DataFrame, which also warms the indicators up
+    before switching to live bars.
+    """
+
+    def __init__(self, indicators):
+        self.indicators = list(indicators)
+        self.columns = [column for indicator in self.indicators for column in indicator.columns]
+        if len(set(self.columns)) != len(self.columns):
+            raise ValueError(f"Indicator outputs overlap: {self.columns}")
+
+    def reset(self):
+        for indicator in self.indicators:
+            indicator.reset()
+
+    def update(self, bar):
+        outputs = {}
+        for indicator in self.indicators:
+            outputs.update(indicator.update(bar))
+        return outputs
+
+    def run(self, data: pd.DataFrame) -> pd.DataFrame:
+        fields = [field for field in ('open', 'high', 'low', 'close', 'volume') if field in data.columns]
+        columns = [data[field].to_numpy(dtype=np.float64).tolist() for field in fields]
+        rows = [self.update(dict(zip(fields, values))) for values in zip(*columns)]
+        return pd.DataFrame(rows, index=data.index, columns=self.columns)
@@ -0,0 +1,144 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task by Task.check() once the task has been cancelled."""
+
+
+class Task:
+    """
+    Handle passed to a running task and returned to the caller that submitted it.
+
+    The task function calls progress() to report what it is doing and check()
+    between stages; check() raises TaskCancelled once cancel() has been called,
+    so work that has been superseded stops at the next stage boundary.
+    """
+
+    def __init__(self, scheduler, key):
+        self.scheduler = scheduler
+        self.key = key
+        self.future = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # Future.cancel() only succeeds before the task starts, in which case _run never posts
+        if self.future is not None and self.future.cancel():
+            self.scheduler._post(self, 'cancelled', None)
+
+    def check(self):
+        if self.cancelled:
+            raise TaskCancelled(self.key)
+
+    def progress(self, message, fraction=None):
+        self.check()
+        self.scheduler._post(self, 'progress', (message, fraction))
+
+
+class TaskScheduler:
+    """
+    Runs slow work off the Tk thread and hands the results back to it.
+
+    Tasks run on a thread pool (the HMM and NumPy release the GIL, and the
+    fetches wait on the network). Tk is not thread safe, so workers never
+    touch widgets: their progress, results and errors go on a queue that is
+    drained from the Tk event loop with master.after, where the callbacks run.
+
+    Each task has a key. Submitting a task cancels the running task with the
+    same key, and callbacks of a cancelled task are never called, so a stale
+    result cannot overwrite a newer one.
+
+    Parameters:
+    master: The Tk root (anything with after()).
+    max_workers (int): Size of the thread pool.
+    poll_ms (int): How often the queue is drained while tasks are running.
+    """
+
+    def __init__(self, master, max_workers=4, poll_ms=50):
+        self.master = master
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quantispy-task')
+        self.events = queue.SimpleQueue()
+        self.tasks = {}
+        self.callbacks = {}
+        self.polling = False
+
+    def submit(self, key, func, *args, on_done=None, on_error=None, on_progress=None):
+        """
+        Run func(task, *args) on the pool, cancelling the previous task with this key.
+
+        on_done(result), on_error(exception) and on_progress(message, fraction)
+        are called on the Tk thread.
+
+        Returns:
+        Task: The handle of the new task.
+        """
+        self.cancel(key)
+        task = Task(self, key)
+        self.tasks[key] = task
+        self.callbacks[task] = (on_done, on_error, on_progress)
+        task.future = self.executor.submit(self._run, task, func, args)
+        self._schedule_poll()
+        return task
+
+    def cancel(self, key):
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def running(self, key):
+        return key in self.tasks
+
+    def shutdown(self):
+        for key in list(self.tasks):
+            self.cancel(key)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, task, func, args):
+        try:
+            task.check()
+            result = func(task, *args)
+        except TaskCancelled:
+            self._post(task, 'cancelled', None)
+        except Exception as e:
+            self._post(task, 'error', e)
+        else:
+            self._post(task, 'done', result)
+
+    def _post(self, task, kind, payload):
+        self.events.put((task, kind, payload))
+
+    def _schedule_poll(self):
+        if not self.polling:
+            self.polling = True
+            self.master.after(self.poll_ms, self._drain)
+
+    def _drain(self):
+        while True:
+            try:
+                task, kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            on_done, on_error, on_progress = self.callbacks.get(task, (None, None, None))
+            if kind != 'progress':
+                self.callbacks.pop(task, None)
+                if self.tasks.get(task.key) is task:
+                    del self.tasks[task.key]
+            if task.cancelled or kind == 'cancelled':
+                continue
+            if kind == 'progress' and on_progress is not None:
+                on_progress(*payload)
+            elif kind == 'done' and on_done is not None:
+                on_done(payload)
+            elif kind == 'error' and on_error is not None:
+                on_error(payload)
+
+        self.polling = False
+        if self.callbacks:
+            self._schedule_poll()
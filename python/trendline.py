@@ -1,19 +1,118 @@
+import math
+from collections import deque
+
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
 from scipy.signal import savgol_filter
 
 
-def fit_trendlines_single(data: np.array):
-    x = np.arange(len(data)).reshape(-1, 1)
-    model = LinearRegression().fit(x, data)
-    return model.coef_[0], model.intercept_
-
-
 def remove_outliers(data, n_sigmas=3):
     return data[np.abs(data - np.mean(data)) <= n_sigmas * np.std(data)]
 
 
+class RollingLineFit:
+    """
+    Least-squares line over the last `lookback` values, updated in O(1) per value.
+
+    Keeps running sums of x, x^2, y, y^2 and xy over the valid (non-NaN) values,
+    with x the position in the window, and slides them when the oldest value
+    drops out. Outlier trimming uses remove_outliers' rule: the window max and
+    min are tracked with monotonic deques, so a full window with nothing past
+    n_sigmas costs O(1). Only the rare window with an outlier or a missing value
+    is refitted from its values.
+
+    Parameters:
+    lookback (int): Number of values in the window.
+    n_sigmas (float): Values further than this many standard deviations from the window mean are dropped.
+    """
+
+    def __init__(self, lookback, n_sigmas=3):
+        self.lookback = lookback
+        self.n_sigmas = n_sigmas
+        self.values = deque()
+        self.pushed = 0
+        self.anchor = None  # Values are stored relative to the first one to keep the sums well conditioned
+        self.count = 0
+        self.sum_x = 0.0
+        self.sum_xx = 0.0
+        self.sum_y = 0.0
+        self.sum_yy = 0.0
+        self.sum_xy = 0.0
+        self.max_queue = deque()  # (push number, value), values decreasing
+        self.min_queue = deque()  # (push number, value), values increasing
+
+    def push(self, value):
+        if len(self.values) == self.lookback:
+            oldest = self.values.popleft()
+            if not math.isnan(oldest):
+                # The oldest value sits at x = 0, so it only contributes to the count and y sums
+                self.count -= 1
+                self.sum_y -= oldest
+                self.sum_yy -= oldest * oldest
+            # Every remaining value moves from x to x - 1
+            self.sum_xy -= self.sum_y
+            self.sum_xx -= 2 * self.sum_x - self.count
+            self.sum_x -= self.count
+
+        expired = self.pushed - self.lookback
+        while self.max_queue and self.max_queue[0][0] <= expired:
+            self.max_queue.popleft()
+        while self.min_queue and self.min_queue[0][0] <= expired:
+            self.min_queue.popleft()
+
+        if math.isnan(value):
+            self.values.append(value)
+        else:
+            if self.anchor is None:
+                self.anchor = value
+            y = value - self.anchor
+            x = len(self.values)
+            self.values.append(y)
+            self.count += 1
+            self.sum_x += x
+            self.sum_xx += x * x
+            self.sum_y += y
+            self.sum_yy += y * y
+            self.sum_xy += x * y
+            while self.max_queue and self.max_queue[-1][1] <= y:
+                self.max_queue.pop()
+            self.max_queue.append((self.pushed, y))
+            while self.min_queue and self.min_queue[-1][1] >= y:
+                self.min_queue.pop()
+            self.min_queue.append((self.pushed, y))
+        self.pushed += 1
+
+    def _trimmed_sums(self):
+        # Like the fit over remove_outliers(window.dropna()), the surviving values are renumbered 0..count-1
+        y = np.array(self.values)
+        y = remove_outliers(y[~np.isnan(y)], self.n_sigmas)
+        x = np.arange(len(y), dtype=np.float64)
+        return len(y), x.sum(), (x * x).sum(), y.sum(), (x * y).sum()
+
+    def value_at(self, x, min_count=1):
+        """
+        Evaluate the fitted line at window position `x` (0 is the oldest value).
+
+        Returns NaN when fewer than `min_count` values survive trimming.
+        """
+        if self.count == 0:
+            return math.nan
+        mean = self.sum_y / self.count
+        limit = self.n_sigmas * math.sqrt(max(self.sum_yy / self.count - mean * mean, 0.0))
+        gaps = self.count < len(self.values)
+        if gaps or self.max_queue[0][1] - mean > limit or mean - self.min_queue[0][1] > limit:
+            count, sum_x, sum_xx, sum_y, sum_xy = self._trimmed_sums()
+        else:
+            count, sum_x, sum_xx, sum_y, sum_xy = self.count, self.sum_x, self.sum_xx, self.sum_y, self.sum_xy
+
+        if count < max(min_count, 1):
+            return math.nan
+        denominator = count * sum_xx - sum_x * sum_x
+        slope = (count * sum_xy - sum_x * sum_y) / denominator if denominator > 0 else 0.0
+        intercept = (sum_y - slope * sum_x) / count
+        return self.anchor + slope * x + intercept
+
+
 def calculate_trendlines(data: pd.DataFrame, lookback=30, smoothing_window=5, smoothing_poly=2):
     required_columns = ['high', 'low', 'close']
     for col in required_columns:
@@ -25,24 +124,20 @@ def calculate_trendlines(data: pd.DataFrame, lookback=30, smoothing_window=5, sm
     support_levels = np.full(len(data), np.nan)
     resist_levels = np.full(len(data), np.nan)
 
-    for i in range(lookback, len(data)):
-        candles = log_data.iloc[i - lookback + 1: i + 1]
-
-        high_clean = remove_outliers(candles['high'].dropna())
-        low_clean = remove_outliers(candles['low'].dropna())
-
-        if len(high_clean) < lookback / 2 or len(low_clean) < lookback / 2:
+    # Project each window's fit one bar past its last value
+    support_fit = RollingLineFit(lookback)
+    resist_fit = RollingLineFit(lookback)
+    for i, (high, low) in enumerate(zip(log_data['high'].tolist(), log_data['low'].tolist())):
+        support_fit.push(low)
+        resist_fit.push(high)
+        if i < lookback:
             continue
 
-        try:
-            support_slope, support_intercept = fit_trendlines_single(low_clean)
-            resist_slope, resist_intercept = fit_trendlines_single(high_clean)
-
-            support_levels[i] = support_slope * lookback + support_intercept
-            resist_levels[i] = resist_slope * lookback + resist_intercept
-
-        except Exception as e:
-            print(f"Error fitting trendlines for index {i}: {e}")
+        support = support_fit.value_at(lookback, min_count=lookback / 2)
+        resist = resist_fit.value_at(lookback, min_count=lookback / 2)
+        if not (math.isnan(support) or math.isnan(resist)):
+            support_levels[i] = support
+            resist_levels[i] = resist
 
     # Apply smoothing only to non-NaN values
     valid_indices = ~np.isnan(support_levels)
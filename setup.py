@@ -62,8 +62,7 @@ setup(
         'numpy',
         'pandas',
         'matplotlib',
-        'alpha_vantage',
-        'yfinance',
+        'aiohttp',
         'pybind11>=2.6.0',
     ],
     setup_requires=['pybind11>=2.6.0'],
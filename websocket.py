@@ -1,22 +1,122 @@
-# websocket_server.py
+# websocket.py
+"""Subscribe to websocket_server.py and print updates, or load-test it.
+
+With --clients N it opens N connections, each subscribed to --symbols, and
+reports messages per second, coalesced bars (gaps in each symbol's seq) and
+the latency from publication to receipt at the 50th, 99th and 99.9th
+percentiles. Latency is measured against the server's wall clock, so run
+both on the same machine.
+
+    python websocket.py --symbols SPY SYM001
+    python websocket.py --clients 500 --symbols SPY SYM001 SYM002 --encoding binary --duration 30
+"""
+import argparse
 import asyncio
-import websockets
 import json
+import time
 
-async def echo(websocket, path):
-    try:
+import numpy as np
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+from python.signal_server import DEFAULT_PORT, decode_binary
+
+
+def decode(message):
+    return decode_binary(message) if isinstance(message, bytes) else json.loads(message)
+
+
+async def subscribe(websocket, symbols, encoding):
+    await websocket.send(json.dumps({'action': 'subscribe', 'symbols': symbols, 'encoding': encoding}))
+    ack = json.loads(await websocket.recv())
+    if 'error' in ack:
+        raise RuntimeError(ack['error'])
+    return ack
+
+
+async def watch(url, symbols, encoding):
+    async with connect(url, compression=None) as websocket:
+        print(await subscribe(websocket, symbols, encoding), flush=True)
         async for message in websocket:
-            data = json.loads(message)
-            print(f"Received data: {data}")
-            await websocket.send(message)  # Echo the message back
-    except websockets.ConnectionClosed:
-        print("Connection closed")
-    except Exception as e:
-        print(f"Server Error: {e}")
-
-async def main():
-    async with websockets.serve(echo, "localhost", 8765):
-        await asyncio.Future()  # Run forever
+            print(decode(message), flush=True)
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []
+        self.received = 0
+        self.coalesced = 0
+        self.disconnected = 0
+        self.first = None
+        self.last = None
+
+
+async def load_client(url, symbols, encoding, stats, deadline, connected):
+    last_seq = {}
+    try:
+        async with connect(url, compression=None) as websocket:
+            try:
+                await subscribe(websocket, symbols, encoding)
+            finally:
+                connected.release()
+            while True:
+                message = await asyncio.wait_for(websocket.recv(), max(0.0, deadline - time.monotonic()))
+                now = time.time_ns()
+                update = decode(message)
+                stats.latencies.append(now - update['published_ns'])
+                stats.received += 1
+                stats.first = stats.first or now
+                stats.last = now
+                seq = update['seq']
+                previous = last_seq.get(update['symbol'])
+                if previous is not None and seq > previous + 1:
+                    stats.coalesced += seq - previous - 1
+                last_seq[update['symbol']] = seq
+    except (asyncio.TimeoutError, TimeoutError):
+        pass
+    except ConnectionClosed:
+        stats.disconnected += 1
+
+
+async def load(url, clients, symbols, encoding, duration):
+    """Run `clients` subscribers for `duration` seconds and return throughput and latency statistics."""
+    stats = LoadStats()
+    connected = asyncio.Semaphore(0)
+    deadline = time.monotonic() + duration
+    tasks = [asyncio.create_task(load_client(url, symbols, encoding, stats, deadline, connected))
+             for _ in range(clients)]
+    for _ in range(clients):
+        await connected.acquire()
+    print(json.dumps({'connected': clients}), flush=True)
+    await asyncio.gather(*tasks)
+
+    latencies = np.array(stats.latencies, dtype=np.float64) / 1e6
+    elapsed = (stats.last - stats.first) / 1e9 if stats.received > 1 else 0.0
+    result = {'clients': clients, 'symbols': len(symbols), 'encoding': encoding, 'received': stats.received,
+              'coalesced': stats.coalesced, 'disconnected': stats.disconnected,
+              'messages_per_second': stats.received / elapsed if elapsed else None}
+    if len(latencies):
+        p50, p99, p999 = np.percentile(latencies, [50, 99, 99.9])
+        result.update(latency_p50_ms=p50, latency_p99_ms=p99, latency_p999_ms=p999, latency_max_ms=latencies.max())
+    return result
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=f"ws://localhost:{DEFAULT_PORT}")
+    parser.add_argument('--symbols', nargs='+', default=['SPY'])
+    parser.add_argument('--encoding', choices=['json', 'binary'], default='json')
+    parser.add_argument('--clients', type=int, help='load-test with this many connections instead of printing')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to receive for, with --clients')
+    parser.add_argument('--output', help='with --clients, write the result to this JSON file')
+    args = parser.parse_args()
+    symbols = [symbol.upper() for symbol in args.symbols]
+
+    if args.clients:
+        result = asyncio.run(load(args.url, args.clients, symbols, args.encoding, args.duration))
+        print(json.dumps(result), flush=True)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=2)
+    else:
+        asyncio.run(watch(args.url, symbols, args.encoding))
@@ -1,22 +1,79 @@
 # websocket_server.py
+"""Serve per-bar signal updates to WebSocket subscribers (see python/signal_server.py).
+
+Replays the bundled CSVs as a set of symbols, or polls a data provider for
+new bars. Clients subscribe with
+
+    {"action": "subscribe", "symbols": ["SPY", "SYM001"], "encoding": "json"}
+
+    python websocket_server.py --symbols 50 --copies 20 --rate 10
+    python websocket_server.py --live AAPL MSFT --provider yahoo --interval 60
+"""
+import argparse
 import asyncio
-import websockets
 import json
 
-async def echo(websocket, path):
-    try:
-        async for message in websocket:
-            data = json.loads(message)
-            print(f"Received data: {data}")
-            await websocket.send(message)  # Echo the message back
-    except websockets.ConnectionClosed:
-        print("Connection closed")
-    except Exception as e:
-        print(f"Server Error: {e}")
-
-async def main():
-    async with websockets.serve(echo, "localhost", 8765):
-        await asyncio.Future()  # Run forever
+from python.market_data import ALPHA_VANTAGE, YAHOO
+from python.signal_server import (BENCHMARK, DEFAULT_PORT, SignalServer, poll_market_data, replay,
+                                  replay_frames)
+
+DEFAULT_FILES = ['spy_data_5m.csv', 'historical.csv']
+
+
+def replay_symbols(count):
+    return [BENCHMARK] + [f"SYM{i:03d}" for i in range(1, count)]
+
+
+async def report(server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps(server.stats()), flush=True)
+
+
+async def main(args):
+    server = SignalServer(max_symbols=args.max_symbols, send_timeout=args.send_timeout, refit_bars=args.refit_bars,
+                          drift_threshold=args.drift_threshold, history=args.history)
+    async with server.serve(args.host, args.port):
+        print(f"Serving on ws://{args.host}:{args.port}", flush=True)
+        reporter = asyncio.create_task(report(server, args.stats_interval))
+        if args.live:
+            await poll_market_data(server, [symbol.upper() for symbol in args.live], args.provider, args.interval,
+                                   args.api_key)
+        else:
+            frames = replay_frames(args.files, replay_symbols(args.symbols), args.copies)
+            while True:
+                await asyncio.sleep(args.start_delay)
+                published = await replay(server, frames, args.rate, args.warmup)
+                print(json.dumps(dict(server.stats(), replayed=published)), flush=True)
+                if not args.loop:
+                    break
+                frames = replay_frames(args.files, replay_symbols(args.symbols), args.copies)
+                server.feeds.clear()
+        reporter.cancel()
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--files', nargs='+', default=DEFAULT_FILES, help='CSVs to replay')
+    parser.add_argument('--symbols', type=int, default=10, help='replayed symbols: SPY, SYM001, SYM002, ...')
+    parser.add_argument('--copies', type=int, default=10, help='stitch each CSV end to end this many times')
+    parser.add_argument('--warmup', type=int, default=60, help='bars that warm the indicators and fit the HMM')
+    parser.add_argument('--rate', type=float, help='bars per second per symbol (default: as fast as possible)')
+    parser.add_argument('--start-delay', type=float, default=2.0, help='seconds to wait for clients before replaying')
+    parser.add_argument('--loop', action='store_true', help='replay again from the start when done')
+    parser.add_argument('--live', nargs='+', metavar='SYMBOL', help='poll these symbols instead of replaying')
+    parser.add_argument('--provider', choices=[ALPHA_VANTAGE, YAHOO], default=YAHOO)
+    parser.add_argument('--api-key')
+    parser.add_argument('--interval', type=float, default=60.0, help='seconds between polls with --live')
+    parser.add_argument('--max-symbols', type=int, default=100, help='subscriptions per client')
+    parser.add_argument('--send-timeout', type=float, default=10.0,
+                        help='disconnect a client that takes longer than this to accept a frame')
+    parser.add_argument('--refit-bars', type=int, default=5000,
+                        help='refit each HMM after this many live bars (0: only when drift is detected)')
+    parser.add_argument('--drift-threshold', type=float, default=0.5,
+                        help='refit an HMM once its predictive log-likelihood drops this far (nats per bar)')
+    parser.add_argument('--history', type=int, default=2000, help='recent returns each HMM is refitted on')
+    parser.add_argument('--stats-interval', type=float, default=10.0)
+    asyncio.run(main(parser.parse_args()))